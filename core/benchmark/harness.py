@@ -0,0 +1,287 @@
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from functools import partial
+from typing import Iterable, List, NamedTuple
+from unittest import mock
+
+from allauth.socialaccount.models import SocialAccount, SocialApp, SocialToken
+from celery import chain, group
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.db.models import Sum
+from django.db.models.signals import post_save
+from django.forms.models import model_to_dict
+from django.test.utils import override_settings
+
+from core.benchmark.stand_ins import InMemoryRedis, InMemoryS3Client
+from core.benchmark.vdr_server import FakeVDRServer, FakeVDRSite
+from core.http_handlers import rate_limit
+from core.models import RemoteSystemSettings
+from core.site_migration import site_migrations
+from core.site_migration.utilities import progress, sync_index, utils
+from reporting.models import Report, ReportSummary
+
+User = get_user_model()
+
+OPERATIONS = ("replicate", "replicate_incremental", "soft_delete", "hard_delete")
+
+
+class BenchmarkResult(NamedTuple):
+    operation: str
+    files: int
+    bytes: int
+    seconds: float
+    files_failed: int
+    api_calls: int
+    api_errors: int
+    s3_calls: int
+    db_queries: int
+
+    @property
+    def files_per_second(self) -> float:
+        return self.files / self.seconds if self.seconds else 0
+
+    @property
+    def megabytes_per_second(self) -> float:
+        return self.bytes / (1024 * 1024) / self.seconds if self.seconds else 0
+
+    @property
+    def api_calls_per_file(self) -> float:
+        return self.api_calls / self.files if self.files else 0
+
+    @property
+    def db_queries_per_file(self) -> float:
+        return self.db_queries / self.files if self.files else 0
+
+
+class _QueryCounter:
+    """
+    Counts the queries run on every DB connection, from every thread, while it is installed.
+
+    The transfer and crawler threads each open their own connection, so the counter is added to each connection
+    as it is opened, as well as to the ones already open in this thread.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+        self._wrapped = []
+
+    def __call__(self, execute, sql, params, many, context):
+        with self._lock:
+            self.count += 1
+        return execute(sql, params, many, context)
+
+    def _wrap(self, connection):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+            self._wrapped.append(connection)
+
+    def _on_connection_created(self, sender, connection, **kwargs):
+        self._wrap(connection)
+
+    def __enter__(self):
+        for connection in connections.all():
+            self._wrap(connection)
+        connection_created.connect(self._on_connection_created)
+        return self
+
+    def __exit__(self, *exc_info):
+        connection_created.disconnect(self._on_connection_created)
+        for connection in self._wrapped:
+            if self in connection.execute_wrappers:
+                connection.execute_wrappers.remove(self)
+
+
+class _CreatedReports:
+    """
+    Records the ids of the Reports created while it is installed, so that a benchmark only ever reads or deletes the
+    reports its own runs wrote.
+    """
+
+    def __init__(self):
+        self.ids = []
+
+    def _on_post_save(self, sender, instance, created, **kwargs):
+        if created:
+            self.ids.append(instance.id)
+
+    def __enter__(self):
+        post_save.connect(self._on_post_save, sender=Report, weak=False)
+        return self
+
+    def __exit__(self, *exc_info):
+        post_save.disconnect(self._on_post_save, sender=Report)
+
+
+def _eager(canvas):
+    # builds the group or chain as site_migrations would, but runs it in this thread when it is dispatched, as
+    # task_always_eager would, without switching eager mode on for the rest of the app
+    def build(*args, **kwargs):
+        workflow = canvas(*args, **kwargs)
+        workflow.apply_async = partial(workflow.apply, throw=True)
+        return workflow
+
+    return build
+
+
+def _benchmark_settings(server: FakeVDRServer) -> dict:
+    # every RemoteSystemSettings field, as get_setting reads them from the cache, pointed at the fake VDR
+    remote_settings = RemoteSystemSettings(
+        remote_system_base_url=server.base_url,
+        aws_access_key_id="benchmark",
+        aws_secret_access_key="benchmark",
+        aws_bucket_name="benchmark",
+    )
+    return model_to_dict(remote_settings, exclude=["id"])
+
+
+@contextmanager
+def benchmark_environment(server: FakeVDRServer, s3_client, redis_client):
+
+    """
+    Points the app at the stand-ins for the length of a benchmark, and puts everything back afterwards.
+
+    Nothing shared with the rest of the app is changed. The cache is swapped for a private in memory one, holding
+    RemoteSystemSettings pointed at the FakeVDRServer, so neither the RemoteSystemSettings row nor the cache the
+    workers read it through is touched. A throwaway user is given a token for the fake VDR. The S3 client and the
+    progress Redis are swapped for the stand-ins, and the shared RateLimiter is switched off, so a run neither waits
+    on nor drains the buckets of a real VDR's budgets - only the backoff after the fake VDR answers 429 or 503
+    applies. Files replicated to the local server go to a temporary MEDIA_ROOT, and the groups and chains the tasks
+    dispatch are run in this thread rather than sent to celery. The user, and everything the runs recorded against
+    it, is deleted at the end, along with the reports the runs wrote.
+
+    The runs still write to the DB, so the benchmark_migration command runs them against a test database of its own.
+
+    :param server: the running FakeVDRServer
+    :param s3_client: the S3 client to replicate to, e.g. an InMemoryS3Client
+    :param redis_client: the Redis client to count the progress in, e.g. an InMemoryRedis
+    :return: the throwaway user
+    """
+    user = User.objects.create_user(f"vdr-benchmark-{uuid.uuid4().hex[:12]}")
+    social_app = SocialApp.objects.create(
+        provider="remote_vdr", name="VDR benchmark", client_id="benchmark"
+    )
+    account = SocialAccount.objects.create(
+        user=user, provider="remote_vdr", uid=user.username
+    )
+    SocialToken.objects.create(app=social_app, account=account, token="benchmark")
+
+    reports = _CreatedReports()
+    try:
+        with tempfile.TemporaryDirectory() as media_root, override_settings(
+            MEDIA_ROOT=media_root,
+            CACHES={
+                "default": {
+                    "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                    "LOCATION": f"vdr-benchmark-{user.username}",
+                }
+            },
+        ), reports, mock.patch.object(
+            site_migrations, "group", _eager(group)
+        ), mock.patch.object(
+            site_migrations, "chain", _eager(chain)
+        ), mock.patch.object(
+            utils, "get_s3_client", lambda: s3_client
+        ), mock.patch.object(
+            sync_index, "get_s3_client", lambda: s3_client
+        ), mock.patch.object(
+            progress, "get_progress_redis", lambda: redis_client
+        ), mock.patch.object(
+            rate_limit, "get_rate_limit_redis", lambda: None
+        ):
+            cache.set_many(_benchmark_settings(server), None)
+            try:
+                yield user
+            finally:
+                cache.clear()
+    finally:
+        Report.objects.filter(id__in=reports.ids).delete()
+        user.delete()
+        social_app.delete()
+
+
+def _run_operation(operation: str, user, mode: str) -> None:
+    root_folder_id = 1
+    if operation == "replicate":
+        site_migrations.manifest_site_replication_task(
+            user.id, root_folder_id, mode, False, False, "benchmark"
+        )
+    elif operation == "replicate_incremental":
+        site_migrations.manifest_site_replication_task(
+            user.id, root_folder_id, mode, True, False, "benchmark"
+        )
+    elif operation == "soft_delete":
+        site_migrations.manifest_site_delete_task(
+            user.id, root_folder_id, False, "benchmark"
+        )
+    elif operation == "hard_delete":
+        site_migrations.manifest_site_delete_task(
+            user.id, root_folder_id, True, "benchmark"
+        )
+    else:
+        raise ValueError(f"unknown benchmark operation {operation}")
+
+
+def run_benchmark(
+    site: FakeVDRSite,
+    operations: Iterable[str] = OPERATIONS,
+    mode: str = "local_and_remote",
+    latency: float = 0,
+    error_rate: float = 0,
+    rate_limit: float = None,
+) -> List[BenchmarkResult]:
+
+    """
+    Runs replications and deletions of a generated site end to end, against a FakeVDRServer and in memory S3 and
+    Redis stand-ins, and measures each one.
+
+    The operations run in the order given, against the same site, so e.g. replicate_incremental measures a rerun
+    with nothing changed. The deletes don't change the site.
+
+    :param site: the FakeVDRSite to serve
+    :param operations: which of OPERATIONS to run
+    :param mode: where replications replicate to, one of the keys of REPLICATION_MODES
+    :param latency: the seconds the fake VDR waits before answering each request
+    :param error_rate: the fraction of requests the fake VDR answers 503
+    :param rate_limit: the requests a second the fake VDR answers before it answers 429
+    :return: a BenchmarkResult for each operation
+    """
+    s3_client = InMemoryS3Client()
+    results = []
+    with FakeVDRServer(site, latency, error_rate, rate_limit) as server:
+        with benchmark_environment(server, s3_client, InMemoryRedis()) as user:
+            for operation in operations:
+                server.reset_counts()
+                s3_client.calls.clear()
+                with _CreatedReports() as reports, _QueryCounter() as queries:
+                    start = time.perf_counter()
+                    _run_operation(operation, user, mode)
+                    seconds = time.perf_counter() - start
+
+                # the bytes and failures the run recorded in its report
+                summary = ReportSummary.objects.filter(
+                    report_id__in=reports.ids
+                ).aggregate(
+                    bytes_transferred=Sum("bytes_transferred"),
+                    files_failed=Sum("files_failed"),
+                )
+                results.append(
+                    BenchmarkResult(
+                        operation=operation,
+                        files=len(site.file_sizes),
+                        bytes=summary["bytes_transferred"] or 0,
+                        seconds=seconds,
+                        files_failed=summary["files_failed"] or 0,
+                        api_calls=server.total_requests,
+                        api_errors=sum(server.errors.values()),
+                        s3_calls=sum(s3_client.calls.values()),
+                        db_queries=queries.count,
+                    )
+                )
+    return results
@@ -0,0 +1,110 @@
+import gc
+import time
+import tracemalloc
+from typing import Callable, List, NamedTuple
+
+from core.data_parsers.file_and_folder_data_parsers import (
+    parse_get_files_in_single_folder,
+)
+from core.dataclasses.file_and_folder_dataclasses import (
+    CompactFileList,
+    VDRFile,
+    VDRFileList,
+)
+
+REPRESENTATIONS = ("validated", "trusted", "compact")
+
+
+class ListingModelResult(NamedTuple):
+    representation: str
+    files: int
+    seconds: float
+    bytes: int
+
+    @property
+    def microseconds_per_file(self) -> float:
+        return self.seconds * 1000000 / self.files if self.files else 0
+
+    @property
+    def bytes_per_file(self) -> float:
+        return self.bytes / self.files if self.files else 0
+
+
+def listing_json(files: int) -> dict:
+
+    """
+    :param files: the number of files in the listing
+    :return: the json of a files-in-folder listing, as the VDR sends it
+    """
+    return {
+        "filetotal": files,
+        "file": [
+            {
+                "id": file_id,
+                "name": f"document {file_id}",
+                "type": ("pdf", "docx", "xlsx")[file_id % 3],
+                "size": file_id * 1024,
+            }
+            for file_id in range(1, files + 1)
+        ],
+    }
+
+
+def _validated(json) -> VDRFileList:
+    # every file validated by pydantic, and again as the list is
+    return VDRFileList(file_list=[VDRFile(**item) for item in json["file"]])
+
+
+def _compact(json) -> CompactFileList:
+    return CompactFileList(parse_get_files_in_single_folder(json).file_list)
+
+
+_BUILDERS = {
+    "validated": _validated,
+    "trusted": parse_get_files_in_single_folder,
+    "compact": _compact,
+}
+
+
+def _measure(build: Callable, json) -> tuple:
+    gc.collect()
+    start = time.perf_counter()
+    listing = build(json)
+    seconds = time.perf_counter() - start
+    del listing
+
+    # timed and measured separately, as tracing allocations slows them down several times over
+    gc.collect()
+    tracemalloc.start()
+    try:
+        listing = build(json)
+        size = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del listing
+    return seconds, size
+
+
+def run_listing_model_benchmark(
+    files: int = 100000, representations=REPRESENTATIONS
+) -> List[ListingModelResult]:
+
+    """
+    Builds the same files-in-folder listing into each representation of a file list, and measures how long it takes
+    and how much memory the list holds on to.
+
+    validated is every VDRFile and the VDRFileList validated by pydantic, trusted is the json checked field by
+    field as it is parsed and the dataclasses built without validation (parse_get_files_in_single_folder), and
+    compact is that list copied into a CompactFileList. The json itself is built beforehand, so only the memory of
+    the list (and of any strings it doesn't share with the json) is counted.
+
+    :param files: the number of files in the listing
+    :param representations: which of REPRESENTATIONS to measure
+    :return: a ListingModelResult for each representation, in the order given
+    """
+    json = listing_json(files)
+    results = []
+    for representation in representations:
+        seconds, size = _measure(_BUILDERS[representation], json)
+        results.append(ListingModelResult(representation, files, seconds, size))
+    return results
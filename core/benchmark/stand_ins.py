@@ -0,0 +1,154 @@
+import threading
+from collections import Counter
+
+
+class InMemoryS3Client:
+    """
+    A stand-in for the handful of boto3 S3 client calls the replication makes, keeping the objects in memory.
+
+    Only the size of every object is kept, not its bytes, so a large site can be replicated through it. Every
+    call is counted in calls.
+    """
+
+    class exceptions:
+        class NoSuchUpload(Exception):
+            pass
+
+    def __init__(self):
+        self.objects = {}
+        self.calls = Counter()
+        self._uploads = {}
+        self._lock = threading.Lock()
+
+    def _count(self, call: str):
+        with self._lock:
+            self.calls[call] += 1
+
+    @staticmethod
+    def _drain(fileobj, chunk_size: int = 1024 * 1024) -> int:
+        size = 0
+        while True:
+            chunk = fileobj.read(chunk_size)
+            if not chunk:
+                return size
+            size += len(chunk)
+
+    def upload_fileobj(self, Fileobj, Bucket, Key, Config=None, **kwargs):
+        self._count("upload_fileobj")
+        size = self._drain(Fileobj)
+        with self._lock:
+            self.objects[(Bucket, Key)] = size
+
+    def put_object(self, Bucket, Key, Body=b"", **kwargs):
+        self._count("put_object")
+        with self._lock:
+            self.objects[(Bucket, Key)] = len(Body)
+        return {"ETag": '"stand-in"'}
+
+    def delete_objects(self, Bucket, Delete):
+        self._count("delete_objects")
+        with self._lock:
+            for item in Delete["Objects"]:
+                self.objects.pop((Bucket, item["Key"]), None)
+        return {}
+
+    def create_multipart_upload(self, Bucket, Key, **kwargs):
+        self._count("create_multipart_upload")
+        with self._lock:
+            upload_id = f"upload-{len(self._uploads) + 1}"
+            self._uploads[upload_id] = {}
+        return {"UploadId": upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body, **kwargs):
+        self._count("upload_part")
+        with self._lock:
+            if UploadId not in self._uploads:
+                raise self.exceptions.NoSuchUpload()
+            self._uploads[UploadId][PartNumber] = len(Body)
+        return {"ETag": f'"part-{PartNumber}"'}
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self._count("abort_multipart_upload")
+        with self._lock:
+            if self._uploads.pop(UploadId, None) is None:
+                raise self.exceptions.NoSuchUpload()
+        return {}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        self._count("complete_multipart_upload")
+        with self._lock:
+            parts = self._uploads.pop(UploadId)
+            self.objects[(Bucket, Key)] = sum(parts.values())
+        return {}
+
+    def get_paginator(self, operation):
+        client = self
+
+        class ListPartsPaginator:
+            def paginate(self, Bucket, Key, UploadId):
+                client._count("list_parts")
+                with client._lock:
+                    if UploadId not in client._uploads:
+                        raise client.exceptions.NoSuchUpload()
+                    parts = dict(client._uploads[UploadId])
+                yield {
+                    "Parts": [
+                        {
+                            "PartNumber": number,
+                            "Size": size,
+                            "ETag": f'"part-{number}"',
+                        }
+                        for number, size in sorted(parts.items())
+                    ]
+                }
+
+        return ListPartsPaginator()
+
+
+class InMemoryRedis:
+    """
+    A stand-in for the few Redis hash commands JobProgress uses. A pipeline runs its commands when it is
+    executed, like a MULTI/EXEC one would.
+    """
+
+    def __init__(self):
+        self.hashes = {}
+        self.expiries = {}
+        self._lock = threading.Lock()
+
+    def pipeline(self):
+        return InMemoryRedisPipeline(self)
+
+    def hset(self, key, mapping):
+        with self._lock:
+            self.hashes.setdefault(key, {}).update(
+                {field: str(value) for field, value in mapping.items()}
+            )
+
+    def hincrby(self, key, field, amount=1):
+        with self._lock:
+            fields = self.hashes.setdefault(key, {})
+            fields[field] = str(int(fields.get(field, 0)) + amount)
+
+    def expire(self, key, seconds):
+        self.expiries[key] = seconds
+
+    def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+
+class InMemoryRedisPipeline:
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.commands.append((name, args, kwargs))
+
+        return queue
+
+    def execute(self):
+        for name, args, kwargs in self.commands:
+            getattr(self.client, name)(*args, **kwargs)
+        self.commands = []
@@ -0,0 +1,409 @@
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+from urllib.parse import parse_qs, urlsplit
+
+RANGE_PATTERN = re.compile(r"bytes=(\d*)-(\d*)")
+# the body of every file is a slice of this, so serving a large tree costs no memory per file
+_FILLER = bytes(range(256)) * 4096
+
+
+class FakeVDRSite:
+    """
+    A class used to represent a generated VDR Site, served by a FakeVDRServer
+
+    The tree is regular: every folder down to depth has breadth subfolders, and every folder holds
+    files_per_folder files of file_size bytes. The root folder has the id 1 and a parent of 0, like a real site's.
+
+    ...
+
+    Attributes
+    ----------
+    site_id : int
+        the unique identifier of the site
+    folders : Dict[int, dict]
+        the json of every folder, by id, as the VDR lists them
+    subfolders : Dict[int, List[int]]
+        the ids of the subfolders of every folder
+    files : Dict[int, List[dict]]
+        the json of the files in every folder
+    file_sizes : Dict[int, int]
+        the size of every file, by id
+    file_bodies : Dict[int, bytes]
+        the content of the files added with add_file(), by id. Any other file is served from a filler pattern
+
+    Methods
+    -------
+    add_file(folder_id, file_id, body)
+        Adds a file with the given content to a folder
+
+    """
+
+    def __init__(
+        self,
+        depth: int = 2,
+        breadth: int = 3,
+        files_per_folder: int = 5,
+        file_size: int = 64 * 1024,
+        site_id: int = 1,
+    ):
+        self.site_id = site_id
+        self.folders: Dict[int, dict] = {}
+        self.subfolders: Dict[int, List[int]] = {}
+        self.files: Dict[int, List[dict]] = {}
+        self.file_sizes: Dict[int, int] = {}
+        self.file_bodies: Dict[int, bytes] = {}
+
+        next_file_id = 1
+        level = [self._add_folder(1, "Benchmark Site", 0, "/")]
+        for current_depth in range(depth + 1):
+            next_level = []
+            for folder_id in level:
+                for _ in range(files_per_folder):
+                    self.files[folder_id].append(
+                        {
+                            "id": next_file_id,
+                            "name": f"file {next_file_id}",
+                            "type": "bin",
+                            "size": file_size,
+                        }
+                    )
+                    self.file_sizes[next_file_id] = file_size
+                    next_file_id += 1
+                if current_depth == depth:
+                    continue
+                for _ in range(breadth):
+                    child_id = len(self.folders) + 1
+                    location = (
+                        self.folders[folder_id]["location"] + str(folder_id) + "/"
+                    )
+                    next_level.append(
+                        self._add_folder(
+                            child_id, f"Folder {child_id}", folder_id, location
+                        )
+                    )
+            level = next_level
+
+    def _add_folder(self, folder_id, name, parent_folder_id, location) -> int:
+        self.folders[folder_id] = {
+            "id": folder_id,
+            "name": name,
+            "parentFolderID": parent_folder_id,
+            "location": location,
+        }
+        self.subfolders[folder_id] = []
+        self.files[folder_id] = []
+        if parent_folder_id:
+            self.subfolders[parent_folder_id].append(folder_id)
+        return folder_id
+
+    def add_file(self, folder_id: int, file_id: int, body: bytes) -> None:
+        self.files[folder_id].append(
+            {"id": file_id, "name": f"file {file_id}", "type": "bin", "size": len(body)}
+        )
+        self.file_sizes[file_id] = len(body)
+        self.file_bodies[file_id] = body
+
+    @property
+    def total_size(self) -> int:
+        return sum(self.file_sizes.values())
+
+    def site_json(self) -> dict:
+        return {
+            "id": self.site_id,
+            "sitename": "Benchmark Site",
+            "sitedescription": "A site generated by the benchmark",
+            "sitefolderID": 1,
+            "status": "Active",
+            "createddate": "01 Jan 2021",
+            "siteowner": {
+                "firstname": "Bench",
+                "lastname": "Mark",
+                "email": "benchmark@example.com",
+            },
+            "rawsitesize": {
+                "activedocumentsize": self.total_size,
+                "deleteddocumentsize": 0,
+                "totalsize": self.total_size,
+            },
+            "module": {"document": {"enable": "1"}},
+            "categories": {"category": []},
+            "biddersite": {"enable": "0"},
+            "siteRestrictionType": {
+                "passwordprotected": 0,
+                "twoFactorAuthentication": 0,
+                "termsandconditions": 0,
+                "iprestrictedsite": 0,
+                "drm": 0,
+            },
+        }
+
+
+class FakeVDRServer:
+    """
+    A local stand-in for the VDR's API, serving a FakeVDRSite over real HTTP on a free port.
+
+    It answers every endpoint the http handlers call: the site list and detail, folder details, the subfolders and
+    files in a folder (paged by offset and limit), downloads and the soft and hard deletes. Deletes are counted but
+    don't change the tree, so the same site can be replicated and deleted again.
+
+    A download answers a single HTTP Range with a 206, unless supports_ranges is False or it comes with an If-Range
+    which isn't the file's ETag, and an If-None-Match of the file's ETag with a 304. The first download of a file in
+    drop_after is cut off after that many bytes of its body, as if the connection had been reset. Every download is
+    recorded in downloads as a (file_id, Range header) tuple, and its headers in download_headers.
+
+    Every request first sleeps for latency seconds. A fraction error_rate of them (chosen by a seeded random, so a
+    run is repeatable) are answered 503. If rate_limit is set, requests beyond that many a second are answered
+    429 with a Retry-After. Every request is counted in requests by the kind of call, and the errors in errors.
+    """
+
+    def __init__(
+        self,
+        site: FakeVDRSite,
+        latency: float = 0,
+        error_rate: float = 0,
+        rate_limit: float = None,
+        seed: int = 0,
+        supports_ranges: bool = True,
+        drop_after: Dict[int, int] = None,
+    ):
+        self.site = site
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.supports_ranges = supports_ranges
+        self.drop_after = dict(drop_after or {})
+        self.requests = Counter()
+        self.errors = Counter()
+        self.downloads = []
+        self.download_headers = []
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._window_start = time.monotonic()
+        self._window_requests = 0
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address
+        return f"http://{host}:{port}"
+
+    @property
+    def total_requests(self) -> int:
+        return sum(self.requests.values())
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def reset_counts(self):
+        with self._lock:
+            self.requests.clear()
+            self.errors.clear()
+            self.downloads.clear()
+            self.download_headers.clear()
+
+    def _admit(self, kind: str):
+        # counts the request, and decides whether it is throttled or fails
+        with self._lock:
+            self.requests[kind] += 1
+            if self.rate_limit:
+                now = time.monotonic()
+                if now - self._window_start >= 1:
+                    self._window_start, self._window_requests = now, 0
+                self._window_requests += 1
+                if self._window_requests > self.rate_limit:
+                    self.errors[429] += 1
+                    return 429
+            if self.error_rate and self._random.random() < self.error_rate:
+                self.errors[503] += 1
+                return 503
+        return None
+
+    def _handler_class(self):
+        server = self
+        site = self.site
+
+        routes = [
+            ("GET", re.compile(r"/sites/(\d+)"), "site_detail"),
+            ("GET", re.compile(r"/sites"), "site_list"),
+            ("GET", re.compile(r"/folder/(\d+)"), "folder"),
+            ("GET", re.compile(r"/subfolders/(\d+)"), "subfolders"),
+            ("GET", re.compile(r"/files-in-folder/(\d+)"), "files_in_folder"),
+            ("GET", re.compile(r"/download/(\d+)"), "download"),
+            ("DELETE", re.compile(r"/soft-delete-file/(\d+)"), "soft_delete_file"),
+            ("DELETE", re.compile(r"/hard-delete-file/(\d+)"), "hard_delete_file"),
+            (
+                "DELETE",
+                re.compile(r"/soft-delete-folder/(\d+)"),
+                "soft_delete_folder",
+            ),
+            (
+                "DELETE",
+                re.compile(r"/hard-delete-folder/(\d+)"),
+                "hard_delete_folder",
+            ),
+        ]
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send_json(self, body, status=200):
+                content = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def _send_status(self, status):
+                self.send_response(status)
+                if status == 429:
+                    self.send_header("Retry-After", "1")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def _route(self, method):
+                path = self.path.split("?", 1)[0]
+                for route_method, pattern, kind in routes:
+                    match = pattern.fullmatch(path)
+                    if route_method == method and match:
+                        return kind, int(match.group(1)) if match.groups() else None
+                return None, None
+
+            def _handle(self, method):
+                kind, item_id = self._route(method)
+                if kind is None:
+                    self._send_status(404)
+                    return
+
+                if server.latency:
+                    time.sleep(server.latency)
+                status = server._admit(kind)
+                if status:
+                    self._send_status(status)
+                    return
+                getattr(self, f"_{kind}")(item_id)
+
+            def do_GET(self):
+                self._handle("GET")
+
+            def do_DELETE(self):
+                self._handle("DELETE")
+
+            def _site_list(self, _):
+                self._send_json({"site": [site.site_json()], "sitecount": 1})
+
+            def _site_detail(self, site_id):
+                if site_id != site.site_id:
+                    self._send_status(404)
+                    return
+                self._send_json(site.site_json())
+
+            def _folder(self, folder_id):
+                if folder_id not in site.folders:
+                    self._send_status(404)
+                    return
+                self._send_json(site.folders[folder_id])
+
+            def _page(self, items):
+                query = parse_qs(urlsplit(self.path).query)
+                offset = int(query.get("offset", [0])[0])
+                limit = int(query.get("limit", [len(items)])[0])
+                return items[offset : offset + limit]
+
+            def _subfolders(self, folder_id):
+                children = site.subfolders.get(folder_id, [])
+                self._send_json(
+                    {"folder": [site.folders[child] for child in self._page(children)]}
+                )
+
+            def _files_in_folder(self, folder_id):
+                files = site.files.get(folder_id, [])
+                self._send_json({"filetotal": len(files), "file": self._page(files)})
+
+            def _download(self, file_id):
+                if file_id not in site.file_sizes:
+                    self._send_status(404)
+                    return
+
+                size = site.file_sizes[file_id]
+                etag = f'"{file_id}-{size}"'
+                range_header = self.headers.get("Range")
+                with server._lock:
+                    server.downloads.append((file_id, range_header))
+                    server.download_headers.append(dict(self.headers))
+                    drop_after = server.drop_after.pop(file_id, None)
+
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+
+                status, start, end = 200, 0, size - 1
+                range_match = range_header and RANGE_PATTERN.fullmatch(range_header)
+                if (
+                    server.supports_ranges
+                    and range_match
+                    and self.headers.get("If-Range") in (None, etag)
+                ):
+                    status = 206
+                    start = int(range_match.group(1) or 0)
+                    if range_match.group(2):
+                        end = min(int(range_match.group(2)), size - 1)
+                    if start > end:
+                        self._send_status(416)
+                        return
+
+                self.send_response(status)
+                self.send_header("Content-Length", str(end - start + 1))
+                self.send_header("ETag", etag)
+                if status == 206:
+                    self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+                self.end_headers()
+
+                if drop_after is not None:
+                    end = min(end, start + drop_after - 1)
+                    self.close_connection = True
+                self._write_body(site.file_bodies.get(file_id), start, end)
+
+            def _write_body(self, body, start, end):
+                if body is not None:
+                    self.wfile.write(body[start : end + 1])
+                    return
+
+                position = start
+                while position <= end:
+                    offset = position % len(_FILLER)
+                    count = min(len(_FILLER) - offset, end - position + 1)
+                    self.wfile.write(_FILLER[offset : offset + count])
+                    position += count
+
+            def _deleted(self, _):
+                self._send_json({})
+
+            _soft_delete_file = _hard_delete_file = _deleted
+            _soft_delete_folder = _hard_delete_folder = _deleted
+
+        return Handler
@@ -1,3 +1,7 @@
+import codecs
+import json
+from typing import Iterator
+
 from core.dataclasses.file_and_folder_dataclasses import (
     VDRFile,
     VDRFileList,
@@ -6,6 +10,23 @@ from core.dataclasses.file_and_folder_dataclasses import (
 )
 
 
+# the json from the VDR is checked field by field as it is parsed, the way pydantic would, so that the dataclasses
+# can be built without validating them again (see VDRFile.trusted)
+def _int(value) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"expected an integer, got {value!r}") from None
+
+
+def _str(value) -> str:
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (int, float)):
+        return str(value)
+    raise ValueError(f"expected a string, got {value!r}")
+
+
 def parse_get_folder_details(json) -> VDRFolder:
     """
 
@@ -17,15 +38,33 @@ def parse_get_folder_details(json) -> VDRFolder:
     :return: pydantic dataclass for VDRFolder
     """
 
-    folder = VDRFolder(
-        id=json["id"],
-        name=json["name"],
-        parent_folder_id=json["parentFolderID"],
-        location=json["location"],
+    folder = VDRFolder.trusted(
+        id=_int(json["id"]),
+        name=_str(json["name"]),
+        parent_folder_id=_int(json["parentFolderID"]),
+        location=_str(json["location"]),
     )
     return folder
 
 
+def parse_file_details(json) -> VDRFile:
+    """
+
+    Turn json of VDR File into Dataclass
+
+    :param json: json object
+    :return: pydantic dataclass for VDRFile
+    """
+
+    file = VDRFile.trusted(
+        id=_int(json["id"]),
+        name=_str(json["name"]),
+        type=_str(json["type"]),
+        size=_int(json["size"]),
+    )
+    return file
+
+
 def parse_get_single_folder_subfolders(json) -> VDRSubFolderList:
 
     """
@@ -40,15 +79,10 @@ def parse_get_single_folder_subfolders(json) -> VDRSubFolderList:
 
     folder_list = []
     for item in json["folder"]:
-        folder = VDRFolder(
-            id=item["id"],
-            name=item["name"],
-            parent_folder_id=item["parentFolderID"],
-            location=item["location"],
-        )
+        folder = parse_get_folder_details(item)
         folder_list.append(folder)
 
-    pydantic_folder_list = VDRSubFolderList(subfolder_list=folder_list)
+    pydantic_folder_list = VDRSubFolderList.construct(subfolder_list=folder_list)
     return pydantic_folder_list
 
 
@@ -67,13 +101,153 @@ def parse_get_files_in_single_folder(json) -> VDRFileList:
     file_list = []
 
     for item in json["file"]:
-        file = VDRFile(
-            id=item["id"],
-            name=item["name"],
-            type=item["type"],
-            size=item["size"],
-        )
+        file = parse_file_details(item)
         file_list.append(file)
 
-    pydantic_file_list = VDRFileList(file_list=file_list)
+    pydantic_file_list = VDRFileList.construct(file_list=file_list)
     return pydantic_file_list
+
+
+_json_decoder = json.JSONDecoder()
+
+_JSON_WHITESPACE = " \t\n\r"
+
+
+class _JSONStreamReader:
+    # reads json values one at a time from a binary stream, holding only what has been read but not yet parsed
+
+    def __init__(self, stream, chunk_size: int):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.text = ""
+        self.position = 0
+        self.finished = False
+
+    def _read(self) -> bool:
+        if self.finished:
+            return False
+        chunk = self.stream.read(self.chunk_size)
+        self.finished = not chunk
+        self.text = self.text[self.position :] + self.decoder.decode(
+            chunk, final=self.finished
+        )
+        self.position = 0
+        return True
+
+    def peek(self) -> str:
+        while True:
+            while (
+                self.position < len(self.text)
+                and self.text[self.position] in _JSON_WHITESPACE
+            ):
+                self.position += 1
+            if self.position < len(self.text):
+                return self.text[self.position]
+            if not self._read():
+                raise ValueError("the json ended part of the way through")
+
+    def expect(self, character: str) -> None:
+        found = self.peek()
+        if found != character:
+            raise ValueError(f"expected {character!r} in the json, found {found!r}")
+        self.position += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = _json_decoder.raw_decode(self.text, self.position)
+            except json.JSONDecodeError:
+                if not self._read():
+                    raise
+                continue
+            # a number at the end of what has been read so far may carry on in the next chunk
+            if end < len(self.text) or not self._read():
+                self.position = end
+                return value
+
+
+def iter_json_array_items(
+    stream, items_key: str, fields: dict = None, chunk_size: int = 64 * 1024
+) -> Iterator:
+
+    """
+    Incrementally parse a json object, yielding each item of one of its arrays as soon as it has been read
+
+    Reads the object from a stream a chunk at a time, so only the item being parsed is held in memory rather than
+    the whole body, its parsed json and every item. Any other members of the object (e.g. a total) are parsed whole
+    and put in fields as they are reached - one which comes after the array is only there once every item has been
+    yielded.
+
+    :param stream: a binary file object holding a json object, e.g. the raw stream of a response
+    :param items_key: the key of the array to yield the items of
+    :param fields: a dict to put the object's other members in, optional
+    :param chunk_size: the bytes read from the stream at a time
+    :return: a generator of the json of each item
+    """
+
+    reader = _JSONStreamReader(stream, chunk_size)
+    reader.expect("{")
+    if reader.peek() == "}":
+        return
+
+    while True:
+        key = reader.value()
+        reader.expect(":")
+        if key == items_key and reader.peek() == "[":
+            reader.expect("[")
+            if reader.peek() == "]":
+                reader.expect("]")
+            else:
+                while True:
+                    yield reader.value()
+                    if reader.peek() != ",":
+                        reader.expect("]")
+                        break
+                    reader.expect(",")
+        else:
+            value = reader.value()
+            if fields is not None:
+                fields[key] = value
+
+        if reader.peek() != ",":
+            reader.expect("}")
+            return
+        reader.expect(",")
+
+
+def iter_parse_single_folder_subfolders(
+    stream, fields: dict = None
+) -> Iterator[VDRFolder]:
+
+    """
+
+    Turn a streamed json for a list of VDR Folders into Dataclasses, one at a time
+
+    The streaming equivalent of parse_get_single_folder_subfolders, see iter_json_array_items.
+
+    :param stream: a binary file object, e.g. the raw stream of a response
+    :param fields: a dict to put the listing's other members in, optional
+    :return: a generator of pydantic dataclasses for VDRFolder
+    """
+
+    for item in iter_json_array_items(stream, "folder", fields):
+        yield parse_get_folder_details(item)
+
+
+def iter_parse_files_in_single_folder(stream, fields: dict = None) -> Iterator[VDRFile]:
+
+    """
+
+    Turn a streamed json for a list of VDR Files into Dataclasses, one at a time
+
+    The streaming equivalent of parse_get_files_in_single_folder, see iter_json_array_items.
+
+    :param stream: a binary file object, e.g. the raw stream of a response
+    :param fields: a dict to put the listing's other members in (e.g. filetotal), optional
+    :return: a generator of pydantic dataclasses for VDRFile
+    """
+
+    for item in iter_json_array_items(stream, "file", fields):
+        yield parse_file_details(item)
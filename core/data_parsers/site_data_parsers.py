@@ -11,7 +11,7 @@ from core.dataclasses.site_dataclasses import (
 )
 
 
-def parse_get_all_sites(json) -> VDRSiteList:
+def parse_get_all_sites(json, page_size: int = 10) -> VDRSiteList:
 
     """
     Turn json of VDR Sites into Dataclass
@@ -20,6 +20,7 @@ def parse_get_all_sites(json) -> VDRSiteList:
     Worth noting that confusingly the 'key' returned from the external service for their site list is 'site' singular
 
     :param: json object
+    :param page_size: the number of sites the list was asked for a page of
     :return: vdr site list as Dataclass
     """
 
@@ -42,10 +43,8 @@ def parse_get_all_sites(json) -> VDRSiteList:
         site_list.append(site)
 
     site_count = json["sitecount"]
-    number_of_pages = ceil(site_count / 10)
-    final_offset = round(site_count, -1)
-    if final_offset > site_count:
-        final_offset = final_offset - 10
+    number_of_pages = ceil(site_count / page_size)
+    final_offset = max(number_of_pages - 1, 0) * page_size
 
     pydantic_site_list = VDRSiteList(
         site_count=site_count,
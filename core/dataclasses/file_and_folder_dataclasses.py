@@ -1,4 +1,6 @@
-from typing import List
+import sys
+from array import array
+from typing import Iterable, List
 
 from pydantic import BaseModel
 
@@ -9,6 +11,20 @@ class VDRFolder(BaseModel):
     parent_folder_id: int
     location: str
 
+    @classmethod
+    def trusted(
+        cls, id: int, name: str, parent_folder_id: int, location: str
+    ) -> "VDRFolder":
+        # skips validation, for values already checked or read from the DB. Every field is set, so the instances
+        # can share one fields set rather than each holding their own
+        return cls.construct(
+            _VDR_FOLDER_FIELDS,
+            id=id,
+            name=name,
+            parent_folder_id=parent_folder_id,
+            location=location,
+        )
+
 
 class VDRSubFolderList(BaseModel):
     subfolder_list: List[VDRFolder]
@@ -20,6 +36,63 @@ class VDRFile(BaseModel):
     type: str
     size: int
 
+    @classmethod
+    def trusted(cls, id: int, name: str, type: str, size: int) -> "VDRFile":
+        # see VDRFolder.trusted
+        return cls.construct(_VDR_FILE_FIELDS, id=id, name=name, type=type, size=size)
+
 
 class VDRFileList(BaseModel):
     file_list: List[VDRFile]
+
+
+_VDR_FOLDER_FIELDS = set(VDRFolder.__fields__)
+_VDR_FILE_FIELDS = set(VDRFile.__fields__)
+
+
+class CompactFileList:
+    """
+    A class used to hold a long list of files in a fraction of the memory of a VDRFileList
+
+    Rather than a VDRFile for each file, the ids and sizes are kept in arrays of ints, and the names and types in
+    lists (with each type interned, as most are repeated). A VDRFile is built for each file, without validation,
+    as it is iterated over. Meant for files which have already been validated, e.g. read back from a manifest.
+
+    ...
+
+    Attributes
+    ----------
+    file_list : CompactFileList
+        itself, so it can be iterated over like the file_list of a VDRFileList
+
+    Methods
+    -------
+    append(id, name, type, size)
+        Adds a file to the end of the list
+
+    """
+
+    def __init__(self, files: Iterable[VDRFile] = ()):
+        self._ids = array("q")
+        self._sizes = array("q")
+        self._names = []
+        self._types = []
+        for file in files:
+            self.append(file.id, file.name, file.type, file.size)
+
+    @property
+    def file_list(self):
+        return self
+
+    def append(self, id: int, name: str, type: str, size: int) -> None:
+        self._ids.append(id)
+        self._sizes.append(size)
+        self._names.append(name)
+        self._types.append(sys.intern(type))
+
+    def __iter__(self):
+        for file in zip(self._ids, self._names, self._types, self._sizes):
+            yield VDRFile.trusted(*file)
+
+    def __len__(self):
+        return len(self._ids)
@@ -9,3 +9,14 @@ class VDRServiceError(BaseModel):
     status_code: int
     endpoint: str
     timestamp: datetime
+
+
+class VDRTransferResult(BaseModel):
+    file_id: int
+    file_name: str
+    destination: str = ""
+    success: bool
+    error_message: str = ""
+    # the bytes transferred, and the seconds the transfer took, for the report
+    size: int = 0
+    duration: float = 0
@@ -31,3 +31,22 @@ class SettingsForm(ModelForm):
             "aws_access_key_id": PasswordInput(render_value=True),
             "aws_secret_access_key": PasswordInput(render_value=True),
         }
+
+    # S3 transfer tuning is optional: left out or blank, the current (or default) value is kept
+    optional_fields = (
+        "s3_multipart_threshold",
+        "s3_multipart_chunksize",
+        "s3_max_concurrency",
+    )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for field_name in self.optional_fields:
+            self.fields[field_name].required = False
+
+    def clean(self):
+        cleaned_data = super().clean()
+        for field_name in self.optional_fields:
+            if cleaned_data.get(field_name) is None:
+                cleaned_data[field_name] = getattr(self.instance, field_name)
+        return cleaned_data
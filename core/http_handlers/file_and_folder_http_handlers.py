@@ -1,15 +1,21 @@
 import datetime
+from concurrent.futures import ThreadPoolExecutor
 
-import requests
-from allauth.socialaccount.models import SocialToken
+from django.conf import settings
 
 from core.data_parsers.file_and_folder_data_parsers import (
-    parse_get_files_in_single_folder,
+    iter_parse_files_in_single_folder,
+    iter_parse_single_folder_subfolders,
     parse_get_folder_details,
-    parse_get_single_folder_subfolders,
 )
+from core.dataclasses.file_and_folder_dataclasses import VDRFileList, VDRSubFolderList
 from core.dataclasses.utility_dataclasses import VDRServiceError
-from core.http_handlers.utils import get_setting
+from core.http_handlers.session import get_vdr_session
+from core.http_handlers.utils import (
+    build_range_header,
+    get_access_token,
+    get_setting,
+)
 
 
 def get_single_folder_details(request_user, folder_id: int):
@@ -27,14 +33,14 @@ def get_single_folder_details(request_user, folder_id: int):
     """
     VDR_BASEURL = get_setting("remote_system_base_url")
 
-    access_token = SocialToken.objects.get(account__user=request_user)
+    access_token = get_access_token(request_user)
     url = f"{VDR_BASEURL}/folder/{folder_id}"
     headers = {
         "Authorization": f"Bearer {access_token}",
         "Accept": "application/json",
     }
 
-    response = requests.get(url, headers=headers)
+    response = get_vdr_session().get(url, headers=headers)
     if response.status_code != 200:
         result = VDRServiceError(
             message=response.text,
@@ -48,75 +54,202 @@ def get_single_folder_details(request_user, folder_id: int):
     return result
 
 
-def get_sub_folders_of_single_folder(request_user, folder_id: int):
-
-    """
-    Gets the subfolders within a single folder from the VDR API
-
-    Makes an http call to the External Service to get all the subfolders inside a single folder,
-    sends the json response to the data parsing function.
-
-    :param request_user: the user authenticated during the request
-    :param folder_id: int
-    :return: a data class for an array of single folders details
-    """
+def _listing_request(request_user, path: str):
     VDR_BASEURL = get_setting("remote_system_base_url")
 
-    access_token = SocialToken.objects.get(account__user=request_user)
-    url = f"{VDR_BASEURL}/subfolders/{folder_id}"
+    access_token = get_access_token(request_user)
+    url = f"{VDR_BASEURL}/{path}"
     headers = {
         "Authorization": f"Bearer {access_token}",
         "Accept": "application/json",
     }
+    return url, headers
+
 
-    response = requests.get(url, headers=headers)
+def _get_listing_page(url: str, headers: dict, offset: int, limit: int):
+    page_url = f"{url}?offset={offset}&limit={limit}"
+    response = get_vdr_session().get(page_url, headers=headers, stream=True)
     if response.status_code != 200:
-        result = VDRServiceError(
+        return VDRServiceError(
             message=response.text,
             status_code=response.status_code,
-            endpoint=url,
+            endpoint=page_url,
             timestamp=datetime.datetime.now(),
         )
-    else:
-        result = parse_get_single_folder_subfolders(response.json())
-    return result
+    # the body is parsed as it is read, so undo any transfer encoding here
+    response.raw.decode_content = True
+    return response
 
 
-def get_files_in_single_folder(request_user, folder_id: int):
+def _discard_listing_page(future) -> None:
+    # a page fetched ahead of time which turned out not to be needed; hand its connection back to the pool
+    if future.cancel() or future.exception() is not None:
+        return
+    response = future.result()
+    if not isinstance(response, VDRServiceError):
+        response.close()
+
+
+def _iter_listing(
+    request_user, path: str, parse_items, total_key: str = None, page_size=None
+):
 
     """
-    Gets the files contained within a single folder from the VDR API
+    Pages through a listing from the VDR API with offset and limit, yielding its items one at a time.
 
-    Makes an http call to the External Service to get all the files from inside a single folder,
-    sends the json response to the data parsing function.
+    Each page is streamed, and its items parsed and yielded as its body is read, so neither the body nor the whole
+    page of items is ever held at once. Once a full page of items has been read, the next page is fetched on a
+    second thread while the caller handles the rest, unless a total sent ahead of the items says there is none. The
+    listing ends with a short page, once total_key (if the listing has one) says every item has been listed, or if
+    the VDR ignored the offset and sent the previous page again. The token and url are resolved here, so the
+    prefetch thread never touches the DB.
+
+    :param request_user: the user authenticated during the request
+    :param path: the path of the listing, under the VDR's base url
+    :param parse_items: parses a page from its stream, putting any members other than its items in a dict, e.g.
+    iter_parse_files_in_single_folder
+    :param total_key: the key of the total number of items in the listing, if it has one
+    :param page_size: the items to ask for a page of, defaults to VDR_LISTING_PAGE_SIZE
+    :return: a generator of the items. A page which fails is yielded as a VDRServiceError, and ends it
+    """
+    page_size = page_size or settings.VDR_LISTING_PAGE_SIZE
+    url, headers = _listing_request(request_user, path)
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        offset = 0
+        first_id = None
+        next_page = executor.submit(_get_listing_page, url, headers, offset, page_size)
+        try:
+            while next_page is not None:
+                response = next_page.result()
+                next_page = None
+                if isinstance(response, VDRServiceError):
+                    yield response
+                    return
+
+                fields = {}
+                count = 0
+                try:
+                    for item in parse_items(response.raw, fields):
+                        if not count:
+                            if offset and item.id == first_id:
+                                return
+                            first_id = item.id
+                        count += 1
+                        listed = offset + count
+                        # a total sent ahead of the items may already say this page is the last
+                        if count == page_size and listed < fields.get(
+                            total_key, listed + 1
+                        ):
+                            next_page = executor.submit(
+                                _get_listing_page, url, headers, listed, page_size
+                            )
+                        yield item
+                finally:
+                    response.close()
+                offset += count
+
+                if total_key in fields:
+                    more = count and offset < fields[total_key]
+                else:
+                    more = count >= page_size
+                if not more:
+                    return
+                if next_page is None:
+                    # the VDR sent fewer items than asked for, but its total says there are more
+                    next_page = executor.submit(
+                        _get_listing_page, url, headers, offset, page_size
+                    )
+        finally:
+            if next_page is not None:
+                next_page.add_done_callback(_discard_listing_page)
+
+
+def iter_sub_folders_of_single_folder(request_user, folder_id: int, page_size=None):
+
+    """
+    Pages through the subfolders within a single folder from the VDR API, see _iter_listing.
 
     :param request_user: the user authenticated during the request
     :param folder_id: int
-    :return: a data class for an array of files
+    :param page_size: the subfolders to ask for a page of, defaults to VDR_LISTING_PAGE_SIZE
+    :return: a generator of a data class for each subfolder, or a VDRServiceError which ends it
     """
-    VDR_BASEURL = get_setting("remote_system_base_url")
+    return _iter_listing(
+        request_user,
+        f"subfolders/{folder_id}",
+        iter_parse_single_folder_subfolders,
+        page_size=page_size,
+    )
 
-    access_token = SocialToken.objects.get(account__user=request_user)
-    url = f"{VDR_BASEURL}/files-in-folder/{folder_id}"
-    headers = {
-        "Authorization": f"Bearer {access_token}",
-        "Accept": "application/json",
-    }
 
-    response = requests.get(url, headers=headers)
-    if response.status_code != 200:
-        result = VDRServiceError(
-            message=response.text,
-            status_code=response.status_code,
-            endpoint=url,
-            timestamp=datetime.datetime.now(),
-        )
-    else:
-        result = parse_get_files_in_single_folder(response.json())
-    return result
+def iter_files_in_single_folder(request_user, folder_id: int, page_size=None):
+
+    """
+    Pages through the files contained within a single folder from the VDR API, see _iter_listing.
+
+    :param request_user: the user authenticated during the request
+    :param folder_id: int
+    :param page_size: the files to ask for a page of, defaults to VDR_LISTING_PAGE_SIZE
+    :return: a generator of a data class for each file, or a VDRServiceError which ends it
+    """
+    return _iter_listing(
+        request_user,
+        f"files-in-folder/{folder_id}",
+        iter_parse_files_in_single_folder,
+        total_key="filetotal",
+        page_size=page_size,
+    )
+
+
+def get_sub_folders_of_single_folder(request_user, folder_id: int):
+
+    """
+    Gets the subfolders within a single folder from the VDR API
 
+    Pages through all the subfolders inside a single folder with iter_sub_folders_of_single_folder,
+    and gathers them into one list.
 
-def download_single_file(request_user, file_id: int):
+    :param request_user: the user authenticated during the request
+    :param folder_id: int
+    :return: a data class for an array of single folders details, or a VDRServiceError if any page failed
+    """
+    subfolder_list = []
+    for folder in iter_sub_folders_of_single_folder(request_user, folder_id):
+        if isinstance(folder, VDRServiceError):
+            return folder
+        subfolder_list.append(folder)
+    return VDRSubFolderList.construct(subfolder_list=subfolder_list)
+
+
+def get_files_in_single_folder(request_user, folder_id: int):
+
+    """
+    Gets the files contained within a single folder from the VDR API
+
+    Pages through all the files from inside a single folder with iter_files_in_single_folder,
+    and gathers them into one list.
+
+    :param request_user: the user authenticated during the request
+    :param folder_id: int
+    :return: a data class for an array of files, or a VDRServiceError if any page failed
+    """
+    file_list = []
+    for file in iter_files_in_single_folder(request_user, folder_id):
+        if isinstance(file, VDRServiceError):
+            return file
+        file_list.append(file)
+    return VDRFileList.construct(file_list=file_list)
+
+
+def download_single_file(
+    request_user,
+    file_id: int,
+    start_byte: int = None,
+    end_byte: int = None,
+    if_range: str = None,
+    if_none_match: str = None,
+):
 
     """
 
@@ -124,20 +257,39 @@ def download_single_file(request_user, file_id: int):
 
     Makes an http call to the External Service to download a single file,
 
+    Passing a start_byte and/or end_byte asks for just that (inclusive) range of the file with an HTTP Range header.
+    The VDR answers a range with a 206, but may ignore the header and send the whole file with a 200, so the caller
+    should check which it got. An if_range ETag sends the range as an If-Range request, so the VDR sends the whole
+    file instead if it has changed since that ETag. An if_none_match ETag makes the download conditional: the VDR
+    answers a 304 with no body if the file still has that ETag.
+
     :param request_user: the user authenticated during the request
     :param file_id: int
+    :param start_byte: the first byte of the range to download, optional
+    :param end_byte: the last byte of the range to download, optional
+    :param if_range: the ETag the range was worked out against, optional
+    :param if_none_match: the ETag of the copy of the file already held, optional
     :return: the response object from the call to the http service
     """
     VDR_BASEURL = get_setting("remote_system_base_url")
 
-    access_token = SocialToken.objects.get(account__user=request_user)
+    access_token = get_access_token(request_user)
     url = f"{VDR_BASEURL}/download/{file_id}"
     headers = {
         "Authorization": f"Bearer {access_token}",
         "Accept": "application/json",
     }
-    response = requests.get(url, headers=headers, stream=True)
-    if response.status_code != 200:
+    if start_byte is not None or end_byte is not None:
+        headers["Range"] = build_range_header(start_byte, end_byte)
+        if if_range:
+            headers["If-Range"] = if_range
+    if if_none_match:
+        headers["If-None-Match"] = if_none_match
+
+    response = get_vdr_session().get(url, headers=headers, stream=True)
+    if response.status_code not in (200, 206) and not (
+        if_none_match and response.status_code == 304
+    ):
         result = VDRServiceError(
             message=response.text,
             status_code=response.status_code,
@@ -163,13 +315,13 @@ def shallow_delete_single_file(request_user, file_id: int):
     """
     VDR_BASEURL = get_setting("remote_system_base_url")
 
-    access_token = SocialToken.objects.get(account__user=request_user)
+    access_token = get_access_token(request_user)
     url = f"{VDR_BASEURL}/soft-delete-file/{file_id}"
     headers = {
         "Authorization": f"Bearer {access_token}",
         "Accept": "application/json",
     }
-    response = requests.delete(url, headers=headers)
+    response = get_vdr_session().delete(url, headers=headers)
     if response.status_code != 200:
         result = VDRServiceError(
             message=response.text,
@@ -183,7 +335,6 @@ def shallow_delete_single_file(request_user, file_id: int):
     return result
 
 
-
 def permanently_delete_single_file(request_user, file_id: int):
 
     """
@@ -198,13 +349,13 @@ def permanently_delete_single_file(request_user, file_id: int):
     """
     VDR_BASEURL = get_setting("remote_system_base_url")
 
-    access_token = SocialToken.objects.get(account__user=request_user)
+    access_token = get_access_token(request_user)
     url = f"{VDR_BASEURL}/hard-delete-file/{file_id}"
     headers = {
         "Authorization": f"Bearer {access_token}",
         "Accept": "application/json",
     }
-    response = requests.delete(url, headers=headers)
+    response = get_vdr_session().delete(url, headers=headers)
     if response.status_code != 200:
         result = VDRServiceError(
             message=response.text,
@@ -232,13 +383,13 @@ def shallow_delete_single_folder(request_user, folder_id: int):
     """
     VDR_BASEURL = get_setting("remote_system_base_url")
 
-    access_token = SocialToken.objects.get(account__user=request_user)
+    access_token = get_access_token(request_user)
     url = f"{VDR_BASEURL}/soft-delete-folder/{folder_id}"
     headers = {
         "Authorization": f"Bearer {access_token}",
         "Accept": "application/json",
     }
-    response = requests.delete(url, headers=headers)
+    response = get_vdr_session().delete(url, headers=headers)
     if response.status_code != 200:
         result = VDRServiceError(
             message=response.text,
@@ -266,13 +417,13 @@ def permanently_delete_single_folder(request_user, folder_id: int):
     """
     VDR_BASEURL = get_setting("remote_system_base_url")
 
-    access_token = SocialToken.objects.get(account__user=request_user)
+    access_token = get_access_token(request_user)
     url = f"{VDR_BASEURL}/hard-delete-folder/{folder_id}"
     headers = {
         "Authorization": f"Bearer {access_token}",
         "Accept": "application/json",
     }
-    response = requests.delete(url, headers=headers)
+    response = get_vdr_session().delete(url, headers=headers)
     if response.status_code != 200:
         result = VDRServiceError(
             message=response.text,
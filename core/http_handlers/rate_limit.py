@@ -0,0 +1,264 @@
+import email.utils
+import logging
+import os
+import random
+import threading
+import time
+from typing import Optional
+from urllib.parse import urlsplit
+
+import redis
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# the statuses the VDR throttles with. 503 is retried here rather than by the adapter's urllib3 Retry, so that
+# every worker backs off, not just the one which got it
+THROTTLE_STATUS_CODES = (429, 503)
+
+# KEYS[1]: the bucket. ARGV: the budget (requests a second, 0 for no limit), the seconds of budget which can be
+# spent in a burst, the seconds a cut rate takes to climb back to the budget, and the ttl of the bucket.
+# Returns the seconds to wait before asking again, 0 once a token has been taken. Returned as a string, as Redis
+# truncates numbers returned from Lua to integers
+_ACQUIRE_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local budget = tonumber(ARGV[1])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'rate', 'updated', 'blocked_until')
+local blocked_until = tonumber(state[4]) or 0
+if budget <= 0 then
+    return tostring(math.max(blocked_until - now, 0))
+end
+
+local updated = tonumber(state[3]) or now
+local elapsed = math.max(now - updated, 0)
+local rate = math.min(budget, (tonumber(state[2]) or budget) + elapsed * budget / tonumber(ARGV[3]))
+local capacity = math.max(rate * tonumber(ARGV[2]), 1)
+local tokens = math.min(capacity, (tonumber(state[1]) or capacity) + elapsed * rate)
+
+local wait = 0
+if blocked_until > now then
+    wait = blocked_until - now
+elseif tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'rate', rate, 'updated', now)
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+return tostring(wait)
+"""
+
+# KEYS[1]: the bucket. ARGV: the seconds to block it for, the budget, the fraction of the budget the rate is never
+# cut below, and the ttl of the bucket. The rate is halved once per throttling, however many requests were throttled
+_THROTTLE_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local budget = tonumber(ARGV[2])
+local state = redis.call('HMGET', KEYS[1], 'rate', 'blocked_until')
+local rate = tonumber(state[1]) or budget
+local blocked_until = tonumber(state[2]) or 0
+if blocked_until <= now then
+    rate = math.max(rate / 2, budget * tonumber(ARGV[3]))
+end
+blocked_until = math.max(blocked_until, now + tonumber(ARGV[1]))
+redis.call('HSET', KEYS[1], 'rate', rate, 'tokens', 0, 'updated', now, 'blocked_until', blocked_until)
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+return tostring(rate)
+"""
+
+_rate_limit_redis = None
+_rate_limit_redis_pid = None
+_rate_limit_redis_lock = threading.Lock()
+
+
+def get_rate_limit_redis() -> Optional[redis.Redis]:
+
+    """
+    Returns the Redis client the rate limits are shared through, for the current process. Like the VDR Session, it
+    is rebuilt after a fork.
+
+    :return: a redis client for VDR_RATE_LIMIT_REDIS_URL, or None if it is not set
+    """
+    global _rate_limit_redis, _rate_limit_redis_pid
+
+    if not settings.VDR_RATE_LIMIT_REDIS_URL:
+        return None
+
+    pid = os.getpid()
+    if _rate_limit_redis is None or _rate_limit_redis_pid != pid:
+        with _rate_limit_redis_lock:
+            if _rate_limit_redis is None or _rate_limit_redis_pid != pid:
+                # every request to the VDR waits on the limiter, so it must never hang on Redis
+                _rate_limit_redis = redis.Redis.from_url(
+                    settings.VDR_RATE_LIMIT_REDIS_URL,
+                    decode_responses=True,
+                    socket_connect_timeout=1,
+                    socket_timeout=1,
+                )
+                _rate_limit_redis_pid = pid
+
+    return _rate_limit_redis
+
+
+def budget_for_url(url: str) -> str:
+
+    """
+    :param url: the url of a call to the VDR
+    :return: the name of the budget in VDR_RATE_LIMITS the call is made from: download, delete or default
+    """
+    path = urlsplit(url).path
+    if "/download/" in path:
+        return "download"
+    if "-delete-" in path:
+        return "delete"
+    return "default"
+
+
+def retry_after_seconds(headers) -> Optional[float]:
+
+    """
+    :param headers: the headers of a response
+    :return: the seconds the Retry-After header asks for, given either as seconds or as an HTTP date, or None
+    """
+    value = headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(retry_at.timestamp() - time.time(), 0)
+
+
+def throttle_wait(headers, attempt: int) -> float:
+
+    """
+    The seconds to back off for after the VDR has throttled a request: what its Retry-After asks for, or else an
+    exponential backoff with jitter. Either way, no more than VDR_RATE_LIMIT_MAX_WAIT.
+
+    :param headers: the headers of the throttled response
+    :param attempt: how many times the request has been throttled before
+    :return: seconds
+    """
+    wait = retry_after_seconds(headers)
+    if wait is None:
+        wait = settings.VDR_HTTP_BACKOFF_FACTOR * 2**attempt
+        wait *= 0.5 + random.random() / 2
+    return min(wait, settings.VDR_RATE_LIMIT_MAX_WAIT)
+
+
+class RateLimiter:
+    """
+    A class used to share the VDR's rate limits between every thread of every worker, as token buckets in Redis
+
+    There is a bucket for each budget in VDR_RATE_LIMITS, refilled at that many requests a second, and every request
+    to the VDR takes a token from the bucket of its budget first. Each bucket is read and updated by a single Lua
+    script, so workers never race for the same token.
+
+    When the VDR throttles a request anyway, the bucket is blocked for the time the VDR asked for, so every worker
+    waits rather than just the one which was throttled, and the bucket's rate is halved (to no less than
+    VDR_RATE_LIMIT_MIN_FRACTION of its budget). It climbs back to the budget over VDR_RATE_LIMIT_RECOVERY seconds.
+
+    Without VDR_RATE_LIMIT_REDIS_URL, or if Redis can't be reached, requests are let straight through - a migration
+    is never stopped by its limiter - and only the thread which was throttled backs off. After Redis fails, it is
+    not tried again for VDR_RATE_LIMIT_MAX_WAIT seconds.
+
+    ...
+
+    Attributes
+    ----------
+    client : redis.Redis
+        the Redis client the buckets are kept in, get_rate_limit_redis() if not given
+
+    Methods
+    -------
+    reserve()
+        Takes a token from a budget's bucket, or says how long to wait for one
+
+    acquire()
+        Blocks until a token can be taken from a budget's bucket
+
+    throttle()
+        Blocks a budget's bucket, and cuts its rate, after the VDR throttled a request
+
+    """
+
+    def __init__(self, client: redis.Redis = None):
+        self.client = client
+        self._unavailable_until = 0
+
+    def _run(self, script: str, budget: str, *args) -> float:
+        client = self.client or get_rate_limit_redis()
+        if client is None or time.monotonic() < self._unavailable_until:
+            return 0
+        try:
+            return float(
+                client.register_script(script)(
+                    keys=[f"vdr:ratelimit:{budget}"], args=list(args)
+                )
+            )
+        except redis.RedisError as error:
+            logger.warning("could not reach the VDR rate limiter: %s", error)
+            self._unavailable_until = (
+                time.monotonic() + settings.VDR_RATE_LIMIT_MAX_WAIT
+            )
+            return 0
+
+    def _budget(self, budget: str) -> float:
+        return settings.VDR_RATE_LIMITS.get(budget, settings.VDR_RATE_LIMITS["default"])
+
+    def _ttl(self) -> int:
+        return int(settings.VDR_RATE_LIMIT_RECOVERY + settings.VDR_RATE_LIMIT_MAX_WAIT)
+
+    def reserve(self, budget: str = "default") -> float:
+
+        """
+        Takes a token from a budget's bucket if there is one.
+
+        :param budget: the name of the budget in VDR_RATE_LIMITS to take a token from
+        :return: 0 if a token was taken, otherwise the seconds to wait before asking again
+        """
+        wait = self._run(
+            _ACQUIRE_SCRIPT,
+            budget,
+            self._budget(budget),
+            settings.VDR_RATE_LIMIT_BURST,
+            settings.VDR_RATE_LIMIT_RECOVERY,
+            self._ttl(),
+        )
+        return min(wait, settings.VDR_RATE_LIMIT_MAX_WAIT)
+
+    def acquire(self, budget: str = "default") -> float:
+
+        """
+        :param budget: the name of the budget in VDR_RATE_LIMITS to take a token from
+        :return: the seconds spent waiting for it
+        """
+        waited = 0
+        while True:
+            wait = self.reserve(budget)
+            if not wait:
+                return waited
+            time.sleep(wait)
+            waited += wait
+
+    def throttle(self, budget: str, wait: float) -> None:
+
+        """
+        :param budget: the name of the budget in VDR_RATE_LIMITS the throttled request was made from
+        :param wait: the seconds to block every worker's requests from the budget for
+        :return: None
+        """
+        self._run(
+            _THROTTLE_SCRIPT,
+            budget,
+            wait,
+            self._budget(budget),
+            settings.VDR_RATE_LIMIT_MIN_FRACTION,
+            self._ttl(),
+        )
@@ -0,0 +1,128 @@
+import os
+import threading
+import time
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from core.http_handlers.rate_limit import (
+    THROTTLE_STATUS_CODES,
+    RateLimiter,
+    budget_for_url,
+    throttle_wait,
+)
+
+_vdr_session = None
+_vdr_session_pid = None
+_vdr_session_lock = threading.Lock()
+
+# the methods which are safe to send again, the same ones urllib3 retries
+RETRYABLE_METHODS = frozenset(["GET", "DELETE"])
+
+
+class RateLimitedAdapter(HTTPAdapter):
+    """
+    An HTTPAdapter which takes a token from the shared RateLimiter before every request it sends, and which backs
+    off and sends a request again when the VDR throttles it with a 429 or 503
+
+    Throttled GETs and DELETEs are sent again up to VDR_HTTP_MAX_RETRIES times, after waiting as long as the
+    response's Retry-After asks (or an exponential backoff), and the limiter is told so every worker waits too.
+    The last response is handed back either way, so the http handlers can still wrap a failure in a
+    VDRServiceError.
+
+    ...
+
+    Attributes
+    ----------
+    rate_limiter : RateLimiter
+        the limiter the tokens are taken from
+
+    """
+
+    def __init__(self, *args, rate_limiter: RateLimiter = None, **kwargs):
+        self.rate_limiter = rate_limiter or RateLimiter()
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, **kwargs):
+        budget = budget_for_url(request.url)
+        attempts = (
+            settings.VDR_HTTP_MAX_RETRIES + 1
+            if request.method in RETRYABLE_METHODS
+            else 1
+        )
+        for attempt in range(attempts):
+            self.rate_limiter.acquire(budget)
+            response = super().send(request, **kwargs)
+            if (
+                response.status_code not in THROTTLE_STATUS_CODES
+                or attempt == attempts - 1
+            ):
+                return response
+
+            wait = throttle_wait(response.headers, attempt)
+            self.rate_limiter.throttle(budget, wait)
+            response.close()
+            time.sleep(wait)
+
+
+def _build_vdr_session() -> requests.Session:
+
+    """
+    Builds a requests Session with a pooled, retrying, rate limited HTTPAdapter mounted for both schemes.
+
+    Idempotent calls (GET and DELETE) are retried on connection errors and on the gateway style
+    status codes, with an exponential backoff. Throttling (429 and 503) is left to the RateLimitedAdapter, so
+    urllib3 is told not to act on a Retry-After.
+    The final response is always handed back to the caller, so the http handlers can still wrap a
+    failure in a VDRServiceError.
+
+    :return: a configured requests Session
+    """
+
+    retries = Retry(
+        total=settings.VDR_HTTP_MAX_RETRIES,
+        backoff_factor=settings.VDR_HTTP_BACKOFF_FACTOR,
+        status_forcelist=(502, 504),
+        allowed_methods=RETRYABLE_METHODS,
+        raise_on_status=False,
+        # urllib3 would otherwise send a 413, 429 or 503 with a Retry-After again itself, before the
+        # RateLimitedAdapter sees it, without taking a token or telling the other workers to back off
+        respect_retry_after_header=False,
+    )
+    adapter = RateLimitedAdapter(
+        pool_connections=settings.VDR_HTTP_POOL_CONNECTIONS,
+        pool_maxsize=settings.VDR_HTTP_POOL_MAXSIZE,
+        max_retries=retries,
+    )
+
+    session = requests.Session()
+    session.headers.update({"Connection": "keep-alive"})
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_vdr_session() -> requests.Session:
+
+    """
+    Returns the VDR Session for the current process, building it on first use.
+
+    Every call to the VDR goes through this session, so the TCP and TLS handshakes are paid once per
+    pooled connection rather than once per request. Celery prefork workers inherit module state from
+    the parent, so the session is rebuilt if we find ourselves in a new process - sockets must never be
+    shared across a fork.
+
+    :return: the process wide requests Session
+    """
+    global _vdr_session, _vdr_session_pid
+
+    pid = os.getpid()
+    if _vdr_session is None or _vdr_session_pid != pid:
+        with _vdr_session_lock:
+            if _vdr_session is None or _vdr_session_pid != pid:
+                _vdr_session = _build_vdr_session()
+                _vdr_session_pid = pid
+
+    return _vdr_session
@@ -0,0 +1,266 @@
+import hashlib
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+
+from celery import shared_task
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connections
+from django.http import QueryDict
+
+from core.dataclasses.site_dataclasses import VDRSiteDetail, VDRSiteList
+from core.dataclasses.utility_dataclasses import VDRServiceError
+from core.http_handlers.site_http_handlers import (
+    get_all_sites,
+    get_single_site_if_modified,
+)
+
+User = get_user_model()
+
+
+def _generation_key(user_id) -> str:
+    return f"vdr_site_list_generation_{user_id}"
+
+
+def _site_list_cache_key(user_id, generation: int, query_string: str) -> str:
+    # memcached keys can't hold every character a query string can
+    query_hash = hashlib.md5(query_string.encode()).hexdigest()
+    return f"vdr_site_list_{user_id}_{generation}_{query_hash}"
+
+
+def _normalised_query(query_params=None, **overrides) -> str:
+    # the same page asked for with its params in a different order, or with its own limit, is the same entry
+    params = QueryDict(mutable=True)
+    for key in sorted(query_params or {}):
+        if key != "limit":
+            params.setlist(key, query_params.getlist(key))
+    for key, value in overrides.items():
+        params[key] = value
+    return params.urlencode()
+
+
+def _current_generation(user_id) -> int:
+    return cache.get_or_set(_generation_key(user_id), 0, None)
+
+
+def _fetch_and_cache(request_user, generation: int, query_string: str):
+    site_list = get_all_sites(request_user, QueryDict(query_string))
+    if not isinstance(site_list, VDRServiceError):
+        cache.set(
+            _site_list_cache_key(request_user.id, generation, query_string),
+            (time.time(), site_list),
+            settings.VDR_SITE_LIST_CACHE_TTL + settings.VDR_SITE_LIST_STALE_TTL,
+        )
+    return site_list
+
+
+def _refresh_in_background(user_id, generation: int, query_string: str) -> None:
+    # only one refresh of an entry is queued at a time, however many requests find it stale. If the refresh never
+    # runs, the entry expires at the end of its stale window and the next request fetches it itself
+    refreshing_key = (
+        _site_list_cache_key(user_id, generation, query_string) + "_refreshing"
+    )
+    if cache.add(refreshing_key, True, settings.VDR_SITE_LIST_STALE_TTL):
+        refresh_site_list_task.delay(user_id, generation, query_string)
+
+
+@shared_task()
+def refresh_site_list_task(request_user_id: int, generation: int, query_string: str):
+
+    """
+    Fetches a page of a user's site list from the VDR into the cache, for get_cached_site_list().
+
+    :param request_user_id: the unique identifier of the user in the VDR System
+    :param generation: the generation of the user's site list the page was asked for in
+    :param query_string: the normalised query params of the page
+    :return: None
+    """
+    user = User.objects.get(id=request_user_id)
+    try:
+        _fetch_and_cache(user, generation, query_string)
+    finally:
+        cache.delete(
+            _site_list_cache_key(user.id, generation, query_string) + "_refreshing"
+        )
+
+
+def _prefetch_next_page(request_user, generation, query_params, site_list) -> None:
+    try:
+        offset = int(query_params.get("offset", 0)) if query_params else 0
+    except ValueError:
+        return
+    next_offset = offset + settings.VDR_SITE_LIST_PAGE_SIZE
+    if next_offset >= site_list.site_count:
+        return
+
+    next_query = _normalised_query(query_params, offset=next_offset)
+    if cache.get(_site_list_cache_key(request_user.id, generation, next_query)):
+        return
+    _refresh_in_background(request_user.id, generation, next_query)
+
+
+def get_cached_site_list(request_user, query_params=None):
+
+    """
+    Gets a page of the sites a user has access to, from the cache where possible.
+
+    A page is fresh for VDR_SITE_LIST_CACHE_TTL seconds. For VDR_SITE_LIST_STALE_TTL seconds after that it is still
+    served straight from the cache, while a celery task fetches it again in the background. Only a page which
+    isn't cached at all is fetched from the VDR during the request. Whenever a page is served, the page after it is
+    fetched in the background too, so paging through the list rarely waits on the VDR. Errors are never cached.
+
+    :param request_user: the user authenticated during the request
+    :param query_params: the query params of the request, e.g. its offset (optional)
+    :return: a data class for a list of the remote VDR sites, or a VDRServiceError
+    """
+    generation = _current_generation(request_user.id)
+    query_string = _normalised_query(query_params)
+
+    entry = cache.get(_site_list_cache_key(request_user.id, generation, query_string))
+    if entry is None:
+        site_list = _fetch_and_cache(request_user, generation, query_string)
+    else:
+        fetched_at, site_list = entry
+        if time.time() - fetched_at >= settings.VDR_SITE_LIST_CACHE_TTL:
+            _refresh_in_background(request_user.id, generation, query_string)
+
+    if isinstance(site_list, VDRSiteList):
+        _prefetch_next_page(request_user, generation, query_params, site_list)
+    return site_list
+
+
+def invalidate_site_list(user_id) -> None:
+
+    """
+    Drops every cached page of a user's site list, and every site detail, e.g. once a job has changed the sites'
+    sizes or removed one.
+
+    memcached can't delete keys by prefix, so the entries are keyed by a generation number which is bumped instead;
+    the old entries are never read again and expire by themselves.
+
+    :param user_id: the unique identifier of the user
+    :return: None
+    """
+    try:
+        cache.incr(_generation_key(user_id))
+    except ValueError:
+        cache.set(_generation_key(user_id), 1, None)
+
+
+@shared_task()
+def invalidate_site_list_task(request_user_id: int) -> None:
+    invalidate_site_list(request_user_id)
+
+
+class CachedSiteDetail(NamedTuple):
+    fetched_at: float
+    etag: str
+    last_modified: str
+    site: VDRSiteDetail
+
+
+def _site_detail_cache_key(user_id, generation: int, site_id: int) -> str:
+    return f"vdr_site_detail_{user_id}_{generation}_{site_id}"
+
+
+def _is_fresh(entry) -> bool:
+    return (
+        entry is not None
+        and time.time() - entry.fetched_at < settings.VDR_SITE_DETAIL_CACHE_TTL
+    )
+
+
+def get_cached_site_detail(request_user, site_id: int):
+
+    """
+    Gets the detail of a single site, from the cache where possible.
+
+    A detail is fresh for VDR_SITE_DETAIL_CACHE_TTL seconds. After that it is kept for up to
+    VDR_SITE_DETAIL_CACHE_TIMEOUT seconds, and revalidated with the VDR using its ETag / Last-Modified before it is
+    served, so an unchanged site is not sent or parsed again. If the VDR errors while revalidating, the copy
+    already held is served.
+
+    :param request_user: the user authenticated during the request
+    :param site_id: the unique identifier of the site in the VDR System
+    :return: a data class for a single remote VDR site's details, or a VDRServiceError
+    """
+    cache_key = _site_detail_cache_key(
+        request_user.id, _current_generation(request_user.id), site_id
+    )
+    entry = cache.get(cache_key)
+    if _is_fresh(entry):
+        return entry.site
+
+    result = get_single_site_if_modified(
+        request_user,
+        site_id,
+        etag=entry.etag if entry else "",
+        last_modified=entry.last_modified if entry else "",
+    )
+    if isinstance(result, VDRServiceError):
+        return entry.site if entry else result
+
+    site = result.site if result.site is not None else entry.site
+    cache.set(
+        cache_key,
+        CachedSiteDetail(time.time(), result.etag, result.last_modified, site),
+        settings.VDR_SITE_DETAIL_CACHE_TIMEOUT,
+    )
+    return site
+
+
+@shared_task()
+def prefetch_site_details_task(request_user_id: int, site_ids: list) -> None:
+
+    """
+    Fetches the details of a page of sites into the cache, concurrently, so opening any of them is instant.
+
+    :param request_user_id: the unique identifier of the user in the VDR System
+    :param site_ids: the unique identifiers of the sites
+    :return: None
+    """
+    user = User.objects.get(id=request_user_id)
+
+    def _prefetch(site_id):
+        try:
+            get_cached_site_detail(user, site_id)
+        finally:
+            # the token lookup may have queried the DB from this thread
+            connections.close_all()
+
+    with ThreadPoolExecutor(
+        max_workers=settings.VDR_SITE_DETAIL_PREFETCH_WORKERS
+    ) as executor:
+        list(executor.map(_prefetch, site_ids))
+
+
+def prefetch_site_details(request_user, site_list: VDRSiteList) -> None:
+
+    """
+    Queues the fetch of the details of every site on a page of the site list which isn't already fresh in the
+    cache. The same page is queued at most once every VDR_SITE_DETAIL_CACHE_TTL seconds.
+
+    :param request_user: the user authenticated during the request
+    :param site_list: the page of the site list being shown
+    :return: None
+    """
+    generation = _current_generation(request_user.id)
+    keys = {
+        site.id: _site_detail_cache_key(request_user.id, generation, site.id)
+        for site in site_list.site_list
+    }
+    cached = cache.get_many(keys.values())
+    site_ids = [
+        site_id for site_id, key in keys.items() if not _is_fresh(cached.get(key))
+    ]
+    if not site_ids:
+        return
+
+    ids_hash = hashlib.md5(",".join(map(str, site_ids)).encode()).hexdigest()
+    prefetching_key = (
+        f"vdr_site_detail_prefetch_{request_user.id}_{generation}_{ids_hash}"
+    )
+    if cache.add(prefetching_key, True, settings.VDR_SITE_DETAIL_CACHE_TTL):
+        prefetch_site_details_task.delay(request_user.id, site_ids)
@@ -1,14 +1,16 @@
 import datetime
+from typing import NamedTuple, Optional
 
-import requests
-from allauth.socialaccount.models import SocialToken
+from django.conf import settings
 
 from core.data_parsers.site_data_parsers import (
     parse_get_all_sites,
     parse_get_single_site,
 )
+from core.dataclasses.site_dataclasses import VDRSiteDetail
 from core.dataclasses.utility_dataclasses import VDRServiceError
-from core.http_handlers.utils import get_setting
+from core.http_handlers.session import get_vdr_session
+from core.http_handlers.utils import get_access_token, get_setting
 
 
 def get_all_sites(request_user, request_query_params=None):
@@ -16,7 +18,7 @@ def get_all_sites(request_user, request_query_params=None):
     """
     Gets all sites from the VDR API
 
-    Makes an http call to the External Service to get all the site for the user,
+    Makes an http call to the External Service to get a page of VDR_SITE_LIST_PAGE_SIZE sites for the user,
     sends the json response to the data parsing function.
 
     :param request_user, any query params(optional)
@@ -29,14 +31,15 @@ def get_all_sites(request_user, request_query_params=None):
     else:
         params = ""
 
-    access_token = SocialToken.objects.get(account__user=request_user)
-    url = f"{VDR_BASEURL}/sites?{params}&limit=10"
+    access_token = get_access_token(request_user)
+    page_size = settings.VDR_SITE_LIST_PAGE_SIZE
+    url = f"{VDR_BASEURL}/sites?{params}&limit={page_size}"
     headers = {
         "Authorization": f"Bearer {access_token}",
         "Accept": "application/json",
     }
 
-    response = requests.get(url, headers=headers)
+    response = get_vdr_session().get(url, headers=headers)
     if response.status_code != 200:
         result = VDRServiceError(
             message=response.text,
@@ -45,11 +48,66 @@ def get_all_sites(request_user, request_query_params=None):
             timestamp=datetime.datetime.now(),
         )
     else:
-        result = parse_get_all_sites(response.json())
+        result = parse_get_all_sites(response.json(), page_size)
 
     return result
 
 
+class SiteDetailRevalidation(NamedTuple):
+    # site is None when the VDR answered 304 Not Modified
+    site: Optional[VDRSiteDetail]
+    etag: str = ""
+    last_modified: str = ""
+
+
+def get_single_site_if_modified(
+    request_user, id: int, etag: str = "", last_modified: str = ""
+):
+
+    """
+    Gets the detailed single site call from the VDR API, unless it has not changed since it was last fetched
+
+    Sends the validators of the copy we already hold as If-None-Match / If-Modified-Since. A VDR which supports
+    them answers 304 with no body, so the site is neither sent nor parsed again. One which doesn't just sends the
+    site.
+
+    :param request_user, the remote_vdr site id, the ETag and Last-Modified headers of the copy already held
+    :return: a SiteDetailRevalidation, or a VDRServiceError
+    """
+    VDR_BASEURL = get_setting("remote_system_base_url")
+
+    access_token = get_access_token(request_user)
+    url = f"{VDR_BASEURL}/sites/{id}"
+    headers = {
+        "Authorization": f"Bearer {access_token}",
+        "Accept": "application/json",
+    }
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+
+    response = get_vdr_session().get(url, headers=headers)
+    if response.status_code == 304:
+        return SiteDetailRevalidation(
+            site=None,
+            etag=response.headers.get("ETag", etag),
+            last_modified=response.headers.get("Last-Modified", last_modified),
+        )
+    if response.status_code != 200:
+        return VDRServiceError(
+            message=response.text,
+            status_code=response.status_code,
+            endpoint=url,
+            timestamp=datetime.datetime.now(),
+        )
+    return SiteDetailRevalidation(
+        site=parse_get_single_site(response.json()),
+        etag=response.headers.get("ETag", ""),
+        last_modified=response.headers.get("Last-Modified", ""),
+    )
+
+
 def get_single_site(request_user, id: int):
 
     """
@@ -65,14 +123,14 @@ def get_single_site(request_user, id: int):
 
     site_id = id
 
-    access_token = SocialToken.objects.get(account__user=request_user)
+    access_token = get_access_token(request_user)
     url = f"{VDR_BASEURL}/sites/{site_id}"
     headers = {
         "Authorization": f"Bearer {access_token}",
         "Accept": "application/json",
     }
 
-    response = requests.get(url, headers=headers)
+    response = get_vdr_session().get(url, headers=headers)
     if response.status_code != 200:
         result = VDRServiceError(
             message=response.text,
@@ -1,4 +1,7 @@
+from allauth.socialaccount.models import SocialToken
+from django.conf import settings
 from django.core.cache import cache
+from django.utils import timezone
 
 from core.models import RemoteSystemSettings
 
@@ -27,3 +30,61 @@ def get_setting(setting_name):
         cache.set(setting_name, single_setting)
 
     return single_setting
+
+
+def _access_token_cache_key(user_id) -> str:
+    return f"vdr_access_token_{user_id}"
+
+
+def get_access_token(request_user) -> str:
+
+    """
+    Resolves the bearer token for a user, going to the DB at most once per cache timeout.
+
+    Works the same way as get_setting: try the cache first and only fall back to the SocialToken query on a
+    miss. The timeout is VDR_ACCESS_TOKEN_CACHE_TIMEOUT, shortened to the token's own expiry if that comes
+    sooner, so we never hand out a token the remote system has already expired. Saving or deleting a
+    SocialToken (e.g. on a token refresh) clears the entry, see core/signals.py.
+
+    :param request_user: the user authenticated during the request
+    :return: the bearer token as a string
+    """
+    cache_key = _access_token_cache_key(request_user.id)
+    access_token = cache.get(cache_key)
+
+    if access_token is None:
+        social_token = SocialToken.objects.get(account__user=request_user)
+        access_token = str(social_token)
+
+        timeout = settings.VDR_ACCESS_TOKEN_CACHE_TIMEOUT
+        if social_token.expires_at:
+            seconds_left = (social_token.expires_at - timezone.now()).total_seconds()
+            timeout = max(0, min(timeout, int(seconds_left)))
+
+        if timeout:
+            cache.set(cache_key, access_token, timeout)
+
+    return access_token
+
+
+def clear_access_token(user_id) -> None:
+
+    """
+    Removes a user's bearer token from the cache, so the next call re-reads it from the DB.
+
+    :param user_id: the unique identifier of the user
+    :return: None
+    """
+    cache.delete(_access_token_cache_key(user_id))
+
+
+def build_range_header(start_byte: int = None, end_byte: int = None) -> str:
+
+    """
+    :param start_byte: the first byte of the range, defaults to the start of the file
+    :param end_byte: the last byte of the range (inclusive), defaults to the end of the file
+    :return: the value of an HTTP Range header for a single range of bytes
+    """
+    start = start_byte or 0
+    end = "" if end_byte is None else end_byte
+    return f"bytes={start}-{end}"
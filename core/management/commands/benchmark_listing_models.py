@@ -0,0 +1,55 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from core.benchmark.listing_models import (
+    REPRESENTATIONS,
+    run_listing_model_benchmark,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Parses a generated files-in-folder listing into fully validated pydantic models, trusted models and a "
+        "compact file list, and reports microseconds and bytes per file for each."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--files", type=int, default=100000)
+        parser.add_argument(
+            "--representations",
+            nargs="+",
+            default=list(REPRESENTATIONS),
+            choices=REPRESENTATIONS,
+        )
+        parser.add_argument("--json", action="store_true")
+
+    def handle(self, *args, **options):
+        results = run_listing_model_benchmark(
+            options["files"], options["representations"]
+        )
+
+        if options["json"]:
+            self.stdout.write(
+                json.dumps(
+                    [
+                        dict(
+                            result._asdict(),
+                            microseconds_per_file=result.microseconds_per_file,
+                            bytes_per_file=result.bytes_per_file,
+                        )
+                        for result in results
+                    ],
+                    indent=2,
+                )
+            )
+            return
+
+        self.stdout.write(
+            f"{'representation':<16}{'seconds':>10}{'us/file':>10}{'bytes/file':>12}"
+        )
+        for result in results:
+            self.stdout.write(
+                f"{result.representation:<16}{result.seconds:>10.3f}{result.microseconds_per_file:>10.2f}"
+                f"{result.bytes_per_file:>12.1f}"
+            )
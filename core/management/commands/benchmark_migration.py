@@ -0,0 +1,103 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.test.runner import DiscoverRunner
+
+from core.benchmark.harness import OPERATIONS, run_benchmark
+from core.benchmark.vdr_server import FakeVDRSite
+
+
+class Command(BaseCommand):
+    help = (
+        "Replicates and deletes a generated site end to end against a fake VDR and in memory S3, and reports files/s, "
+        "MB/s, API calls per file and DB queries per file."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--depth", type=int, default=2)
+        parser.add_argument("--breadth", type=int, default=3)
+        parser.add_argument("--files-per-folder", type=int, default=5)
+        parser.add_argument("--file-size", type=int, default=64 * 1024)
+        parser.add_argument(
+            "--latency",
+            type=float,
+            default=0,
+            help="seconds the fake VDR waits before answering each request",
+        )
+        parser.add_argument(
+            "--error-rate",
+            type=float,
+            default=0,
+            help="the fraction of requests the fake VDR answers 503",
+        )
+        parser.add_argument(
+            "--rate-limit",
+            type=float,
+            default=None,
+            help="requests a second the fake VDR answers before answering 429",
+        )
+        parser.add_argument(
+            "--mode",
+            default="local_and_remote",
+            choices=("local", "remote", "local_and_remote"),
+        )
+        parser.add_argument(
+            "--operations", nargs="+", default=list(OPERATIONS), choices=OPERATIONS
+        )
+        parser.add_argument("--json", action="store_true")
+
+    def handle(self, *args, **options):
+        site = FakeVDRSite(
+            depth=options["depth"],
+            breadth=options["breadth"],
+            files_per_folder=options["files_per_folder"],
+            file_size=options["file_size"],
+        )
+
+        # the runs write users, manifests, checkpoints and reports, so they go to a test database of their own rather
+        # than the one the app is using
+        runner = DiscoverRunner(verbosity=0, interactive=False)
+        old_config = runner.setup_databases()
+        try:
+            results = run_benchmark(
+                site,
+                operations=options["operations"],
+                mode=options["mode"],
+                latency=options["latency"],
+                error_rate=options["error_rate"],
+                rate_limit=options["rate_limit"],
+            )
+        finally:
+            runner.teardown_databases(old_config)
+
+        if options["json"]:
+            self.stdout.write(
+                json.dumps(
+                    [
+                        dict(
+                            result._asdict(),
+                            files_per_second=result.files_per_second,
+                            megabytes_per_second=result.megabytes_per_second,
+                            api_calls_per_file=result.api_calls_per_file,
+                            db_queries_per_file=result.db_queries_per_file,
+                        )
+                        for result in results
+                    ],
+                    indent=2,
+                )
+            )
+            return
+
+        self.stdout.write(
+            f"{len(site.folders)} folders, {len(site.file_sizes)} files, {site.total_size / (1024 * 1024):.1f} MB"
+        )
+        self.stdout.write(
+            f"{'operation':<24}{'seconds':>10}{'files/s':>10}{'MB/s':>10}{'API/file':>10}{'errors':>8}"
+            f"{'S3 calls':>10}{'DB/file':>10}"
+        )
+        for result in results:
+            self.stdout.write(
+                f"{result.operation:<24}{result.seconds:>10.2f}{result.files_per_second:>10.1f}"
+                f"{result.megabytes_per_second:>10.2f}{result.api_calls_per_file:>10.2f}{result.api_errors:>8}"
+                f"{result.s3_calls:>10}{result.db_queries_per_file:>10.2f}"
+            )
@@ -0,0 +1,37 @@
+# Generated by Django 3.2 on 2026-10-18 16:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0003_auto_20211031_1647"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="remotesystemsettings",
+            name="s3_max_concurrency",
+            field=models.PositiveIntegerField(
+                default=10,
+                help_text="The number of parts of a single file uploaded at the same time.",
+            ),
+        ),
+        migrations.AddField(
+            model_name="remotesystemsettings",
+            name="s3_multipart_chunksize",
+            field=models.PositiveIntegerField(
+                default=8388608,
+                help_text="The size in bytes of each part of a multipart upload.",
+            ),
+        ),
+        migrations.AddField(
+            model_name="remotesystemsettings",
+            name="s3_multipart_threshold",
+            field=models.PositiveIntegerField(
+                default=8388608,
+                help_text="Files larger than this many bytes are uploaded to S3 in parts.",
+            ),
+        ),
+    ]
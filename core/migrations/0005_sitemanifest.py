@@ -0,0 +1,117 @@
+# Generated by Django 3.2 on 2026-10-18 16:16
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0004_remotesystemsettings_s3_transfer_settings"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SiteManifest",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("root_folder_id", models.BigIntegerField()),
+                ("created", models.DateTimeField(auto_now_add=True)),
+                ("completed", models.DateTimeField(blank=True, null=True)),
+                ("folder_count", models.PositiveIntegerField(default=0)),
+                ("file_count", models.PositiveIntegerField(default=0)),
+                ("total_size", models.BigIntegerField(default=0)),
+                ("listing_errors", models.PositiveIntegerField(default=0)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="ManifestFolder",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("folder_id", models.BigIntegerField()),
+                ("parent_folder_id", models.BigIntegerField()),
+                ("name", models.CharField(max_length=1000)),
+                ("location", models.CharField(max_length=1000)),
+                ("vdr_path", models.TextField()),
+                ("depth", models.PositiveIntegerField()),
+                (
+                    "manifest",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="folders",
+                        to="core.sitemanifest",
+                    ),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="ManifestFile",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("file_id", models.BigIntegerField()),
+                ("name", models.CharField(max_length=1000)),
+                ("type", models.CharField(max_length=100)),
+                ("size", models.BigIntegerField()),
+                (
+                    "folder",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="files",
+                        to="core.manifestfolder",
+                    ),
+                ),
+                (
+                    "manifest",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="files",
+                        to="core.sitemanifest",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="manifestfolder",
+            index=models.Index(
+                fields=["manifest", "depth"], name="core_manife_manifes_bfc2d6_idx"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="manifestfolder",
+            constraint=models.UniqueConstraint(
+                fields=("manifest", "folder_id"), name="unique_manifest_folder"
+            ),
+        ),
+    ]
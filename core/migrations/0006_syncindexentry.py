@@ -0,0 +1,72 @@
+# Generated by Django 3.2 on 2026-10-18 16:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0005_sitemanifest"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SyncIndexEntry",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("root_folder_id", models.BigIntegerField()),
+                (
+                    "target",
+                    models.CharField(
+                        choices=[
+                            ("local", "Local server"),
+                            ("remote", "Remote storage location"),
+                            (
+                                "local_and_remote",
+                                "Local server and remote storage location",
+                            ),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("file_id", models.BigIntegerField()),
+                ("name", models.CharField(max_length=1000)),
+                ("size", models.BigIntegerField()),
+                ("vdr_path", models.TextField()),
+                ("etag", models.CharField(blank=True, max_length=255)),
+                ("local_path", models.TextField(blank=True)),
+                ("s3_key", models.TextField(blank=True)),
+                ("last_synced", models.DateTimeField(auto_now=True)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="syncindexentry",
+            index=models.Index(
+                fields=["user", "target", "root_folder_id"],
+                name="core_syncin_user_id_a4b0e1_idx",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="syncindexentry",
+            constraint=models.UniqueConstraint(
+                fields=("user", "target", "file_id"), name="unique_sync_index_entry"
+            ),
+        ),
+    ]
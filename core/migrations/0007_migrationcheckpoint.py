@@ -0,0 +1,157 @@
+# Generated by Django 3.2 on 2026-10-18 16:22
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0006_syncindexentry"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MigrationCheckpoint",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("root_folder_id", models.BigIntegerField()),
+                (
+                    "mode",
+                    models.CharField(
+                        choices=[
+                            ("local", "Local server"),
+                            ("remote", "Remote storage location"),
+                            (
+                                "local_and_remote",
+                                "Local server and remote storage location",
+                            ),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("report_id", models.BigIntegerField()),
+                ("created", models.DateTimeField(auto_now_add=True)),
+                ("completed", models.DateTimeField(blank=True, null=True)),
+                (
+                    "manifest",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="core.sitemanifest",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="CheckpointUpload",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("file_id", models.BigIntegerField()),
+                ("s3_key", models.TextField()),
+                ("upload_id", models.CharField(max_length=1024)),
+                (
+                    "checkpoint",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="uploads",
+                        to="core.migrationcheckpoint",
+                    ),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="CheckpointFolder",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("folder_id", models.BigIntegerField()),
+                (
+                    "checkpoint",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="folders",
+                        to="core.migrationcheckpoint",
+                    ),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="CheckpointFile",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("file_id", models.BigIntegerField()),
+                (
+                    "checkpoint",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="files",
+                        to="core.migrationcheckpoint",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="migrationcheckpoint",
+            index=models.Index(
+                fields=["user", "root_folder_id", "mode"],
+                name="core_migrat_user_id_1bd26b_idx",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="checkpointupload",
+            constraint=models.UniqueConstraint(
+                fields=("checkpoint", "file_id"), name="unique_checkpoint_upload"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="checkpointfolder",
+            constraint=models.UniqueConstraint(
+                fields=("checkpoint", "folder_id"), name="unique_checkpoint_folder"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="checkpointfile",
+            constraint=models.UniqueConstraint(
+                fields=("checkpoint", "file_id"), name="unique_checkpoint_file"
+            ),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 3.2 on 2026-10-18 17:14
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0007_migrationcheckpoint"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="migrationcheckpoint",
+            name="attempts",
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.CreateModel(
+            name="CheckpointFailure",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("file_id", models.BigIntegerField()),
+                ("attempts", models.PositiveIntegerField(default=1)),
+                ("error", models.TextField(blank=True)),
+                (
+                    "checkpoint",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="failures",
+                        to="core.migrationcheckpoint",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="checkpointfailure",
+            constraint=models.UniqueConstraint(
+                fields=("checkpoint", "file_id"), name="unique_checkpoint_failure"
+            ),
+        ),
+    ]
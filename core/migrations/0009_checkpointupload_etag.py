@@ -0,0 +1,18 @@
+# Generated by Django 3.2 on 2026-10-18 18:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0008_checkpoint_failures"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="checkpointupload",
+            name="etag",
+            field=models.CharField(blank=True, max_length=1024),
+        ),
+    ]
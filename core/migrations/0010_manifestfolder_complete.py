@@ -0,0 +1,18 @@
+# Generated by Django 3.2 on 2026-10-18 21:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0009_checkpointupload_etag"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="manifestfolder",
+            name="complete",
+            field=models.BooleanField(default=True),
+        ),
+    ]
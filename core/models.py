@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.contrib.auth.models import AbstractUser
 from django.core.cache import cache
 from django.db import models
@@ -13,11 +14,203 @@ class RemoteSystemSettings(SingletonModel):
     aws_access_key_id = models.CharField(max_length=300)
     aws_secret_access_key = models.CharField(max_length=300)
     aws_bucket_name = models.CharField(max_length=300)
+    s3_multipart_threshold = models.PositiveIntegerField(
+        default=8 * 1024 * 1024,
+        help_text="Files larger than this many bytes are uploaded to S3 in parts.",
+    )
+    s3_multipart_chunksize = models.PositiveIntegerField(
+        default=8 * 1024 * 1024,
+        help_text="The size in bytes of each part of a multipart upload.",
+    )
+    s3_max_concurrency = models.PositiveIntegerField(
+        default=10,
+        help_text="The number of parts of a single file uploaded at the same time.",
+    )
 
     def save(self, *args, **kwargs):
         cache.delete("remote_system_base_url")
         cache.delete("aws_access_key_id")
         cache.delete("aws_secret_access_key")
         cache.delete("aws_bucket_name")
+        cache.delete("s3_multipart_threshold")
+        cache.delete("s3_multipart_chunksize")
+        cache.delete("s3_max_concurrency")
         print("----- Cleared The Cache from save !!! -----")
         super().save(*args, **kwargs)
+
+
+class SiteManifest(models.Model):
+    """
+    A snapshot of a VDR Site's folder tree, crawled once so that replication and deletion can be planned and run
+    without listing the folders again.
+    """
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    root_folder_id = models.BigIntegerField()
+    created = models.DateTimeField(auto_now_add=True)
+    completed = models.DateTimeField(null=True, blank=True)
+    folder_count = models.PositiveIntegerField(default=0)
+    file_count = models.PositiveIntegerField(default=0)
+    total_size = models.BigIntegerField(default=0)
+    listing_errors = models.PositiveIntegerField(default=0)
+
+
+class ManifestFolder(models.Model):
+    manifest = models.ForeignKey(
+        SiteManifest, on_delete=models.CASCADE, related_name="folders"
+    )
+    folder_id = models.BigIntegerField()
+    parent_folder_id = models.BigIntegerField()
+    name = models.CharField(max_length=1000)
+    location = models.CharField(max_length=1000)
+    vdr_path = models.TextField()
+    depth = models.PositiveIntegerField()
+    # False if the listing of the folder, or of any folder within it, failed, so it may hold more than the manifest
+    complete = models.BooleanField(default=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["manifest", "folder_id"], name="unique_manifest_folder"
+            )
+        ]
+        indexes = [models.Index(fields=["manifest", "depth"])]
+
+
+class ManifestFile(models.Model):
+    manifest = models.ForeignKey(
+        SiteManifest, on_delete=models.CASCADE, related_name="files"
+    )
+    folder = models.ForeignKey(
+        ManifestFolder, on_delete=models.CASCADE, related_name="files"
+    )
+    file_id = models.BigIntegerField()
+    name = models.CharField(max_length=1000)
+    type = models.CharField(max_length=100)
+    size = models.BigIntegerField()
+
+
+class SyncIndexEntry(models.Model):
+    """
+    The last replicated state of a single VDR file, for one replication target. Lets an incremental replication skip
+    the files that have not changed since they were last transferred, and find the files that have since been removed
+    from the VDR.
+    """
+
+    TARGET_CHOICES = [
+        ("local", "Local server"),
+        ("remote", "Remote storage location"),
+        ("local_and_remote", "Local server and remote storage location"),
+    ]
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    root_folder_id = models.BigIntegerField()
+    target = models.CharField(max_length=20, choices=TARGET_CHOICES)
+    file_id = models.BigIntegerField()
+    name = models.CharField(max_length=1000)
+    size = models.BigIntegerField()
+    vdr_path = models.TextField()
+    etag = models.CharField(max_length=255, blank=True)
+    local_path = models.TextField(blank=True)
+    s3_key = models.TextField(blank=True)
+    last_synced = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "target", "file_id"], name="unique_sync_index_entry"
+            )
+        ]
+        indexes = [models.Index(fields=["user", "target", "root_folder_id"])]
+
+
+class MigrationCheckpoint(models.Model):
+    """
+    The progress of a single replication of a VDR Site, so that a replication which was interrupted (a worker being
+    killed by a deploy or the OOM killer) can be rerun without redoing the work already finished.
+    """
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    root_folder_id = models.BigIntegerField()
+    mode = models.CharField(max_length=20, choices=SyncIndexEntry.TARGET_CHOICES)
+    manifest = models.ForeignKey(SiteManifest, on_delete=models.CASCADE)
+    report_id = models.BigIntegerField()
+    created = models.DateTimeField(auto_now_add=True)
+    # when every folder was finished, or when the checkpoint was given up on and the site crawled again
+    completed = models.DateTimeField(null=True, blank=True)
+    # the runs of the replication, the first one included
+    attempts = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        indexes = [models.Index(fields=["user", "root_folder_id", "mode"])]
+
+
+class CheckpointFolder(models.Model):
+    checkpoint = models.ForeignKey(
+        MigrationCheckpoint, on_delete=models.CASCADE, related_name="folders"
+    )
+    folder_id = models.BigIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["checkpoint", "folder_id"], name="unique_checkpoint_folder"
+            )
+        ]
+
+
+class CheckpointFile(models.Model):
+    checkpoint = models.ForeignKey(
+        MigrationCheckpoint, on_delete=models.CASCADE, related_name="files"
+    )
+    file_id = models.BigIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["checkpoint", "file_id"], name="unique_checkpoint_file"
+            )
+        ]
+
+
+class CheckpointFailure(models.Model):
+    """
+    A file which failed to transfer, and how many runs of the replication it has failed on. Once it has failed on
+    VDR_CHECKPOINT_MAX_FILE_ATTEMPTS runs it is given up on, so that it doesn't keep its folder unfinished.
+    """
+
+    checkpoint = models.ForeignKey(
+        MigrationCheckpoint, on_delete=models.CASCADE, related_name="failures"
+    )
+    file_id = models.BigIntegerField()
+    attempts = models.PositiveIntegerField(default=1)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["checkpoint", "file_id"], name="unique_checkpoint_failure"
+            )
+        ]
+
+
+class CheckpointUpload(models.Model):
+    """
+    An S3 multipart upload which has been started but not completed. The parts already uploaded are listed from S3
+    itself when the upload is resumed, and only kept if the file still has the ETag it was being uploaded from.
+    """
+
+    checkpoint = models.ForeignKey(
+        MigrationCheckpoint, on_delete=models.CASCADE, related_name="uploads"
+    )
+    file_id = models.BigIntegerField()
+    s3_key = models.TextField()
+    upload_id = models.CharField(max_length=1024)
+    etag = models.CharField(max_length=1024, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["checkpoint", "file_id"], name="unique_checkpoint_upload"
+            )
+        ]
@@ -0,0 +1,14 @@
+from allauth.socialaccount.models import SocialToken
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.http_handlers.utils import clear_access_token
+
+
+@receiver(post_save, sender=SocialToken)
+@receiver(post_delete, sender=SocialToken)
+def invalidate_cached_access_token(sender, instance, **kwargs):
+    """
+    Drops the cached bearer token whenever a SocialToken is refreshed, replaced or removed.
+    """
+    clear_access_token(instance.account.user_id)
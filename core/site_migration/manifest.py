@@ -0,0 +1,302 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from queue import Queue
+from threading import Event
+from typing import Dict, List
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+from core.dataclasses.utility_dataclasses import VDRServiceError
+from core.http_handlers.file_and_folder_http_handlers import (
+    get_single_folder_details,
+    iter_files_in_single_folder,
+    iter_sub_folders_of_single_folder,
+)
+from core.models import (
+    ManifestFile,
+    ManifestFolder,
+    MigrationCheckpoint,
+    SiteManifest,
+)
+
+
+def _list_folder(user, folder: ManifestFolder, listed: Queue, stop: Event) -> None:
+
+    """
+    Lists the subfolders and files of a single folder, handing its files to the crawler a page at a time as they are
+    listed. Runs on the crawler's threads.
+
+    Puts ("files", folder, files) on listed for every VDR_LISTING_PAGE_SIZE files, then ("done", folder, result)
+    once the folder is finished with, where result is the rest of its files and its subfolders as a tuple of two
+    lists, or the VDRServiceError or exception the listing failed with.
+
+    :param user: the user authenticated during the request
+    :param folder: the ManifestFolder to list
+    :param listed: the queue the crawler takes the listing from
+    :param stop: set once the crawler has given up on the level, so that the rest of the listing is left alone
+    :return: None
+    """
+    result = None
+    try:
+        subfolders = []
+        for subfolder in iter_sub_folders_of_single_folder(user, folder.folder_id):
+            if isinstance(subfolder, VDRServiceError):
+                result = subfolder
+                return
+            subfolders.append(subfolder)
+
+        files = []
+        for file in iter_files_in_single_folder(user, folder.folder_id):
+            if stop.is_set():
+                return
+            if isinstance(file, VDRServiceError):
+                result = file
+                return
+            files.append(file)
+            if len(files) >= settings.VDR_LISTING_PAGE_SIZE:
+                listed.put(("files", folder, files))
+                files = []
+        result = (files, subfolders)
+    except Exception as e:
+        result = e
+    finally:
+        listed.put(("done", folder, result))
+        # a cache miss on the access token queries the DB from this thread; don't leak the connection
+        connections.close_all()
+
+
+def _mark_incomplete(folder: ManifestFolder) -> None:
+    # the folder, and every folder above it, may hold more than the manifest says
+    pks = [folder.pk]
+    while folder.depth:
+        folder = ManifestFolder.objects.get(
+            manifest_id=folder.manifest_id, folder_id=folder.parent_folder_id
+        )
+        pks.append(folder.pk)
+    ManifestFolder.objects.filter(pk__in=pks).update(complete=False)
+
+
+def build_site_manifest(user, root_folder_id: int, max_workers: int = None):
+
+    """
+    Crawls the folder tree of a VDR Site once and persists it as a SiteManifest.
+
+    The tree is crawled a level at a time: the subfolders and files of every folder on the current level are listed
+    concurrently on a thread pool of VDR_MANIFEST_CRAWLER_WORKERS threads, and the folders found make up the next
+    level. Each listing is streamed with iter_files_in_single_folder, and its files handed back a page at a time as
+    they arrive, so that no thread ever holds a whole listing. Everything is written to the DB with bulk_create from
+    the calling thread, the files in batches of VDR_LISTING_PAGE_SIZE and the folders of the next level once the
+    level is finished. The details of the folders are taken from their parent's subfolder listing, so only the root
+    folder needs its own details call.
+
+    Folders whose listing fails are kept in the manifest (without their contents) and counted in listing_errors, and
+    they and every folder above them are marked as not complete.
+
+    :param user: the user authenticated during the request
+    :param root_folder_id: the unique identifier of the site's root folder in the VDR System
+    :param max_workers: the number of crawler threads, defaults to VDR_MANIFEST_CRAWLER_WORKERS
+    :return: the completed SiteManifest
+    """
+    if max_workers is None:
+        max_workers = settings.VDR_MANIFEST_CRAWLER_WORKERS
+
+    root_folder = get_single_folder_details(user, root_folder_id)
+    if isinstance(root_folder, VDRServiceError):
+        raise ValueError(
+            f"Could not get the root folder {root_folder_id}: {root_folder.message}"
+        )
+
+    manifest = SiteManifest.objects.create(user=user, root_folder_id=root_folder_id)
+    level = [
+        ManifestFolder.objects.create(
+            manifest=manifest,
+            folder_id=root_folder.id,
+            parent_folder_id=root_folder.parent_folder_id,
+            name=root_folder.name,
+            location=root_folder.location,
+            vdr_path=root_folder.name,
+            depth=0,
+        )
+    ]
+    manifest.folder_count = 1
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while level:
+            # bounded, so that the listings are only ever a few pages ahead of the DB
+            listed = Queue(maxsize=max_workers)
+            stop = Event()
+            for folder in level:
+                executor.submit(_list_folder, user, folder, listed, stop)
+
+            next_level = []
+            level_files = []
+            # the files and bytes written so far for each folder still being listed, taken back if its listing fails
+            written = {}
+
+            def write_files():
+                ManifestFile.objects.bulk_create(level_files)
+                manifest.file_count += len(level_files)
+                level_files.clear()
+
+            def add_files(parent, files):
+                level_files.extend(
+                    ManifestFile(
+                        manifest=manifest,
+                        folder=parent,
+                        file_id=file.id,
+                        name=file.name,
+                        type=file.type,
+                        size=file.size,
+                    )
+                    for file in files
+                )
+                count, size = written.get(parent.pk, (0, 0))
+                files_size = sum(file.size for file in files)
+                written[parent.pk] = (count + len(files), size + files_size)
+                manifest.total_size += files_size
+                # a level of very large folders is written as it is listed, rather than held until the end
+                if len(level_files) >= settings.VDR_LISTING_PAGE_SIZE:
+                    write_files()
+
+            outstanding = len(level)
+            try:
+                while outstanding:
+                    kind, parent, result = listed.get()
+                    if kind == "files":
+                        add_files(parent, result)
+                        continue
+
+                    outstanding -= 1
+                    if isinstance(result, Exception):
+                        raise result
+                    if isinstance(result, VDRServiceError):
+                        manifest.listing_errors += 1
+                        count, size = written.pop(parent.pk, (0, 0))
+                        if count:
+                            write_files()
+                            ManifestFile.objects.filter(folder=parent).delete()
+                            manifest.file_count -= count
+                            manifest.total_size -= size
+                        _mark_incomplete(parent)
+                        continue
+
+                    files, subfolders = result
+                    add_files(parent, files)
+                    written.pop(parent.pk)
+                    for folder in subfolders:
+                        next_level.append(
+                            ManifestFolder(
+                                manifest=manifest,
+                                folder_id=folder.id,
+                                parent_folder_id=parent.folder_id,
+                                name=folder.name,
+                                location=folder.location,
+                                vdr_path=parent.vdr_path + "/" + folder.name,
+                                depth=parent.depth + 1,
+                            )
+                        )
+            finally:
+                if outstanding:
+                    # wait for the listings still running to stop, so none is left writing to the queue
+                    stop.set()
+                    while outstanding:
+                        if listed.get()[0] == "done":
+                            outstanding -= 1
+
+            with transaction.atomic():
+                write_files()
+                ManifestFolder.objects.bulk_create(next_level)
+            manifest.folder_count += len(next_level)
+
+            # bulk_create doesn't hand back primary keys on every backend, and the files of the next level need them
+            if next_level:
+                level = list(
+                    ManifestFolder.objects.filter(
+                        manifest=manifest, depth=next_level[0].depth
+                    )
+                )
+            else:
+                level = []
+
+    manifest.completed = timezone.now()
+    manifest.save()
+    return manifest
+
+
+def plan_bottom_up_deletion(manifest: SiteManifest) -> List[List[int]]:
+
+    """
+    Plans the deletion of a SiteManifest's folders, so that every folder is deleted exactly once and only after all of
+    its subfolders.
+
+    The folders are grouped into waves by their height - the length of the longest path from the folder down to a
+    folder with no subfolders. Every leaf is in the first wave whatever its depth, and a folder's subfolders are always
+    in earlier waves than it is, so the folders within a wave belong to independent subtrees and can be deleted in
+    parallel. The root folder is in the last wave.
+
+    :param manifest: the SiteManifest to plan the deletion of
+    :return: a list of waves, each a list of ManifestFolder primary keys
+    """
+
+    folders = list(
+        manifest.folders.order_by("-depth").values_list(
+            "id", "folder_id", "parent_folder_id"
+        )
+    )
+    heights: Dict[int, int] = {}
+    for _, folder_id, parent_folder_id in folders:
+        # deepest first, so a folder's height is final before its parent is reached
+        height = heights.setdefault(folder_id, 0)
+        heights[parent_folder_id] = max(heights.get(parent_folder_id, 0), height + 1)
+
+    waves: List[List[int]] = []
+    for pk, folder_id, _ in folders:
+        while len(waves) <= heights[folder_id]:
+            waves.append([])
+        waves[heights[folder_id]].append(pk)
+    return waves
+
+
+def delete_site_manifest(manifest_id: int) -> None:
+
+    """
+    Deletes a SiteManifest once the job it was crawled for is finished with it, along with the checkpoints of the
+    replications run from it.
+
+    The files and folders are deleted a query at a time before the manifest, rather than Django collecting every row
+    the manifest cascades to into memory first.
+
+    :param manifest_id: the primary key of the SiteManifest
+    :return: None
+    """
+    with transaction.atomic():
+        ManifestFile.objects.filter(manifest_id=manifest_id).delete()
+        ManifestFolder.objects.filter(manifest_id=manifest_id).delete()
+        SiteManifest.objects.filter(id=manifest_id).delete()
+
+
+def delete_stale_manifests(user) -> int:
+
+    """
+    Deletes the user's SiteManifests which are more than VDR_MANIFEST_RETENTION seconds old and which no unfinished
+    replication is working from, e.g. that of a deletion which stopped part of the way through.
+
+    :param user: the user whose manifests to delete
+    :return: the number of manifests deleted
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.VDR_MANIFEST_RETENTION)
+    stale = (
+        SiteManifest.objects.filter(user=user, created__lt=cutoff)
+        .exclude(
+            id__in=MigrationCheckpoint.objects.filter(completed__isnull=True).values(
+                "manifest_id"
+            )
+        )
+        .values_list("id", flat=True)
+    )
+    stale = list(stale)
+    for manifest_id in stale:
+        delete_site_manifest(manifest_id)
+    return len(stale)
@@ -1,13 +1,29 @@
-from typing import List, TypedDict
+from typing import List
 
-from celery import shared_task
+from celery import chain, group, shared_task
+from django.conf import settings
 from django.contrib.auth import get_user_model
 
+from core.http_handlers.site_cache import (
+    invalidate_site_list,
+    invalidate_site_list_task,
+)
+from core.models import ManifestFolder, MigrationCheckpoint, SiteManifest
 from reporting.utils import ReportWriter
 
+from .manifest import (
+    build_site_manifest,
+    delete_site_manifest,
+    delete_stale_manifests,
+    plan_bottom_up_deletion,
+)
+from .utilities.checkpoint import Checkpoint
+from .utilities.progress import JobProgress
+from .utilities.sync_index import SyncIndex
 from .utilities.utils import (
     FolderContentsForHardDelete,
     FolderContentsForLocal,
+    FolderContentsForLocalAndRemote,
     FolderContentsForRemote,
     FolderContentsForSoftDelete,
 )
@@ -15,308 +31,406 @@ from .utilities.utils import (
 User = get_user_model()
 
 
-@shared_task()
-def recursive_site_builder_task(
-    request_user_id: int,
-    folder_id: int,
-    local_path=None,
-    vdr_path=None,
-    report_id: int = None,
-) -> None:
+def _replicate_folder_to_local(current_folder: FolderContentsForLocal) -> None:
+    current_folder.write_folder_to_local()
 
-    """
+    if current_folder.has_files():
+        current_folder.iterate_over_and_write_files_to_local()
 
-    Downloads an entire site in the VDR system to the local server.
 
-    Gets the details and contents of a Folder, iterating over the files and saving them to the local environment (after calculating the paths).
-    Will recursively call itself for every subfolder.
+def _replicate_folder_to_remote(current_folder: FolderContentsForRemote) -> None:
 
+    # handle empty folder
+    if not current_folder.has_subfolders() and not current_folder.has_files():
+        current_folder.write_empty_folder_to_remote()
 
-    :param request_user_id: the unique identifier of the user in the VDR System making the call
-    :param folder_id:  the unique identifier of the folder in the VDR System
-    :param local_path: the path on the local server where the folder is located
-    :param vdr_path: the path on the VDR system where the folder is located
-    :param report_Id: the report to associate information about the task to
-    :return: None
-    """
+    if current_folder.has_files():
+        current_folder.iterate_over_and_write_files_to_remote()
 
-    # prepare the current folder
-    current_folder = FolderContentsForLocal(
-        user=request_user_id,
-        folder_id=folder_id,
-        local_path=local_path,
-        vdr_path=vdr_path,
-        report_id=report_id,
-    )
-    current_folder.prepare_folder()
+
+def _replicate_folder_to_local_and_remote(
+    current_folder: FolderContentsForLocalAndRemote,
+) -> None:
     current_folder.write_folder_to_local()
 
+    # handle empty folder
+    if not current_folder.has_subfolders() and not current_folder.has_files():
+        current_folder.write_empty_folder_to_remote()
+
     if current_folder.has_files():
-        current_folder.iterate_over_and_write_files_to_local()
+        current_folder.iterate_over_and_write_files_to_local_and_remote()
 
-    if current_folder.has_subfolders():
-        for folder in current_folder.subfolders.subfolder_list:
-            recursive_site_builder_task.delay(
-                current_folder.user.id,
-                folder.id,
-                current_folder.local_path,
-                current_folder.vdr_path,
-                current_folder.report_id,
-            )
 
+REPLICATION_MODES = {
+    "local": (FolderContentsForLocal, _replicate_folder_to_local),
+    "remote": (FolderContentsForRemote, _replicate_folder_to_remote),
+    "local_and_remote": (
+        FolderContentsForLocalAndRemote,
+        _replicate_folder_to_local_and_remote,
+    ),
+}
 
-@shared_task()
-def recursive_remote_storage_site_builder_task(
+
+def _start_manifest_report(manifest: SiteManifest) -> ReportWriter:
+    root_folder = manifest.folders.get(depth=0)
+    report = ReportWriter(root_folder.name)
+    report.write_line(
+        f"Built a manifest of {root_folder.name}: {manifest.folder_count} folders, {manifest.file_count} files, "
+        f"{manifest.total_size} bytes ({manifest.listing_errors} folders could not be listed)"
+    )
+    report.flush()
+    return report
+
+
+def _finish_replication(checkpoint: Checkpoint, user_id: int, report_id: int) -> None:
+    # called after every batch, only the one which finds every folder finished cleans up after the replication
+    if not checkpoint.finish_if_complete():
+        return
+
+    root_folder_id = checkpoint.checkpoint.root_folder_id
+    with ReportWriter(str(root_folder_id), report_id=report_id) as report:
+        report.write_line("Finished replicating every folder")
+    invalidate_site_list(user_id)
+    delete_site_manifest(checkpoint.checkpoint.manifest_id)
+
+
+@shared_task(bind=True)
+def manifest_site_replication_task(
+    self,
     request_user_id: int,
-    folder_id: int,
-    local_path=None,
-    vdr_path=None,
-    report_id: int = None,
+    root_folder_id: int,
+    mode: str = "local_and_remote",
+    incremental: bool = False,
+    remove_orphans: bool = False,
+    progress_id: str = None,
 ) -> None:
 
     """
 
-    Replicates an entire site in the VDR system in an AWS S3 Bucket.
+    Replicates an entire site in the VDR system from a SiteManifest.
+
+    Crawls the site's folder tree once into a SiteManifest, so the totals to be transferred are known up front, then
+    dispatches the manifest's folders as a group of replicate_manifest_folders_task, in chunks of
+    VDR_TRAVERSAL_BATCH_SIZE folders. None of those tasks list a folder in the VDR again.
 
-    Gets the details and contents of a Folder, iterating over the files and streaming them to the AWS bucket (after calculating the correct paths).
-    Will recursively call itself for every subfolder.
+    Progress is recorded in a MigrationCheckpoint. If the last replication of the site in the same mode never
+    finished, its manifest, report and checkpoint are picked up again: the folders and files it finished are skipped
+    and its S3 multipart uploads are carried on from the parts already uploaded. Files which keep failing are given
+    up on, and a checkpoint retried for too many runs or too long is closed and the site crawled again, see
+    Checkpoint. The manifest, and its checkpoint, are deleted once the replication is finished or given up on.
 
+    Every file transferred is recorded in the site's SyncIndex. An incremental replication only transfers the files
+    which are new or have changed since they were last replicated, and can also remove the replicated copies of files
+    which are no longer in the site - unless some folders could not be listed, as their files would look removed.
+
+    The job's progress is counted in a JobProgress, under the id of the celery group the task was dispatched in.
 
     :param request_user_id: the unique identifier of the user in the VDR System making the call
-    :param folder_id:  the unique identifier of the folder in the VDR System
-    :param local_path: the path on the local server where the folder is located
-    :param vdr_path: the path on the VDR system where the folder is located
+    :param root_folder_id: the unique identifier of the site's root folder in the VDR System
+    :param mode: where to replicate to, one of the keys of REPLICATION_MODES
+    :param incremental: True to skip the files which have not changed since they were last replicated
+    :param remove_orphans: True to remove the replicated copies of files which are no longer in the site
+    :param progress_id: the job id to count the progress under, defaults to the task's group id
     :return: None
     """
 
-    current_folder = FolderContentsForRemote(
-        user=request_user_id,
-        folder_id=folder_id,
-        local_path=local_path,
-        vdr_path=vdr_path,
-        report_id=report_id,
+    progress_id = progress_id or self.request.group or self.request.id
+    progress = JobProgress(progress_id)
+    progress.set(state="crawling")
+
+    user = User.objects.get(id=request_user_id)
+    checkpoint = (
+        MigrationCheckpoint.objects.filter(
+            user=user,
+            root_folder_id=root_folder_id,
+            mode=mode,
+            completed__isnull=True,
+        )
+        .select_related("manifest")
+        .order_by("-created")
+        .first()
     )
-    current_folder.prepare_folder()
-
-    # handle empty folder
-    if not current_folder.has_subfolders() and not current_folder.has_files():
-        current_folder.write_empty_folder_to_remote()
-
-    if current_folder.has_files():
-        current_folder.iterate_over_and_write_files_to_remote()
-
-    if current_folder.has_subfolders():
-        for folder in current_folder.subfolders.subfolder_list:
-            recursive_remote_storage_site_builder_task.delay(
-                current_folder.user.id,
-                folder.id,
-                current_folder.local_path,
-                current_folder.vdr_path,
-                current_folder.report_id,
+    if checkpoint is not None and Checkpoint(checkpoint).exhausted():
+        with ReportWriter(
+            str(root_folder_id), report_id=checkpoint.report_id
+        ) as stale_report:
+            stale_report.write_line(
+                f"Giving up on resuming this replication after {checkpoint.attempts} runs, the site will be crawled "
+                f"again"
             )
+        Checkpoint(checkpoint).close()
+        delete_site_manifest(checkpoint.manifest_id)
+        checkpoint = None
+
+    if checkpoint is not None:
+        Checkpoint(checkpoint).start_attempt()
+        manifest = checkpoint.manifest
+        report_id = checkpoint.report_id
+        report = ReportWriter(str(root_folder_id), report_id=report_id)
+        report.write_line(
+            f"Resuming the replication started at {checkpoint.created:%Y-%m-%d %H:%M:%S}"
+        )
+    else:
+        delete_stale_manifests(user)
+        manifest = build_site_manifest(user, root_folder_id)
+        report = _start_manifest_report(manifest)
+        report_id = report.report_id
+        checkpoint = MigrationCheckpoint.objects.create(
+            user=user,
+            root_folder_id=root_folder_id,
+            mode=mode,
+            manifest=manifest,
+            report_id=report_id,
+        )
+
+    if remove_orphans:
+        if manifest.listing_errors:
+            report.write_line(
+                "Not removing files which are no longer in the site, as some folders could not be listed"
+            )
+        else:
+            orphans = SyncIndex(user, manifest.root_folder_id, mode).remove_orphans(
+                manifest.files.values("file_id")
+            )
+            for entry in orphans:
+                report.write_line(
+                    f"Removed {entry.vdr_path}/{entry.name}, which is no longer in the site"
+                )
+        report.flush()
 
-
-class FolderInitiationDetails(TypedDict):
-    folder_id: int
-    vdr_path: str
-    local_path: str
-    report_id: int
+    batch_size = settings.VDR_TRAVERSAL_BATCH_SIZE
+    manifest_folder_ids = list(
+        manifest.folders.exclude(folder_id__in=checkpoint.folders.values("folder_id"))
+        .order_by("depth")
+        .values_list("id", flat=True)
+    )
+    progress.set(
+        state="running",
+        folders_discovered=manifest.folder_count,
+        folders_done=manifest.folder_count - len(manifest_folder_ids),
+        files_total=manifest.file_count,
+        bytes_total=manifest.total_size,
+        errors=manifest.listing_errors,
+    )
+    if not manifest_folder_ids:
+        # every folder was finished by an earlier run, which died before it could finish the checkpoint
+        report.flush()
+        _finish_replication(Checkpoint(checkpoint), user.id, report_id)
+        return
+
+    group(
+        replicate_manifest_folders_task.s(
+            user.id,
+            mode,
+            manifest_folder_ids[i : i + batch_size],
+            report_id,
+            incremental,
+            checkpoint.id,
+            progress_id,
+        )
+        for i in range(0, len(manifest_folder_ids), batch_size)
+    ).apply_async()
 
 
 @shared_task()
-def recursive_site_shallow_delete_task(
-    request_user_id,
-    folder_id: int,
-    local_path=None,
-    vdr_path=None,
-    report_id: int = None,
-    branch_history: List[FolderInitiationDetails] = None,
+def replicate_manifest_folders_task(
+    request_user_id: int,
+    mode: str,
+    manifest_folder_ids: List[int],
+    report_id: int,
+    incremental: bool = False,
+    checkpoint_id: int = None,
+    progress_id: str = None,
 ) -> None:
 
     """
 
-    Moves the contents an entire site in the VDR system to its deleted items folder.
+    Replicates a batch of folders from a SiteManifest.
 
-    Given that calling a 'delete' operation on the root folder of a VDR can create a long running background task
-        at the remote end (which can cause some issues), we are going to, instead, walk down each 'branch' of the
-        folder tree, recording the details needed for folder initiation in a list of FolderInitiationDetails objects
-        once we reach the end of a branch (a folder with no subfolders), we can safely delete the contents of that folder
-        and then use the 'branch history' in reverse, to 'walk back up' the folder tree, deleting the files and folders
-        on the way.
-
-    :param request_user: the unique identifier of the user in the VDR System making the call
-    :param folder_id:  the unique identifier of the folder in the VDR System
-    :param local_path: the path on the local server where the folder is located
-    :param vdr_path: the path on the VDR system where the folder is located
-    :param branch_history: a list of all the folder_id's preceding this folder, in the folder tree
-    :param report_id: the id for the report, which we want to write to for this task
+    :param request_user_id: the unique identifier of the user in the VDR System making the call
+    :param mode: where to replicate to, one of the keys of REPLICATION_MODES
+    :param manifest_folder_ids: the primary keys of the ManifestFolders to replicate
+    :param report_id: the report to associate information about the task to
+    :param incremental: True to skip the files which have not changed since they were last replicated
+    :param checkpoint_id: the MigrationCheckpoint to record the progress of the replication in
+    :param progress_id: the job id to count the progress of the replication under
     :return: None
     """
 
-    current_folder = FolderContentsForSoftDelete(
-        user=request_user_id,
-        folder_id=folder_id,
-        local_path=local_path,
-        vdr_path=vdr_path,
-        report_id=report_id,
-    )
-
-    current_folder.prepare_folder()
-    folder_initial_values = FolderInitiationDetails(
-        folder_id=folder_id,
-        local_path=local_path,
-        vdr_path=vdr_path,
-        report_id=current_folder.report_id,
+    folder_class, replicate_folder = REPLICATION_MODES[mode]
+    user = User.objects.get(id=request_user_id)
+    progress = JobProgress(progress_id)
+    checkpoint = None
+    if checkpoint_id is not None:
+        checkpoint = Checkpoint(
+            MigrationCheckpoint.objects.select_related("manifest").get(id=checkpoint_id)
+        )
+
+    manifest_folders = (
+        ManifestFolder.objects.filter(id__in=manifest_folder_ids)
+        .select_related("manifest")
+        .prefetch_related("files")
+        .order_by("depth")
     )
+    for manifest_folder in manifest_folders:
+        sync_index = SyncIndex(
+            user, manifest_folder.manifest.root_folder_id, mode, incremental
+        )
+        current_folder = folder_class(
+            user=user,
+            folder_id=manifest_folder.folder_id,
+            report_id=report_id,
+            sync_index=sync_index,
+            checkpoint=checkpoint,
+        )
+        current_folder.prepare_folder_from_manifest(manifest_folder)
+        replicate_folder(current_folder)
+        # a file skipped as unchanged or already replicated is done too, so an incremental or resumed run still
+        # reaches files_total
+        progress.add(
+            folders_done=1,
+            files_done=len(current_folder.files.file_list)
+            - len(current_folder.failed_transfers),
+            bytes_transferred=current_folder.transferred_bytes(),
+            errors=len(current_folder.failed_transfers),
+        )
+
+        # a folder with failed files is left to be retried when the replication is rerun, unless they've been given
+        # up on
+        if checkpoint is not None and len(current_folder.given_up_transfers) == len(
+            current_folder.failed_transfers
+        ):
+            checkpoint.complete_folder(manifest_folder.folder_id)
+
+    if checkpoint is not None:
+        _finish_replication(checkpoint, user.id, report_id)
+
+
+@shared_task(bind=True)
+def manifest_site_delete_task(
+    self,
+    request_user_id: int,
+    root_folder_id: int,
+    permanent: bool = False,
+    progress_id: str = None,
+) -> None:
 
-    # Termination case for branch: no subfolders we want to delete everything from the branch
+    """
 
-    if not current_folder.has_subfolders():
+    Soft (or permanently) deletes the contents of an entire site in the VDR system, from a SiteManifest.
 
-        if current_folder.has_files():
-            current_folder.iterate_over_and_shallow_delete_files()
+    Given that calling a 'delete' operation on the root folder of a VDR can create a long running background task
+        at the remote end (which can cause some issues), we instead delete the site from the bottom up. The site's
+        folder tree is crawled once into a SiteManifest and planned into waves with plan_bottom_up_deletion: each wave
+        is dispatched as a group of delete_manifest_folders_task, and the waves are chained so that a folder is only
+        deleted once all of its subfolders have been. Every folder is listed and deleted exactly once, and the root
+        folder itself is never deleted. The manifest is deleted after the last wave.
 
-        # if the folder we are in is the root folder, do not delete - this can often cause issue in the remote VDR
-        if current_folder.folder_details.parent_folder_id != 0:
-            current_folder.shallow_delete_this_folder()
-
-        if branch_history:
-            # walk back up the folder tree!
-            for entry in reversed(branch_history):
-                folder = FolderContentsForSoftDelete(
-                    user=request_user_id,
-                    folder_id=entry["folder_id"],
-                    vdr_path=entry["vdr_path"],
-                    local_path=entry["local_path"],
-                    report_id=entry["report_id"],
-                )
+    A folder which could not be listed, and every folder above it, is left in place and reported, as deleting it
+        would delete contents which were never listed. The files which were listed are still deleted.
 
-                folder.prepare_folder()
+    :param request_user_id: the unique identifier of the user in the VDR System making the call
+    :param root_folder_id: the unique identifier of the site's root folder in the VDR System
+    :param permanent: True to permanently delete, False to move to the site's deleted items folder
+    :param progress_id: the job id to count the progress under, defaults to the task's group id
+    :return: None
+    """
 
-                # check that we are not already dealing with a deleted folder - there will be branch crossover!
-                if folder.folder_details.location != "Deleted items":
+    progress_id = progress_id or self.request.group or self.request.id
+    progress = JobProgress(progress_id)
+    progress.set(state="crawling")
+
+    user = User.objects.get(id=request_user_id)
+    delete_stale_manifests(user)
+    manifest = build_site_manifest(user, root_folder_id)
+    report = _start_manifest_report(manifest)
+    report_id = report.report_id
+    progress.set(
+        state="running",
+        folders_discovered=manifest.folder_count,
+        files_total=manifest.file_count,
+        errors=manifest.listing_errors,
+    )
 
-                    if folder.has_files():
-                        folder.iterate_over_and_shallow_delete_files()
+    batch_size = settings.VDR_TRAVERSAL_BATCH_SIZE
+    waves = [
+        # a list, not a generator: group() reads it lazily, by which time wave would be the last wave
+        group(
+            [
+                delete_manifest_folders_task.si(
+                    user.id, wave[i : i + batch_size], permanent, report_id, progress_id
+                )
+                for i in range(0, len(wave), batch_size)
+            ]
+        )
+        for wave in plan_bottom_up_deletion(manifest)
+    ]
+    # the site's sizes have changed once the last wave is done, so drop the user's cached site list
+    chain(
+        waves
+        + [
+            invalidate_site_list_task.si(user.id),
+            delete_site_manifest_task.si(manifest.id),
+        ]
+    ).apply_async()
 
-                    # second check to not delete the root folder
-                    if folder.folder_details.parent_folder_id != 0:
-                        folder.shallow_delete_this_folder()
 
-    # If we are not at the end of the branch we just want to add the folder id to the branch history and recursively call the celery task on itself
-    else:
-        if branch_history:
-            branch_history.append(folder_initial_values)
-        else:
-            branch_history = [folder_initial_values]
-
-        for folder in current_folder.subfolders.subfolder_list:
-            recursive_site_shallow_delete_task.delay(
-                current_folder.user.id,
-                folder.id,
-                current_folder.local_path,
-                current_folder.vdr_path,
-                current_folder.report_id,
-                branch_history,
-            )
+@shared_task()
+def delete_site_manifest_task(manifest_id: int) -> None:
+    delete_site_manifest(manifest_id)
 
 
-@shared_task
-def recursive_site_permanent_delete_task(
-    request_user_id,
-    folder_id: int,
-    local_path=None,
-    vdr_path=None,
-    report_id: int = None,
-    branch_history: List[FolderInitiationDetails] = None,
+@shared_task()
+def delete_manifest_folders_task(
+    request_user_id: int,
+    manifest_folder_ids: List[int],
+    permanent: bool,
+    report_id: int,
+    progress_id: str = None,
 ) -> None:
+
     """
 
-    Permanently deletes the contents an entire site in the VDR system.
+    Soft (or permanently) deletes a batch of folders from a SiteManifest, and the files within them.
 
-    Given that calling a 'delete' operation on the root folder of a VDR can create a long running background task
-        at the remote end (which can cause some issues), we are going to, instead, walk down each 'branch' of the
-        folder tree, recording the details needed for folder initiation in a list of FolderInitiationDetails objects
-        once we reach the end of a branch (a folder with no subfolders), we can safely delete the contents of that folder
-        and then use the 'branch history' in reverse, to 'walk back up' the folder tree, deleting the files and folders
-        on the way.
-
-    :param request_user: the unique identifier of the user in the VDR System making the call
-    :param folder_id:  the unique identifier of the folder in the VDR System
-    :param local_path: the path on the local server where the folder is located
-    :param vdr_path: the path on the VDR system where the folder is located
-    :param branch_history: a list of all the folder_id's preceding this folder, in the folder tree
-    :param report_id: the id for the report, which we want to write to for this task
+    :param request_user_id: the unique identifier of the user in the VDR System making the call
+    :param manifest_folder_ids: the primary keys of the ManifestFolders to delete
+    :param permanent: True to permanently delete, False to move to the site's deleted items folder
+    :param report_id: the report to associate information about the task to
+    :param progress_id: the job id to count the progress of the deletion under
     :return: None
     """
 
-    current_folder = FolderContentsForHardDelete(
-        user=request_user_id,
-        folder_id=folder_id,
-        local_path=local_path,
-        vdr_path=vdr_path,
-        report_id=report_id,
+    folder_class = (
+        FolderContentsForHardDelete if permanent else FolderContentsForSoftDelete
     )
-
-    current_folder.prepare_folder()
-    folder_initial_values = FolderInitiationDetails(
-        folder_id=folder_id,
-        local_path=local_path,
-        vdr_path=vdr_path,
-        report_id=current_folder.report_id,
-    )
-
-    # Termination case for branch: no subfolders, so we want to delete everything from the branch
-
-    if not current_folder.has_subfolders():
+    user = User.objects.get(id=request_user_id)
+    progress = JobProgress(progress_id)
+
+    manifest_folders = ManifestFolder.objects.filter(
+        id__in=manifest_folder_ids
+    ).prefetch_related("files")
+    for manifest_folder in manifest_folders:
+        current_folder = folder_class(
+            user=user, folder_id=manifest_folder.folder_id, report_id=report_id
+        )
+        current_folder.prepare_folder_from_manifest(manifest_folder)
 
         if current_folder.has_files():
             current_folder.iterate_over_and_shallow_delete_files()
-            current_folder.iterate_over_and_permanently_delete_files()
+            if permanent:
+                current_folder.iterate_over_and_permanently_delete_files()
 
         # if the folder we are in is the root folder, do not delete - this can often cause issue in the remote VDR
         if current_folder.folder_details.parent_folder_id != 0:
-            current_folder.shallow_delete_this_folder()
-            current_folder.permanently_delete_this_folder()
-
-        if branch_history:
-            # walk back up the folder tree!
-            for entry in reversed(branch_history):
-                folder = FolderContentsForHardDelete(
-                    user=request_user_id,
-                    folder_id=entry["folder_id"],
-                    vdr_path=entry["vdr_path"],
-                    local_path=entry["local_path"],
-                    report_id=entry["report_id"],
+            if manifest_folder.complete:
+                current_folder.shallow_delete_this_folder()
+                if permanent:
+                    current_folder.permanently_delete_this_folder()
+            else:
+                # deleting it would delete whatever its listing missed along with it
+                current_folder.report.write_line(
+                    f"Not deleting {manifest_folder.vdr_path}, as it, or a folder within it, could not be listed"
                 )
 
-                folder.prepare_folder()
-
-                # check that we are not already dealing with a deleted folder - there will be branch crossover!
-                if folder.folder_details.location != "Deleted items":
-
-                    if folder.has_files():
-                        folder.iterate_over_and_shallow_delete_files()
-                        folder.iterate_over_and_permanently_delete_files()
-
-                    # second check to not delete the root folder:
-                    if folder.folder_details.parent_folder_id != 0:
-                        folder.shallow_delete_this_folder()
-                        folder.permanently_delete_this_folder()
-
-    # If we are not at the end of the branch we just want to add the folder's initial details to the branch history and recursively call the celery task on itself
-    else:
-        if branch_history:
-            branch_history.append(folder_initial_values)
-        else:
-            branch_history = [folder_initial_values]
-
-        for folder in current_folder.subfolders.subfolder_list:
-            recursive_site_permanent_delete_task.delay(
-                current_folder.user.id,
-                folder.id,
-                current_folder.local_path,
-                current_folder.vdr_path,
-                current_folder.report_id,
-                branch_history,
-            )
+        progress.add(folders_done=1, files_done=len(current_folder.files.file_list))
@@ -0,0 +1,147 @@
+from datetime import timedelta
+from typing import Iterable, Optional, Set
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from core.models import (
+    CheckpointFailure,
+    CheckpointFile,
+    CheckpointFolder,
+    CheckpointUpload,
+    MigrationCheckpoint,
+)
+
+
+class Checkpoint:
+    """
+    A class used to read and update the MigrationCheckpoint of a replication, from any of the tasks taking part in it
+
+    Everything is written as soon as it is finished - a file once it has been transferred, a folder once all of its
+    files have been - so a worker dying loses at most the files it had in flight. S3 multipart uploads record their
+    upload id when they start, so a rerun can carry on from the parts already uploaded.
+
+    A file which keeps failing (e.g. deleted from the VDR since the site was crawled) is given up on after failing
+    on VDR_CHECKPOINT_MAX_FILE_ATTEMPTS runs, and counts as finished. A checkpoint which still isn't complete after
+    VDR_CHECKPOINT_MAX_ATTEMPTS runs, or VDR_CHECKPOINT_MAX_AGE seconds, is closed, so the next replication crawls
+    the site again rather than replicating an old manifest for ever.
+
+    ...
+
+    Attributes
+    ----------
+    checkpoint : MigrationCheckpoint
+        the checkpoint of the replication
+
+    Methods
+    -------
+    completed_file_ids() / complete_file()
+        The files which have been transferred or given up on, and recording another transferred one
+
+    fail_file()
+        Records a file failing to transfer, and whether it has now been given up on
+
+    completed_folder_ids() / complete_folder()
+        The folders all of whose files have been transferred, and recording another one
+
+    get_upload() / start_upload() / finish_upload()
+        The in-flight S3 multipart upload of a file, and the ETag of the file it is being uploaded from
+
+    finish_if_complete()
+        Marks the checkpoint completed once every folder in its manifest is
+
+    exhausted() / start_attempt() / close()
+        Whether the checkpoint has been retried for too many runs or too long, counting another run, and closing it
+
+    """
+
+    def __init__(self, checkpoint: MigrationCheckpoint):
+        self.checkpoint = checkpoint
+
+    def completed_file_ids(self, file_ids: Iterable[int]) -> Set[int]:
+        file_ids = list(file_ids)
+        return set(
+            CheckpointFile.objects.filter(
+                checkpoint=self.checkpoint, file_id__in=file_ids
+            ).values_list("file_id", flat=True)
+        ) | set(
+            CheckpointFailure.objects.filter(
+                checkpoint=self.checkpoint,
+                file_id__in=file_ids,
+                attempts__gte=settings.VDR_CHECKPOINT_MAX_FILE_ATTEMPTS,
+            ).values_list("file_id", flat=True)
+        )
+
+    def complete_file(self, file_id: int) -> None:
+        CheckpointFile.objects.get_or_create(
+            checkpoint=self.checkpoint, file_id=file_id
+        )
+
+    def fail_file(self, file_id: int, error: str = "") -> bool:
+        failure, created = CheckpointFailure.objects.get_or_create(
+            checkpoint=self.checkpoint, file_id=file_id, defaults={"error": error}
+        )
+        if not created:
+            CheckpointFailure.objects.filter(id=failure.id).update(
+                attempts=F("attempts") + 1, error=error
+            )
+            failure.attempts += 1
+        return failure.attempts >= settings.VDR_CHECKPOINT_MAX_FILE_ATTEMPTS
+
+    def completed_folder_ids(self) -> Set[int]:
+        return set(self.checkpoint.folders.values_list("folder_id", flat=True))
+
+    def complete_folder(self, folder_id: int) -> None:
+        CheckpointFolder.objects.get_or_create(
+            checkpoint=self.checkpoint, folder_id=folder_id
+        )
+
+    def get_upload(self, file_id: int, s3_key: str) -> Optional[CheckpointUpload]:
+        return CheckpointUpload.objects.filter(
+            checkpoint=self.checkpoint, file_id=file_id, s3_key=s3_key
+        ).first()
+
+    def start_upload(
+        self, file_id: int, s3_key: str, upload_id: str, etag: str = ""
+    ) -> None:
+        CheckpointUpload.objects.update_or_create(
+            checkpoint=self.checkpoint,
+            file_id=file_id,
+            defaults={"s3_key": s3_key, "upload_id": upload_id, "etag": etag or ""},
+        )
+
+    def finish_upload(self, file_id: int) -> None:
+        CheckpointUpload.objects.filter(
+            checkpoint=self.checkpoint, file_id=file_id
+        ).delete()
+
+    def finish_if_complete(self) -> bool:
+        if self.checkpoint.folders.count() < self.checkpoint.manifest.folders.count():
+            return False
+
+        # several batches may finish at once, only the one which marks it completed gets True
+        return (
+            MigrationCheckpoint.objects.filter(
+                id=self.checkpoint.id, completed__isnull=True
+            ).update(completed=timezone.now())
+            > 0
+        )
+
+    def exhausted(self) -> bool:
+        return (
+            self.checkpoint.attempts >= settings.VDR_CHECKPOINT_MAX_ATTEMPTS
+            or timezone.now() - self.checkpoint.created
+            > timedelta(seconds=settings.VDR_CHECKPOINT_MAX_AGE)
+        )
+
+    def start_attempt(self) -> None:
+        MigrationCheckpoint.objects.filter(id=self.checkpoint.id).update(
+            attempts=F("attempts") + 1
+        )
+        self.checkpoint.attempts += 1
+
+    def close(self) -> None:
+        MigrationCheckpoint.objects.filter(
+            id=self.checkpoint.id, completed__isnull=True
+        ).update(completed=timezone.now())
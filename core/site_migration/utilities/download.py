@@ -0,0 +1,500 @@
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections
+from requests.exceptions import RequestException
+from urllib3.exceptions import HTTPError
+
+from core.dataclasses.file_and_folder_dataclasses import VDRFile
+from core.dataclasses.utility_dataclasses import VDRServiceError
+from core.http_handlers.file_and_folder_http_handlers import download_single_file
+
+# the errors a download can be resumed after: the connection dropping or timing out part way through the body
+RESUMABLE_DOWNLOAD_ERRORS = (RequestException, HTTPError)
+
+
+class RangeNotSupported(Exception):
+    # raised when a segment can't be downloaded as a range: the VDR ignores ranges, or the file has changed
+    pass
+
+
+def skip_bytes(stream, count: int, chunk_size: int = 1024 * 1024) -> None:
+    while count > 0:
+        chunk = stream.read(min(chunk_size, count))
+        if not chunk:
+            raise IOError(f"the download ended {count} bytes short of where it resumes")
+        count -= len(chunk)
+
+
+def readinto_chunks(stream, chunk_size: int):
+
+    """
+    Reads a stream through one reusable buffer, rather than allocating a new bytes object for every chunk.
+
+    Each memoryview yielded is only valid until the next one is asked for, so it must be written out straight away.
+
+    :param stream: a file object with a readinto() method, e.g. the raw stream of a response
+    :param chunk_size: the size of the buffer
+    :return: a generator of memoryviews over the buffer
+    """
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    while True:
+        count = stream.readinto(buffer)
+        if not count:
+            return
+        yield view[:count]
+
+
+def preallocate(fd: int, size: int) -> None:
+    # reserves the file's blocks up front so they are laid out together. Not every platform or filesystem can, so
+    # fall back to a sparse file of the right size
+    try:
+        os.posix_fallocate(fd, 0, size)
+    except (AttributeError, OSError):
+        os.truncate(fd, size)
+
+
+def open_download_at(request_user, file_id: int, offset: int = 0, if_range: str = None):
+
+    """
+    Opens the download of a file part of the way through, using an HTTP Range request.
+
+    If the VDR ignores the range and sends the whole file, the bytes before the offset are read past, so the raw
+    stream of the response handed back always starts at the offset. With an if_range ETag the range is sent as an
+    If-Range request, and the whole file coming back instead means it may have changed since the bytes before the
+    offset were read, so it is rejected rather than read past.
+
+    :param request_user: the user authenticated during the request
+    :param file_id: int
+    :param offset: the number of bytes of the file to start after
+    :param if_range: the ETag of the file the bytes before the offset were read from, optional
+    :return: the streamed response, or a VDRServiceError
+    :raises RangeNotSupported: if an if_range was given and the VDR didn't answer with the range
+    """
+    response = download_single_file(
+        request_user,
+        file_id,
+        start_byte=offset or None,
+        if_range=if_range if offset else None,
+    )
+    if isinstance(response, VDRServiceError):
+        return response
+
+    response.raw.decode_content = True
+    if offset and response.status_code != 206:
+        if if_range:
+            response.close()
+            raise RangeNotSupported()
+        skip_bytes(response.raw, offset)
+    return response
+
+
+class ResumableDownload:
+    """
+    A read-only, non-seekable file object over the download of a file, which carries on from the byte it had reached
+    if the connection drops part of the way through
+
+    The rest of the file is asked for with a Range request, sent with an If-Range of the ETag of the first response,
+    up to VDR_DOWNLOAD_MAX_ATTEMPTS times in all. A file with no strong ETag, or which has changed since the download
+    started, can't be carried on safely, so the error is raised instead. Built by open_resumable_download().
+
+    ...
+
+    Attributes
+    ----------
+    response : requests.Response
+        the response the download was opened with
+    etag : str
+        the strong ETag of the file, or None
+    position : int
+        the byte of the file the next read starts at
+
+    """
+
+    def __init__(self, request_user, file_id: int, response, offset: int = 0):
+        self.request_user = request_user
+        self.file_id = file_id
+        self.response = response
+        self.etag = _strong_etag(response)
+        self.position = offset
+        self._current = response
+        self._attempts = 1
+
+    def _reopen(self) -> None:
+        self._current.close()
+        response = open_download_at(
+            self.request_user, self.file_id, self.position, if_range=self.etag
+        )
+        if isinstance(response, VDRServiceError):
+            raise IOError(
+                f"could not resume the download of file {self.file_id}: "
+                f"{response.status_code} {response.message}"
+            )
+        self._current = response
+
+    def read(self, size=-1):
+        while True:
+            try:
+                chunk = self._current.raw.read(size)
+            except RESUMABLE_DOWNLOAD_ERRORS:
+                if (
+                    self.etag is None
+                    or self._attempts >= settings.VDR_DOWNLOAD_MAX_ATTEMPTS
+                ):
+                    raise
+                self._attempts += 1
+                self._reopen()
+                continue
+            self.position += len(chunk)
+            return chunk
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return False
+
+    def close(self):
+        self._current.close()
+
+
+def open_resumable_download(
+    request_user, file_id: int, offset: int = 0, if_range: str = None
+):
+
+    """
+    Opens the download of a file as a ResumableDownload, which picks the download up again with a ranged request if
+    the connection drops, rather than failing the whole file.
+
+    :param request_user: the user authenticated during the request
+    :param file_id: int
+    :param offset: the number of bytes of the file to start after, see open_download_at()
+    :param if_range: the ETag of the file the bytes before the offset were read from, optional
+    :return: a ResumableDownload, or a VDRServiceError
+    :raises RangeNotSupported: if an if_range was given and the VDR didn't answer with the range
+    """
+    response = open_download_at(request_user, file_id, offset, if_range=if_range)
+    if isinstance(response, VDRServiceError):
+        return response
+    return ResumableDownload(request_user, file_id, response, offset)
+
+
+def _strong_etag(response):
+    # a weak ETag can't be sent in an If-Range
+    etag = response.headers.get("ETag", "")
+    if not etag or etag.startswith("W/"):
+        return None
+    return etag
+
+
+def _state_path(part_path: str) -> str:
+    return part_path + ".json"
+
+
+def _read_download_state(part_path: str) -> dict:
+
+    """
+    Reads what an earlier attempt recorded about a .part file, as its size alone can't say how much of it was written.
+
+    The state holds the ETag of the file the .part was written from, which a resumed request sends as an If-Range,
+    the segment_size and the starts of the segments written if it was downloaded in segments, and complete once
+    every byte has been written.
+
+    :param part_path: the path of the .part file
+    :return: the state, or an empty dict if there is none
+    """
+    try:
+        with open(_state_path(part_path)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_download_state(part_path: str, state: dict) -> None:
+    state_path = _state_path(part_path)
+    with open(state_path + ".tmp", "w") as f:
+        json.dump(state, f)
+    os.replace(state_path + ".tmp", state_path)
+
+
+def _discard_download(part_path: str) -> None:
+    for stale_path in (part_path, _state_path(part_path)):
+        if os.path.exists(stale_path):
+            os.remove(stale_path)
+
+
+def _finish_download(part_path: str, path: str, state: dict) -> None:
+    # marked complete before the rename, so a worker dying in between leaves a .part the next attempt can promote
+    _write_download_state(part_path, dict(state, complete=True))
+    os.replace(part_path, path)
+    os.remove(_state_path(part_path))
+
+
+def partial_download_offset(path: str, etag: str) -> int:
+
+    """
+    :param path: where the file is being written, with its .part beside it
+    :param etag: the ETag of the file the rest of it would be downloaded from
+    :return: the number of bytes of the file already written to path + ".part" from a file with that ETag, which a
+        download of the rest of it can carry on from
+    """
+    part_path = path + ".part"
+    state = _read_download_state(part_path)
+    if (
+        not etag
+        or state.get("etag") != etag
+        or "segments" in state
+        or not os.path.exists(part_path)
+    ):
+        return 0
+    return os.path.getsize(part_path)
+
+
+def open_partial_download(path: str, offset: int, etag: str):
+
+    """
+    Opens path + ".part" to write a download to, keeping the first offset bytes already written to it, for a download
+    written by something other than download_file_to_path() (e.g. teed into an upload). The ETag of the file is
+    recorded beside it, as download_file_to_path() does, so a later attempt can carry on from it with
+    partial_download_offset(). Once every byte has been written, finish_partial_download() renames it to path.
+
+    :param path: where the file is being written
+    :param offset: the number of bytes to keep, from partial_download_offset()
+    :param etag: the ETag of the file being downloaded, if it has a strong one
+    :return: the .part, opened for writing at the offset
+    """
+    part_path = path + ".part"
+    f = open(part_path, "r+b" if offset else "wb")
+    f.seek(offset)
+    f.truncate()
+    f.flush()
+    # only recorded once the .part holds nothing from an older version of the file
+    _write_download_state(part_path, {"etag": etag})
+    return f
+
+
+def finish_partial_download(path: str) -> None:
+    part_path = path + ".part"
+    _finish_download(part_path, path, _read_download_state(part_path))
+
+
+def _download_from(
+    request_user, file_id: int, f, part_path: str, offset: int, state: dict, on_response
+):
+    response = download_single_file(
+        request_user,
+        file_id,
+        start_byte=offset or None,
+        if_range=state.get("etag") if offset else None,
+    )
+    if isinstance(response, VDRServiceError):
+        return response
+    on_response(response)
+
+    response.raw.decode_content = True
+    if response.status_code != 206:
+        # the whole file was sent: the VDR ignored the range, or the file has changed since the .part was written
+        offset = 0
+    f.seek(offset)
+    f.truncate()
+    f.flush()
+
+    # only recorded once the .part holds nothing from an older version of the file
+    etag = _strong_etag(response)
+    if etag != state.get("etag"):
+        state["etag"] = etag
+        _write_download_state(part_path, state)
+
+    for chunk in readinto_chunks(response.raw, settings.VDR_DOWNLOAD_CHUNK_SIZE):
+        f.write(chunk)
+    return response
+
+
+def _download_segment(
+    request_user,
+    file_id: int,
+    path: str,
+    start: int,
+    end: int,
+    on_response,
+    if_range: str = None,
+):
+    position = start
+    attempts = 0
+    etag = if_range
+    fd = os.open(path, os.O_WRONLY)
+    try:
+        while position <= end:
+            if attempts >= settings.VDR_DOWNLOAD_MAX_ATTEMPTS:
+                raise IOError(
+                    f"could not download bytes {position}-{end} of file {file_id}"
+                )
+            attempts += 1
+
+            response = download_single_file(
+                request_user, file_id, start_byte=position, end_byte=end, if_range=etag
+            )
+            if isinstance(response, VDRServiceError):
+                return response
+            if response.status_code != 206:
+                response.close()
+                raise RangeNotSupported()
+            on_response(response)
+            etag = _strong_etag(response)
+
+            try:
+                for chunk in readinto_chunks(
+                    response.raw, settings.VDR_DOWNLOAD_CHUNK_SIZE
+                ):
+                    os.pwrite(fd, chunk, position)
+                    position += len(chunk)
+            except RESUMABLE_DOWNLOAD_ERRORS:
+                if attempts >= settings.VDR_DOWNLOAD_MAX_ATTEMPTS:
+                    raise
+    finally:
+        os.close(fd)
+        # the token lookup may have queried the DB from this thread
+        connections.close_all()
+    return etag
+
+
+def _download_in_segments(
+    request_user, file: VDRFile, part_path: str, state: dict, on_response
+):
+    segment_size = settings.VDR_DOWNLOAD_SEGMENT_SIZE
+    if (
+        state.get("segment_size") != segment_size
+        or not os.path.exists(part_path)
+        or os.path.getsize(part_path) != file.size
+        or (state.get("segments") and not state.get("etag"))
+    ):
+        # marked as segmented before it is preallocated, so its size is never taken for how much was written
+        state.clear()
+        state.update(segment_size=segment_size, segments=[], etag=None)
+        _write_download_state(part_path, state)
+        with open(part_path, "wb") as f:
+            preallocate(f.fileno(), file.size)
+
+    written = set(state["segments"])
+    segments = [
+        (start, min(start + segment_size, file.size) - 1)
+        for start in range(0, file.size, segment_size)
+        if start not in written
+    ]
+    state_lock = threading.Lock()
+
+    def _download(segment):
+        etag = _download_segment(
+            request_user, file.id, part_path, *segment, on_response, state["etag"]
+        )
+        if isinstance(etag, VDRServiceError):
+            return etag
+
+        with state_lock:
+            if state["etag"] is None:
+                state["etag"] = etag
+            elif etag != state["etag"]:
+                # the file changed while its segments were being downloaded
+                raise RangeNotSupported()
+            state["segments"].append(segment[0])
+            _write_download_state(part_path, state)
+        return None
+
+    with ThreadPoolExecutor(max_workers=settings.VDR_DOWNLOAD_SEGMENTS) as executor:
+        results = list(executor.map(_download, segments))
+    for result in results:
+        if isinstance(result, VDRServiceError):
+            return result
+    return None
+
+
+def _ignore_response(response):
+    pass
+
+
+def download_file_to_path(
+    request_user, file: VDRFile, path: str, on_response=_ignore_response
+):
+
+    """
+    Downloads a file from the VDR to the local server, resuming from the last byte written if the connection drops.
+
+    The file is written to path + ".part" and only renamed to path once it is complete, so a partial file left
+    behind by a worker dying is picked up from where it stopped by the next attempt - with a Range request if the
+    VDR supports them. Within a single call, a dropped connection is resumed up to VDR_DOWNLOAD_MAX_ATTEMPTS times.
+
+    What is known about the .part is kept beside it in path + ".part.json" (see _read_download_state()). A .part is
+    only resumed if the ETag of the file it was written from is known, and the rest of it is asked for with an
+    If-Range, so if the file has changed the VDR sends all of it and it is written again from the start. It is only
+    taken as finished once it has been marked complete, never from its size.
+
+    Files of more than VDR_DOWNLOAD_SEGMENT_SIZE bytes are downloaded as ranged segments on
+    VDR_DOWNLOAD_SEGMENTS threads, each written straight to its place in a file preallocated to the file's size, and
+    recorded in the state as it finishes so a rerun only downloads the rest. If the VDR ignores ranges, or the file
+    changes part of the way through, the file is downloaded in one piece instead.
+
+    The body is read in VDR_DOWNLOAD_CHUNK_SIZE chunks through a single reused buffer, see readinto_chunks().
+
+    :param request_user: the user authenticated during the request
+    :param file: the VDRFile to download
+    :param path: where to write the file
+    :param on_response: called with each response the file is downloaded from, e.g. to read its headers
+    :return: the path, or a VDRServiceError
+    """
+    part_path = path + ".part"
+    state = _read_download_state(part_path)
+    if state.get("complete") and os.path.exists(part_path):
+        # the download finished, but the worker died before the rename
+        _finish_download(part_path, path, state)
+        return path
+
+    if (
+        settings.VDR_DOWNLOAD_SEGMENTS > 1
+        and file.size > settings.VDR_DOWNLOAD_SEGMENT_SIZE
+    ):
+        try:
+            error = _download_in_segments(
+                request_user, file, part_path, state, on_response
+            )
+        except RangeNotSupported:
+            _discard_download(part_path)
+            state = {}
+        else:
+            if error is not None:
+                return error
+            _finish_download(part_path, path, state)
+            return path
+
+    if "segments" in state:
+        # preallocated to the file's size, so how much of it was written can't be carried on from
+        _discard_download(part_path)
+        state = {}
+
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    if offset >= file.size or not state.get("etag"):
+        offset = 0
+
+    attempts = 0
+    with open(part_path, "r+b" if offset else "wb") as f:
+        while True:
+            try:
+                response = _download_from(
+                    request_user, file.id, f, part_path, offset, state, on_response
+                )
+            except RESUMABLE_DOWNLOAD_ERRORS:
+                attempts += 1
+                if attempts >= settings.VDR_DOWNLOAD_MAX_ATTEMPTS:
+                    raise
+                f.flush()
+                offset = f.tell() if state.get("etag") else 0
+                continue
+            if isinstance(response, VDRServiceError):
+                return response
+            break
+
+    _finish_download(part_path, path, state)
+    return path
@@ -0,0 +1,115 @@
+import os
+import threading
+
+import redis
+from django.conf import settings
+
+PROGRESS_COUNTERS = (
+    "folders_discovered",
+    "folders_done",
+    "files_total",
+    "files_done",
+    "bytes_total",
+    "bytes_transferred",
+    "errors",
+)
+
+_progress_redis = None
+_progress_redis_pid = None
+_progress_redis_lock = threading.Lock()
+
+
+def get_progress_redis() -> redis.Redis:
+
+    """
+    Returns the Redis client the job progress is kept in, for the current process. Like the VDR Session, it is
+    rebuilt after a fork.
+
+    :return: a redis client for VDR_PROGRESS_REDIS_URL
+    """
+    global _progress_redis, _progress_redis_pid
+
+    pid = os.getpid()
+    if _progress_redis is None or _progress_redis_pid != pid:
+        with _progress_redis_lock:
+            if _progress_redis is None or _progress_redis_pid != pid:
+                _progress_redis = redis.Redis.from_url(
+                    settings.VDR_PROGRESS_REDIS_URL, decode_responses=True
+                )
+                _progress_redis_pid = pid
+
+    return _progress_redis
+
+
+class JobProgress:
+    """
+    A class used to represent the progress of a replication or deletion job, kept as a Redis hash
+
+    Every task taking part in the job adds to the same counters, with HINCRBY, so the totals can be read in one
+    HGETALL without touching the result backend or the DB. Every update also bumps a version, which the status
+    endpoint uses as its ETag. The hash expires VDR_PROGRESS_TTL seconds after the last update. A task run outside
+    of a job (e.g. called directly) has no job_id, and its updates are dropped.
+
+    ...
+
+    Attributes
+    ----------
+    job_id : str
+        the unique identifier of the job, the id of the celery group the job was dispatched as
+    key : str
+        the key of the Redis hash
+
+    Methods
+    -------
+    set()
+        Sets fields of the job, e.g. its state or the totals found when the site was crawled
+
+    add()
+        Adds to the job's counters
+
+    get()
+        Returns every field of the job, with the counters as ints
+
+    """
+
+    def __init__(self, job_id: str, client: redis.Redis = None):
+        self.job_id = job_id
+        self.key = f"vdr:progress:{job_id}"
+        self.client = client
+
+    def _client(self):
+        return self.client or get_progress_redis()
+
+    def set(self, **fields) -> None:
+        if not self.job_id:
+            return
+        pipeline = self._client().pipeline()
+        pipeline.hset(self.key, mapping=fields)
+        pipeline.hincrby(self.key, "version", 1)
+        pipeline.expire(self.key, settings.VDR_PROGRESS_TTL)
+        pipeline.execute()
+
+    def add(self, **counters) -> None:
+        if not self.job_id:
+            return
+        pipeline = self._client().pipeline()
+        for counter, amount in counters.items():
+            if amount:
+                pipeline.hincrby(self.key, counter, amount)
+        pipeline.hincrby(self.key, "version", 1)
+        pipeline.expire(self.key, settings.VDR_PROGRESS_TTL)
+        pipeline.execute()
+
+    def get(self) -> dict:
+        if not self.job_id:
+            return {}
+        fields = self._client().hgetall(self.key)
+        if not fields:
+            return {}
+
+        progress = {
+            counter: int(fields.get(counter, 0)) for counter in PROGRESS_COUNTERS
+        }
+        progress["state"] = fields.get("state", "")
+        progress["version"] = int(fields.get("version", 0))
+        return progress
@@ -0,0 +1,258 @@
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import List, NamedTuple, Optional
+
+import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from django.conf import settings
+
+from core.http_handlers.utils import get_setting
+
+_s3_client = None
+_s3_client_key = None
+_s3_client_lock = threading.Lock()
+
+
+def get_s3_client():
+
+    """
+    Returns the boto3 S3 client for the current process, building it only when it has to.
+
+    Building a client is slow (it loads the service model and sets up its own connection pool), so one client is
+    shared by every folder handled in the process; boto3 clients are thread safe. It is rebuilt if the AWS
+    credentials or the upload concurrency in RemoteSystemSettings change, or after a fork.
+
+    The connection pool is sized so every transfer thread in the process can have all of its parts in flight.
+
+    :return: a boto3 S3 client
+    """
+    global _s3_client, _s3_client_key
+
+    aws_access_key_id = get_setting("aws_access_key_id")
+    aws_secret_access_key = get_setting("aws_secret_access_key")
+    s3_max_concurrency = get_setting("s3_max_concurrency")
+    client_key = (
+        os.getpid(),
+        aws_access_key_id,
+        aws_secret_access_key,
+        s3_max_concurrency,
+    )
+
+    with _s3_client_lock:
+        if _s3_client is None or _s3_client_key != client_key:
+            _s3_client = boto3.client(
+                "s3",
+                aws_access_key_id=aws_access_key_id,
+                aws_secret_access_key=aws_secret_access_key,
+                config=Config(
+                    max_pool_connections=settings.VDR_TRANSFER_MAX_WORKERS_PER_PROCESS
+                    * s3_max_concurrency
+                ),
+            )
+            _s3_client_key = client_key
+
+    return _s3_client
+
+
+def get_s3_transfer_config() -> TransferConfig:
+
+    """
+    Builds the TransferConfig for uploads to S3 from the multipart settings in RemoteSystemSettings.
+
+    :return: a boto3 TransferConfig
+    """
+    return TransferConfig(
+        multipart_threshold=get_setting("s3_multipart_threshold"),
+        multipart_chunksize=get_setting("s3_multipart_chunksize"),
+        max_concurrency=get_setting("s3_max_concurrency"),
+    )
+
+
+def _read_part(fileobj, part_size: int) -> bytes:
+    # a stream may hand back less than asked for before the end of the body
+    part = bytearray()
+    while len(part) < part_size:
+        chunk = fileobj.read(part_size - len(part))
+        if not chunk:
+            break
+        part += chunk
+    return bytes(part)
+
+
+def _uploaded_parts(s3_client, bucket: str, key: str, upload_id: str) -> list:
+    parts = []
+    paginator = s3_client.get_paginator("list_parts")
+    for page in paginator.paginate(Bucket=bucket, Key=key, UploadId=upload_id):
+        parts.extend(page.get("Parts", []))
+    return sorted(parts, key=lambda part: part["PartNumber"])
+
+
+class ResumableUpload(NamedTuple):
+    # the multipart upload of a file recorded in a checkpoint, the parts of it which can be kept, and the ETag of the
+    # file they were read from
+    upload_id: Optional[str]
+    parts: List[dict]
+    etag: Optional[str] = None
+
+    def offset(self, part_size: int) -> int:
+        return len(self.parts) * part_size
+
+
+def abort_resumable_upload(
+    s3_client, bucket: str, key: str, checkpoint, file_id, upload_id: str
+) -> None:
+
+    """
+    Gives up on the upload of a file a previous resumable_upload_fileobj() started, e.g. as the file has changed in
+    the VDR since, so S3 doesn't keep its parts and the checkpoint no longer records it.
+
+    :return: None
+    """
+    try:
+        s3_client.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+    except s3_client.exceptions.NoSuchUpload:
+        pass
+    checkpoint.finish_upload(file_id)
+
+
+def find_resumable_upload(
+    s3_client, bucket: str, key: str, part_size: int, checkpoint, file_id
+) -> ResumableUpload:
+
+    """
+    Finds the upload of a file a previous resumable_upload_fileobj() started, and lists the parts S3 already has.
+
+    Only a run of full parts from the first can be kept; anything after a gap (e.g. parts which were in flight at once
+    when the process died) is uploaded again. Its offset() is where a ranged download of the rest of the file should
+    start, sent with an If-Range of its etag. An upload recorded without an ETag can't be checked against the file,
+    so it is aborted rather than resumed.
+
+    :return: a ResumableUpload, with no upload_id if there is nothing to resume
+    """
+    upload = checkpoint.get_upload(file_id, key)
+    if upload is None:
+        return ResumableUpload(None, [])
+    if not upload.etag:
+        abort_resumable_upload(
+            s3_client, bucket, key, checkpoint, file_id, upload.upload_id
+        )
+        return ResumableUpload(None, [])
+
+    try:
+        uploaded = _uploaded_parts(s3_client, bucket, key, upload.upload_id)
+    except s3_client.exceptions.NoSuchUpload:
+        return ResumableUpload(None, [])
+
+    parts = []
+    for number, part in enumerate(uploaded, start=1):
+        if part["PartNumber"] != number or part["Size"] != part_size:
+            break
+        parts.append({"PartNumber": number, "ETag": part["ETag"]})
+    return ResumableUpload(upload.upload_id, parts, upload.etag)
+
+
+def _upload_part(s3_client, bucket: str, key: str, upload_id: str, number, body):
+    response = s3_client.upload_part(
+        Bucket=bucket, Key=key, UploadId=upload_id, PartNumber=number, Body=body
+    )
+    return {"PartNumber": number, "ETag": response["ETag"]}
+
+
+def resumable_upload_fileobj(
+    s3_client,
+    fileobj,
+    bucket: str,
+    key: str,
+    part_size: int,
+    checkpoint,
+    file_id,
+    fileobj_offset: int = 0,
+    max_concurrency: int = 1,
+    resume: ResumableUpload = None,
+    etag: str = None,
+) -> None:
+
+    """
+    Uploads a stream to S3 as a multipart upload which can be carried on by a later call, after the process making
+    this one has died.
+
+    The upload id is recorded in the checkpoint as soon as the upload is started, with the ETag of the file being
+    read. If the checkpoint already holds one for the file, and the file still has the same ETag, the parts S3 has
+    for it are kept, and fileobj is read past the bytes they hold before the remaining parts are uploaded - a fileobj
+    opened with a ranged download at the offset() of find_resumable_upload() has nothing to read past. If the file
+    has changed, or its ETag isn't known, the old upload is aborted and the file uploaded again from the start. Like
+    upload_fileobj, up to max_concurrency parts are uploaded at once, so no more than that many parts are held in
+    memory.
+
+    :param s3_client: a boto3 S3 client
+    :param fileobj: a readable file object
+    :param bucket: the name of the bucket
+    :param key: the key of the object to upload
+    :param part_size: the size of every part but the last, at least 5MiB
+    :param checkpoint: the Checkpoint of the replication
+    :param file_id: the unique identifier of the file in the VDR System
+    :param fileobj_offset: the byte of the file fileobj starts at
+    :param max_concurrency: the parts uploaded at once, e.g. the max_concurrency of the TransferConfig
+    :param resume: the ResumableUpload already found for the file, so S3 isn't asked for its parts again
+    :param etag: the ETag of the file fileobj is read from
+    :return: None
+    """
+
+    if resume is None:
+        resume = find_resumable_upload(
+            s3_client, bucket, key, part_size, checkpoint, file_id
+        )
+    if resume.upload_id is not None and (not etag or etag != resume.etag):
+        # the parts already uploaded were read from another version of the file
+        abort_resumable_upload(
+            s3_client, bucket, key, checkpoint, file_id, resume.upload_id
+        )
+        resume = ResumableUpload(None, [])
+    upload_id, parts = resume.upload_id, list(resume.parts)
+    to_skip = resume.offset(part_size) - fileobj_offset
+    if to_skip < 0:
+        raise IOError(f"{key} has fewer parts uploaded than the stream starts after")
+    while to_skip > 0:
+        skipped = len(_read_part(fileobj, min(part_size, to_skip)))
+        if not skipped:
+            raise IOError(
+                f"{key} is shorter than the {len(parts)} parts already uploaded"
+            )
+        to_skip -= skipped
+
+    if upload_id is None:
+        upload_id = s3_client.create_multipart_upload(Bucket=bucket, Key=key)[
+            "UploadId"
+        ]
+        checkpoint.start_upload(file_id, key, upload_id, etag)
+
+    number = len(parts)
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        in_flight = set()
+        while True:
+            body = _read_part(fileobj, part_size)
+            # S3 won't complete an upload with no parts, so an empty file still gets one
+            if not body and number:
+                break
+            number += 1
+            in_flight.add(
+                executor.submit(
+                    _upload_part, s3_client, bucket, key, upload_id, number, body
+                )
+            )
+            if len(in_flight) >= max_concurrency:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                parts.extend(future.result() for future in done)
+            if len(body) < part_size:
+                break
+        parts.extend(future.result() for future in in_flight)
+
+    s3_client.complete_multipart_upload(
+        Bucket=bucket,
+        Key=key,
+        UploadId=upload_id,
+        MultipartUpload={"Parts": sorted(parts, key=lambda part: part["PartNumber"])},
+    )
+    checkpoint.finish_upload(file_id)
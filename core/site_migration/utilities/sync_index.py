@@ -0,0 +1,194 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List, NamedTuple
+
+from django.conf import settings
+from django.db import connections, transaction
+
+from core.dataclasses.file_and_folder_dataclasses import VDRFile
+from core.dataclasses.utility_dataclasses import VDRServiceError
+from core.http_handlers.file_and_folder_http_handlers import download_single_file
+from core.http_handlers.utils import get_setting
+from core.models import SyncIndexEntry
+from core.site_migration.utilities.s3 import get_s3_client
+
+
+class SyncDestination(NamedTuple):
+    file: VDRFile
+    local_path: str = ""
+    s3_key: str = ""
+    etag: str = ""
+
+
+class SyncIndex:
+    """
+    A class used to represent the SyncIndexEntries of a single VDR Site, for one replication target
+
+    ...
+
+    Attributes
+    ----------
+    user : User object
+        the user the site is being replicated for
+    root_folder_id : int
+        the unique identifier of the site's root folder in the VDR System
+    target : str
+        one of the SyncIndexEntry target choices: local, remote or local_and_remote
+    incremental : bool
+        when True, files which have not changed since they were last replicated are skipped. The index is recorded
+        either way, so a full replication leaves it ready for the next incremental one.
+
+    Methods
+    -------
+    files_to_transfer()
+        Filters a folder's files down to those which are new or have changed since they were last replicated
+
+    record()
+        Records the files which have just been replicated
+
+    remove_orphans()
+        Removes the replicated copies of the files which are no longer in the site
+
+    """
+
+    def __init__(self, user, root_folder_id: int, target: str, incremental=False):
+        self.user = user
+        self.root_folder_id = root_folder_id
+        self.target = target
+        self.incremental = incremental
+
+    def _entries(self):
+        return SyncIndexEntry.objects.filter(user=self.user, target=self.target)
+
+    def _unchanged_in_vdr(self, file_id: int, etag: str) -> bool:
+        # a conditional download, which the VDR answers with a 304 and no body if the file still has the ETag it was
+        # replicated with. If the VDR ignores If-None-Match, the body is left unread and the ETags compared instead
+        try:
+            response = download_single_file(self.user, file_id, if_none_match=etag)
+            if isinstance(response, VDRServiceError):
+                return False
+            response.close()
+            return response.status_code == 304 or response.headers.get("ETag") == etag
+        finally:
+            # a cache miss on the access token queries the DB from this thread; don't leak the connection
+            connections.close_all()
+
+    def files_to_transfer(
+        self, destinations: Iterable[SyncDestination]
+    ) -> List[VDRFile]:
+
+        """
+        A file is unchanged when its size and its destinations are the same as when it was last replicated - a rename
+        or move changes its destinations - for the local server the file is still there, and the VDR still has it at
+        the ETag it was replicated with. The size and destinations are checked first, and the ETags of the files
+        which pass are checked with conditional downloads, on VDR_TRANSFER_WORKERS_PER_FOLDER threads. A file
+        recorded without an ETag is judged on its size and destinations alone.
+
+        :param destinations: where each of a folder's files would be replicated to
+        :return: the files which need to be transferred
+        """
+        destinations = list(destinations)
+        if not self.incremental:
+            return [destination.file for destination in destinations]
+
+        entries = {
+            entry.file_id: entry
+            for entry in self._entries().filter(
+                file_id__in=[destination.file.id for destination in destinations]
+            )
+        }
+        changed = set()
+        to_check = []
+        for destination in destinations:
+            entry = entries.get(destination.file.id)
+            if (
+                entry is None
+                or entry.size != destination.file.size
+                or entry.local_path != destination.local_path
+                or entry.s3_key != destination.s3_key
+                or (entry.local_path and not os.path.exists(entry.local_path))
+            ):
+                changed.add(destination.file.id)
+            elif entry.etag:
+                to_check.append(entry)
+
+        if to_check:
+            with ThreadPoolExecutor(
+                max_workers=settings.VDR_TRANSFER_WORKERS_PER_FOLDER
+            ) as executor:
+                unchanged = executor.map(
+                    lambda entry: self._unchanged_in_vdr(entry.file_id, entry.etag),
+                    to_check,
+                )
+                changed.update(
+                    entry.file_id
+                    for entry, is_unchanged in zip(to_check, unchanged)
+                    if not is_unchanged
+                )
+
+        return [
+            destination.file
+            for destination in destinations
+            if destination.file.id in changed
+        ]
+
+    def record(self, vdr_path: str, destinations: Iterable[SyncDestination]) -> None:
+
+        """
+        :param vdr_path: the path on the VDR system of the folder the files are in
+        :param destinations: where each of the files was replicated to
+        :return: None
+        """
+        destinations = list(destinations)
+        if not destinations:
+            return
+
+        with transaction.atomic():
+            self._entries().filter(
+                file_id__in=[destination.file.id for destination in destinations]
+            ).delete()
+            SyncIndexEntry.objects.bulk_create(
+                SyncIndexEntry(
+                    user=self.user,
+                    root_folder_id=self.root_folder_id,
+                    target=self.target,
+                    file_id=destination.file.id,
+                    name=destination.file.name + "." + destination.file.type,
+                    size=destination.file.size,
+                    vdr_path=vdr_path,
+                    etag=destination.etag,
+                    local_path=destination.local_path,
+                    s3_key=destination.s3_key,
+                )
+                for destination in destinations
+            )
+
+    def remove_orphans(self, file_ids: Iterable[int]) -> List[SyncIndexEntry]:
+
+        """
+        Deletes the local files and S3 objects of every file recorded for this site which is not in file_ids, and
+        drops them from the index.
+
+        :param file_ids: the unique identifiers of every file currently in the site, ideally as a values queryset
+            so that the comparison is made by the DB
+        :return: the SyncIndexEntries which were removed
+        """
+        orphans = list(
+            self._entries()
+            .filter(root_folder_id=self.root_folder_id)
+            .exclude(file_id__in=file_ids)
+        )
+
+        s3_keys = [{"Key": entry.s3_key} for entry in orphans if entry.s3_key]
+        # delete_objects takes at most 1000 keys a call
+        for i in range(0, len(s3_keys), 1000):
+            get_s3_client().delete_objects(
+                Bucket=get_setting("aws_bucket_name"),
+                Delete={"Objects": s3_keys[i : i + 1000], "Quiet": True},
+            )
+        for entry in orphans:
+            if entry.local_path and os.path.exists(entry.local_path):
+                os.remove(entry.local_path)
+
+        SyncIndexEntry.objects.filter(id__in=[entry.id for entry in orphans]).delete()
+        return orphans
@@ -0,0 +1,126 @@
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+from typing import Callable, Iterable, Iterator
+
+from django.conf import settings
+from django.db import connections
+
+from core.dataclasses.file_and_folder_dataclasses import VDRFile
+from core.dataclasses.utility_dataclasses import VDRServiceError, VDRTransferResult
+
+_process_transfer_slots = None
+_process_transfer_slots_pid = None
+_process_transfer_slots_lock = threading.Lock()
+
+
+def _get_process_transfer_slots() -> threading.BoundedSemaphore:
+
+    """
+    Returns the semaphore which caps the number of file transfers running at once in this process.
+
+    Every TransferEngine in the process shares it, so a worker handling several folders at the same time still
+    never has more than VDR_TRANSFER_MAX_WORKERS_PER_PROCESS transfers in flight. Like the VDR Session, it is
+    rebuilt after a fork.
+
+    :return: the process wide BoundedSemaphore
+    """
+    global _process_transfer_slots, _process_transfer_slots_pid
+
+    pid = os.getpid()
+    if _process_transfer_slots is None or _process_transfer_slots_pid != pid:
+        with _process_transfer_slots_lock:
+            if _process_transfer_slots is None or _process_transfer_slots_pid != pid:
+                _process_transfer_slots = threading.BoundedSemaphore(
+                    settings.VDR_TRANSFER_MAX_WORKERS_PER_PROCESS
+                )
+                _process_transfer_slots_pid = pid
+
+    return _process_transfer_slots
+
+
+class TransferEngine:
+    """
+    A class used to run the transfer of a folder's files concurrently, on a bounded thread pool
+
+    ...
+
+    Attributes
+    ----------
+    max_workers : int
+        the number of threads used for a single folder, defaults to VDR_TRANSFER_WORKERS_PER_FOLDER
+
+    Methods
+    -------
+    run(files, transfer)
+        calls transfer(file) for every file, yielding a VDRTransferResult for each one as it completes.
+        The transfer function returns the destination it wrote to, or a VDRServiceError if the VDR refused the
+        download; an exception raised by the transfer is caught and recorded against that file, so one bad file
+        does not stop the rest of the folder. files may be a generator, e.g. of a listing still being read: only
+        twice max_workers files are taken from it ahead of the transfers which have finished, so the pool is never
+        short of work but a long listing isn't held as a future per file.
+
+    """
+
+    def __init__(self, max_workers: int = None):
+        if max_workers is None:
+            max_workers = settings.VDR_TRANSFER_WORKERS_PER_FOLDER
+        self.max_workers = max_workers
+
+    def _run_single_transfer(
+        self, file: VDRFile, transfer: Callable
+    ) -> VDRTransferResult:
+        start = time.monotonic()
+        try:
+            with _get_process_transfer_slots():
+                outcome = transfer(file)
+        except Exception as e:
+            return VDRTransferResult(
+                file_id=file.id,
+                file_name=file.name,
+                success=False,
+                error_message=str(e),
+                duration=time.monotonic() - start,
+            )
+        finally:
+            # a cache miss on the access token queries the DB from this thread; don't leak the connection
+            connections.close_all()
+
+        if isinstance(outcome, VDRServiceError):
+            return VDRTransferResult(
+                file_id=file.id,
+                file_name=file.name,
+                success=False,
+                error_message=f"{outcome.status_code}: {outcome.message}",
+                duration=time.monotonic() - start,
+            )
+
+        return VDRTransferResult(
+            file_id=file.id,
+            file_name=file.name,
+            destination=outcome,
+            success=True,
+            size=file.size,
+            duration=time.monotonic() - start,
+        )
+
+    def run(
+        self, files: Iterable[VDRFile], transfer: Callable
+    ) -> Iterator[VDRTransferResult]:
+        files = iter(files)
+        window = self.max_workers * 2
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            in_flight = set()
+            while True:
+                for file in islice(files, window - len(in_flight)):
+                    in_flight.add(
+                        executor.submit(self._run_single_transfer, file, transfer)
+                    )
+                if not in_flight:
+                    break
+
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
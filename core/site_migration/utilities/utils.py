@@ -1,12 +1,18 @@
 import os
+from functools import partial
+from itertools import islice
 from typing import List
 
-import boto3
 from django.conf import settings
 from django.contrib.auth import get_user_model
 
+from core.dataclasses.file_and_folder_dataclasses import (
+    CompactFileList,
+    VDRFolder,
+    VDRSubFolderList,
+)
+from core.dataclasses.utility_dataclasses import VDRServiceError
 from core.http_handlers.file_and_folder_http_handlers import (
-    download_single_file,
     get_files_in_single_folder,
     get_single_folder_details,
     get_sub_folders_of_single_folder,
@@ -16,6 +22,25 @@ from core.http_handlers.file_and_folder_http_handlers import (
     shallow_delete_single_folder,
 )
 from core.http_handlers.utils import get_setting
+from core.models import ManifestFolder
+from core.site_migration.utilities.download import (
+    RangeNotSupported,
+    download_file_to_path,
+    finish_partial_download,
+    open_partial_download,
+    open_resumable_download,
+    partial_download_offset,
+)
+from core.site_migration.utilities.s3 import (
+    ResumableUpload,
+    abort_resumable_upload,
+    find_resumable_upload,
+    get_s3_client,
+    get_s3_transfer_config,
+    resumable_upload_fileobj,
+)
+from core.site_migration.utilities.sync_index import SyncDestination
+from core.site_migration.utilities.transfer import TransferEngine
 from reporting.utils import ReportWriter
 
 User = get_user_model()
@@ -30,7 +55,8 @@ class FolderContents:
     Attributes
     ----------
     user : User object
-        a user object representing the authenticated user interacting with the VDR Service
+        a user object representing the authenticated user interacting with the VDR Service. Can be initialized
+        from either the user's id or an already resolved User, the latter saving a DB query per folder.
     folder_id : int
         the unique identifier of the folder in the VDR System
     local_path : str
@@ -41,10 +67,16 @@ class FolderContents:
         the details specific to this folder, stored in the VDR System
     subfolders: VDRSubfolderArray dataclass
         the subfolders of the folder
-    files: VDRFileList dataclass
+    files: VDRFileList dataclass, or a CompactFileList when they are read from a manifest
     report_id: used to initialize the report
     report: initialized from the report_id at the time of folder detail retrieval,  the Report writer object can be referenced to create report
         line entries relevant to the steps taken
+    sync_index: SyncIndex object, optional
+        when given, the files transferred are recorded in it and, for an incremental replication, only the new or
+        changed files are transferred
+    checkpoint: Checkpoint object, optional
+        when given, each file is recorded in it as soon as it has been transferred, and the files it already holds
+        are skipped
 
     Methods
     -------
@@ -67,6 +99,10 @@ class FolderContents:
         calls all the relevant 'praviate' methods in order to prepare the folder contents object for replication or
         deletion operations.
 
+    prepare_folder_from_manifest()
+        prepares the folder contents object from a ManifestFolder of an already crawled SiteManifest, rather than
+        from the VDR.
+
     has_files()
         Checks whether or not there are files in the Objects files attribute
 
@@ -77,11 +113,24 @@ class FolderContents:
 
     """
 
+    # the action recorded against the report lines of the folder's file events, see ReportLine.ACTION_CHOICES
+    report_action = ""
+
     def __init__(
-        self, user, folder_id, local_path=None, vdr_path=None, report_id: int = None
+        self,
+        user,
+        folder_id,
+        local_path=None,
+        vdr_path=None,
+        report_id: int = None,
+        sync_index=None,
+        checkpoint=None,
     ):
 
-        self.user = User.objects.get(id=user)
+        if isinstance(user, User):
+            self.user = user
+        else:
+            self.user = User.objects.get(id=user)
         self.folder_id = folder_id
         self.local_path = local_path
         self.vdr_path = vdr_path
@@ -90,6 +139,13 @@ class FolderContents:
         self.files = None
         self.report_id = report_id
         self.report = None
+        self.sync_index = sync_index
+        self.checkpoint = checkpoint
+        self.etags = {}
+        self._transfer_files = {}
+        self.completed_transfers = []
+        self.failed_transfers = []
+        self.given_up_transfers = []
 
     def _get_folder_details(self):
         self.folder_details = get_single_folder_details(self.user, self.folder_id)
@@ -126,6 +182,17 @@ class FolderContents:
     def _get_files(self):
         self.files = get_files_in_single_folder(self.user, self.folder_id)
 
+    def _report_listing_error(self, listing, error):
+        self.report.write_line(
+            f"Failed to list the {listing} of {self.folder_details.name}: {error.status_code} {error.message}"
+        )
+
+    def _report_listing_errors(self):
+        # a listing the VDR still refused after backing off is left out, rather than iterated over
+        for listing, error in (("subfolders", self.subfolders), ("files", self.files)):
+            if isinstance(error, VDRServiceError):
+                self._report_listing_error(listing, error)
+
     def prepare_folder(self):
         self._get_folder_details()
         self._initialize_report_writer()
@@ -133,10 +200,135 @@ class FolderContents:
         self._update_vdr_path()
         self._get_subfolders()
         self._get_files()
+        self._report_listing_errors()
+
+    def prepare_folder_from_manifest(self, manifest_folder):
+        # the manifest was validated when it was crawled, so its rows are turned straight into dataclasses
+        self.folder_details = VDRFolder.trusted(
+            id=manifest_folder.folder_id,
+            name=manifest_folder.name,
+            parent_folder_id=manifest_folder.parent_folder_id,
+            location=manifest_folder.location,
+        )
+        self._initialize_report_writer()
+        self.vdr_path = manifest_folder.vdr_path
+        self.local_path = os.path.join(
+            settings.MEDIA_ROOT, *manifest_folder.vdr_path.split("/")
+        )
+
+        subfolders = ManifestFolder.objects.filter(
+            manifest_id=manifest_folder.manifest_id,
+            parent_folder_id=manifest_folder.folder_id,
+        )
+        self.subfolders = VDRSubFolderList.construct(
+            subfolder_list=[
+                VDRFolder.trusted(
+                    id=folder.folder_id,
+                    name=folder.name,
+                    parent_folder_id=folder.parent_folder_id,
+                    location=folder.location,
+                )
+                for folder in subfolders
+            ]
+        )
+        self.files = CompactFileList()
+        for file in manifest_folder.files.all():
+            self.files.append(file.file_id, file.name, file.type, file.size)
+
+    def _record_etag(self, file, response):
+        self.etags[file.id] = response.headers.get("ETag", "")
+
+    def _sync_destination(self, file) -> SyncDestination:
+        return SyncDestination(file=file, etag=self.etags.get(file.id, ""))
+
+    def _files_to_transfer(self):
+        # the files are checked against the checkpoint and the sync index a page at a time, so the transfers of a
+        # large folder start before the whole of it has been checked
+        skipped = 0
+        files = iter(self.files.file_list)
+        while True:
+            batch = list(islice(files, settings.VDR_LISTING_PAGE_SIZE))
+            if not batch:
+                break
+
+            to_transfer = batch
+            if self.checkpoint is not None:
+                completed = self.checkpoint.completed_file_ids(
+                    file.id for file in to_transfer
+                )
+                to_transfer = [file for file in to_transfer if file.id not in completed]
+            if self.sync_index is not None:
+                to_transfer = self.sync_index.files_to_transfer(
+                    self._sync_destination(file) for file in to_transfer
+                )
+
+            skipped += len(batch) - len(to_transfer)
+            for file in to_transfer:
+                self._transfer_files[file.id] = file
+                yield file
+
+        if skipped:
+            self.report.write_line(
+                f"Skipping {skipped} unchanged or already replicated files in {self.folder_details.name}"
+            )
+
+    def _complete_transfer(self, result):
+        if not result.success:
+            self.failed_transfers.append(result)
+            if self.checkpoint is not None and self.checkpoint.fail_file(
+                result.file_id, result.error_message
+            ):
+                self.given_up_transfers.append(result)
+                self.report.write_line(
+                    f"Giving up on {result.file_name}, which has failed on "
+                    f"{settings.VDR_CHECKPOINT_MAX_FILE_ATTEMPTS} runs of the replication"
+                )
+            return
+
+        self.completed_transfers.append(result)
+        if self.checkpoint is not None:
+            self.checkpoint.complete_file(result.file_id)
+
+    def transferred_bytes(self):
+        return sum(result.size for result in self.completed_transfers)
+
+    def listed_bytes(self):
+        return sum(file.size for file in self.files.file_list)
+
+    def _write_transfer_line(self, line, result):
+        self.report.write_line(
+            line,
+            action=self.report_action,
+            file_id=result.file_id,
+            bytes=result.size,
+            duration=result.duration,
+            status="success" if result.success else "failure",
+        )
+
+    def _write_delete_line(self, line, file, response):
+        self.report.write_line(
+            line,
+            action=self.report_action,
+            file_id=file.id,
+            status="failure" if isinstance(response, VDRServiceError) else "success",
+        )
+
+    def _record_transfers(self, results):
+        if self.sync_index is None:
+            return
+
+        self.sync_index.record(
+            self.vdr_path,
+            (
+                self._sync_destination(self._transfer_files[result.file_id])
+                for result in results
+                if result.success
+            ),
+        )
 
     def has_files(self):
-        if self.files is not None:
-            if len(self.files.file_list) > 0:
+        if self.files is not None and not isinstance(self.files, VDRServiceError):
+            if self.files.file_list:
                 return True
             else:
                 return False
@@ -144,7 +336,9 @@ class FolderContents:
             return False
 
     def has_subfolders(self):
-        if self.subfolders is not None:
+        if self.subfolders is not None and not isinstance(
+            self.subfolders, VDRServiceError
+        ):
             if len(self.subfolders.subfolder_list) > 0:
                 return True
             else:
@@ -163,38 +357,61 @@ class FolderContentsForLocal(FolderContents):
     Methods
     -------
     iterate_over_and_write_files_to_local()
-        For each file contained within the folder, download and write to the local server.
+        For each file contained within the folder, download and write to the local server. The files are
+        transferred concurrently by a TransferEngine, and a VDRTransferResult is returned for each one. A download
+        which drops part of the way through is resumed from the last byte written.
 
     write_folder_to_local()
         Creating the corresponding directory to this folder on the local server
 
     """
 
+    report_action = "local"
+
     def _get_local_file_path(self, file):
         file_name = file.name
         file_type = file.type
         file_and_extension = file_name + "." + file_type
         return os.path.join(self.local_path, file_and_extension)
 
-    def _write_file_to_local(self, file, path):
+    def _sync_destination(self, file) -> SyncDestination:
+        return (
+            super()
+            ._sync_destination(file)
+            ._replace(local_path=self._get_local_file_path(file))
+        )
 
-        with open(path, "wb") as f:
-            for chunk in file.iter_content(8192):
-                f.write(chunk)
+    def _transfer_file_to_local(self, file):
+        return download_file_to_path(
+            self.user,
+            file,
+            self._get_local_file_path(file),
+            on_response=partial(self._record_etag, file),
+        )
 
     def iterate_over_and_write_files_to_local(self):
-        for file in self.files.file_list:
-            local_new_file_path = self._get_local_file_path(file)
-            file_id = file.id
-
-            downloaded_file = download_single_file(self.user, file_id)
-            self._write_file_to_local(downloaded_file, local_new_file_path)
-            self.report.write_line(
-                f"Currently creating {local_new_file_path} on the local server"
-            )
+        results = []
+        for result in TransferEngine().run(
+            self._files_to_transfer(), self._transfer_file_to_local
+        ):
+            self._complete_transfer(result)
+            if result.success:
+                self._write_transfer_line(
+                    f"Currently creating {result.destination} on the local server",
+                    result,
+                )
+            else:
+                self._write_transfer_line(
+                    f"Failed to create {result.file_name} on the local server: {result.error_message}",
+                    result,
+                )
+            results.append(result)
+        self._record_transfers(results)
+        return results
 
     def write_folder_to_local(self):
-        os.mkdir(self.local_path)
+        # folders may be replicated in parallel, so a parent's directory might not have been made yet
+        os.makedirs(self.local_path, exist_ok=True)
         self.report.write_line(
             f"Currently replicating {self.folder_details.name} on the local server"
         )
@@ -210,24 +427,26 @@ class FolderContentsForRemote(FolderContents):
     Attributes
     ----------
     s3_client : Client from the boto3 library
-        a client object to interact with AWS S3.
+        a client object to interact with AWS S3, shared by every folder in the process.
+    s3_transfer_config : TransferConfig from the boto3 library
+        the multipart threshold, chunk size and concurrency used for uploads, from RemoteSystemSettings.
 
     Methods
     -------
     iterate_over_and_write_files_to_remote()
-        For each file contained within the folder, stream the file to the AWS s3 Bucket.
+        For each file contained within the folder, stream the file to the AWS s3 Bucket. The files are
+        transferred concurrently by a TransferEngine, and a VDRTransferResult is returned for each one.
 
     write_empty_folder_to_remote()
         Creating the corresponding empty folder object in the AWS s3 Bucket.
 
     """
 
+    report_action = "remote"
+
     def __init__(self, **kwargs):
-        self.s3_client = boto3.client(
-            "s3",
-            aws_access_key_id=get_setting("aws_access_key_id"),
-            aws_secret_access_key=get_setting("aws_secret_access_key"),
-        )
+        self.s3_client = get_s3_client()
+        self.s3_transfer_config = get_s3_transfer_config()
         self.aws_bucket_name = get_setting("aws_bucket_name")
         super().__init__(**kwargs)
 
@@ -237,20 +456,118 @@ class FolderContentsForRemote(FolderContents):
         file_and_extension = file_name + "." + file_type
         return os.path.join(self.vdr_path + "/" + file_and_extension)
 
-    def iterate_over_and_write_files_to_remote(self):
+    def _sync_destination(self, file) -> SyncDestination:
+        return (
+            super()
+            ._sync_destination(file)
+            ._replace(s3_key=self._get_remote_file_path(file))
+        )
 
-        for file in self.files.file_list:
-            print(self.aws_bucket_name)
-            vdr_new_file_path = self._get_remote_file_path(file)
-            file_id = file.id
+    def _is_resumable_upload(self, file):
+        # only a checkpointed upload can be resumed, and then only one big enough to be uploaded in parts
+        return (
+            self.checkpoint is not None
+            and file.size >= self.s3_transfer_config.multipart_threshold
+        )
 
-            downloaded_file = download_single_file(self.user, file_id)
+    def _find_resumable_upload(self, file, key):
+        return find_resumable_upload(
+            self.s3_client,
+            self.aws_bucket_name,
+            key,
+            self.s3_transfer_config.multipart_chunksize,
+            self.checkpoint,
+            file.id,
+        )
+
+    def _abort_resumable_upload(self, file, key, resume):
+        abort_resumable_upload(
+            self.s3_client,
+            self.aws_bucket_name,
+            key,
+            self.checkpoint,
+            file.id,
+            resume.upload_id,
+        )
+        return ResumableUpload(None, [])
+
+    def _upload_to_remote(
+        self, fileobj, file, key, fileobj_offset=0, resume=None, etag=None
+    ):
+        if self._is_resumable_upload(file):
+            resumable_upload_fileobj(
+                self.s3_client,
+                fileobj,
+                self.aws_bucket_name,
+                key,
+                self.s3_transfer_config.multipart_chunksize,
+                self.checkpoint,
+                file.id,
+                fileobj_offset=fileobj_offset,
+                max_concurrency=self.s3_transfer_config.max_concurrency,
+                resume=resume,
+                etag=etag,
+            )
+        else:
             self.s3_client.upload_fileobj(
-                downloaded_file.raw, self.aws_bucket_name, vdr_new_file_path
+                fileobj, self.aws_bucket_name, key, Config=self.s3_transfer_config
             )
-            self.report.write_line(
-                f"Currently replicating {vdr_new_file_path} to the remote storage location"
+
+    def _transfer_file_to_remote(self, file):
+        vdr_new_file_path = self._get_remote_file_path(file)
+
+        # a resumed upload only needs the part of the file S3 doesn't already have, as long as the file hasn't
+        # changed since the parts it has were read
+        offset = 0
+        resume = None
+        if self._is_resumable_upload(file):
+            resume = self._find_resumable_upload(file, vdr_new_file_path)
+            offset = resume.offset(self.s3_transfer_config.multipart_chunksize)
+
+        try:
+            downloaded_file = open_resumable_download(
+                self.user, file.id, offset, if_range=resume.etag if resume else None
+            )
+        except RangeNotSupported:
+            resume = self._abort_resumable_upload(file, vdr_new_file_path, resume)
+            offset = 0
+            downloaded_file = open_resumable_download(self.user, file.id)
+        if isinstance(downloaded_file, VDRServiceError):
+            return downloaded_file
+
+        self._record_etag(file, downloaded_file.response)
+        try:
+            self._upload_to_remote(
+                downloaded_file,
+                file,
+                vdr_new_file_path,
+                fileobj_offset=offset,
+                resume=resume,
+                etag=downloaded_file.etag,
             )
+        finally:
+            downloaded_file.close()
+        return vdr_new_file_path
+
+    def iterate_over_and_write_files_to_remote(self):
+        results = []
+        for result in TransferEngine().run(
+            self._files_to_transfer(), self._transfer_file_to_remote
+        ):
+            self._complete_transfer(result)
+            if result.success:
+                self._write_transfer_line(
+                    f"Currently replicating {result.destination} to the remote storage location",
+                    result,
+                )
+            else:
+                self._write_transfer_line(
+                    f"Failed to replicate {result.file_name} to the remote storage location: {result.error_message}",
+                    result,
+                )
+            results.append(result)
+        self._record_transfers(results)
+        return results
 
     def write_empty_folder_to_remote(self):
         self.s3_client.put_object(
@@ -261,6 +578,120 @@ class FolderContentsForRemote(FolderContents):
         )
 
 
+class _TeeReader:
+    """
+    A read-only, non-seekable file object over a download, which copies every chunk it hands out into a local file.
+
+    boto3 reads a non-seekable stream sequentially and uploads the parts on its own threads, so the local write of
+    one chunk overlaps with the upload of the previous parts.
+    """
+
+    def __init__(self, source, local_file):
+        self.source = source
+        self.local_file = local_file
+
+    def read(self, size=-1):
+        chunk = self.source.read(size)
+        if chunk:
+            self.local_file.write(chunk)
+        return chunk
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return False
+
+
+class FolderContentsForLocalAndRemote(FolderContentsForLocal, FolderContentsForRemote):
+    """
+    A class used to represent the Contents of a folder in the VDR System, where we wish to replicate
+    both on the local Server and in the remote object storage location, in a single pass.
+
+    Child of FolderContentsForLocal and FolderContentsForRemote objects
+
+    Methods
+    -------
+    iterate_over_and_write_files_to_local_and_remote()
+        For each file contained within the folder, download it once and tee the stream into both the local
+        file and the upload to the AWS s3 Bucket. A download which drops part of the way through is resumed from
+        the last byte read. The local file is written to a .part beside it and renamed once complete, and a later
+        run carries on from the bytes both destinations already hold.
+
+    """
+
+    report_action = "local_and_remote"
+
+    def _transfer_file_to_local_and_remote(self, file):
+        local_new_file_path = self._get_local_file_path(file)
+        vdr_new_file_path = self._get_remote_file_path(file)
+
+        # a single download feeds both destinations, so it can only be carried on from the byte both of them had
+        # reached, and only if they were both written from the same version of the file
+        offset = 0
+        resume = None
+        if self._is_resumable_upload(file):
+            resume = self._find_resumable_upload(file, vdr_new_file_path)
+            offset = min(
+                resume.offset(self.s3_transfer_config.multipart_chunksize),
+                partial_download_offset(local_new_file_path, resume.etag),
+            )
+
+        # a dropped connection is picked up again from the byte both destinations had reached
+        try:
+            downloaded_file = open_resumable_download(
+                self.user, file.id, offset, if_range=resume.etag if resume else None
+            )
+        except RangeNotSupported:
+            resume = self._abort_resumable_upload(file, vdr_new_file_path, resume)
+            offset = 0
+            downloaded_file = open_resumable_download(self.user, file.id)
+        if isinstance(downloaded_file, VDRServiceError):
+            return downloaded_file
+
+        self._record_etag(file, downloaded_file.response)
+        # written to a .part and only renamed once it is complete, so a worker dying never leaves a partial file
+        # where the sync index would take it for a replicated copy
+        try:
+            with open_partial_download(
+                local_new_file_path, offset, downloaded_file.etag
+            ) as f:
+                self._upload_to_remote(
+                    _TeeReader(downloaded_file, f),
+                    file,
+                    vdr_new_file_path,
+                    fileobj_offset=offset,
+                    resume=resume,
+                    etag=downloaded_file.etag,
+                )
+        finally:
+            downloaded_file.close()
+        finish_partial_download(local_new_file_path)
+        return vdr_new_file_path
+
+    def iterate_over_and_write_files_to_local_and_remote(self):
+        results = []
+        for result in TransferEngine().run(
+            self._files_to_transfer(), self._transfer_file_to_local_and_remote
+        ):
+            self._complete_transfer(result)
+            if result.success:
+                self._write_transfer_line(
+                    f"Currently replicating {result.destination} on the local server and to the remote storage "
+                    f"location",
+                    result,
+                )
+            else:
+                self._write_transfer_line(
+                    f"Failed to replicate {result.file_name} on the local server and to the remote storage location: "
+                    f"{result.error_message}",
+                    result,
+                )
+            results.append(result)
+        self._record_transfers(results)
+        return results
+
+
 class FolderContentsForSoftDelete(FolderContents):
     """
     A class used to represent the Contents of a folder in the VDR System, where we wish to move the folder
@@ -279,10 +710,17 @@ class FolderContentsForSoftDelete(FolderContents):
 
     """
 
+    report_action = "soft_delete"
+
+    def _write_shallow_delete_line(self, line, file, response):
+        self._write_delete_line(line, file, response)
+
     def iterate_over_and_shallow_delete_files(self):
         for file in self.files.file_list:
-            shallow_delete_single_file(self.user, file.id)
-            self.report.write_line(f"Currently moving {file.name} to recycle bin")
+            response = shallow_delete_single_file(self.user, file.id)
+            self._write_shallow_delete_line(
+                f"Currently moving {file.name} to recycle bin", file, response
+            )
 
     def shallow_delete_this_folder(self):
         shallow_delete_single_folder(self.user, self.folder_id)
@@ -314,10 +752,20 @@ class FolderContentsForHardDelete(FolderContentsForSoftDelete):
 
     """
 
+    report_action = "hard_delete"
+
+    def _write_shallow_delete_line(self, line, file, response):
+        # the file is only counted once, by the line of its permanent delete
+        if isinstance(response, VDRServiceError):
+            line = f"{line} failed: {response.status_code} {response.message}"
+        self.report.write_line(line)
+
     def iterate_over_and_permanently_delete_files(self):
         for file in self.files.file_list:
-            permanently_delete_single_file(self.user, file.id)
-            self.report.write_line(f"Currently permanently deleting {file.name}")
+            response = permanently_delete_single_file(self.user, file.id)
+            self._write_delete_line(
+                f"Currently permanently deleting {file.name}", file, response
+            )
 
     def permanently_delete_this_folder(self):
         permanently_delete_single_folder(self.user, self.folder_id)
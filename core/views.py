@@ -1,20 +1,27 @@
+import time
+
 from celery import group
 from celery.result import GroupResult
+from django.conf import settings
 from django.http import HttpResponse, JsonResponse
 from django.shortcuts import redirect
 from django.template.response import TemplateResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.generic import TemplateView
 
+from core.dataclasses.site_dataclasses import VDRSiteList
 from core.forms import SettingsForm
-from core.http_handlers.site_http_handlers import get_all_sites, get_single_site
+from core.http_handlers.site_cache import (
+    get_cached_site_detail,
+    get_cached_site_list,
+    prefetch_site_details,
+)
 from core.models import RemoteSystemSettings
 from core.site_migration.site_migrations import (
-    recursive_remote_storage_site_builder_task,
-    recursive_site_builder_task,
-    recursive_site_permanent_delete_task,
-    recursive_site_shallow_delete_task,
+    manifest_site_delete_task,
+    manifest_site_replication_task,
 )
+from core.site_migration.utilities.progress import JobProgress
 from vdr_storage_integration.celery import app
 
 
@@ -61,6 +68,9 @@ def sites_view(request):
     """
     Displays a list of all VDR Sites the logged in user has access to
 
+    The pages are cached per user, and the next page is fetched in the background, see get_cached_site_list(). The
+    details of the sites on the page are fetched in the background too, see prefetch_site_details().
+
     ** Context **
     an instance of VDRSiteList
 
@@ -68,9 +78,15 @@ def sites_view(request):
     site_list.html
 
     """
-    all_sites = get_all_sites(request.user, request.GET)
+    all_sites = get_cached_site_list(request.user, request.GET)
+    if isinstance(all_sites, VDRSiteList):
+        prefetch_site_details(request.user, all_sites)
 
-    return TemplateResponse(request, "site_list.html", {"context_data": all_sites})
+    return TemplateResponse(
+        request,
+        "site_list.html",
+        {"context_data": all_sites, "page_size": settings.VDR_SITE_LIST_PAGE_SIZE},
+    )
 
 
 def site_detail_view(request, id: int):
@@ -82,26 +98,37 @@ def site_detail_view(request, id: int):
     The unique identifier of the site in the external System
 
     ** Context **
-    an instance of VDRSiteDetail
+    an instance of VDRSiteDetail, and the seconds the progress of a job can be long polled for
 
     ** Template **
     site_detail.html
 
     """
 
-    site = get_single_site(request.user, id)
+    site = get_cached_site_detail(request.user, id)
 
-    return TemplateResponse(request, "site_detail.html", {"context_data": site})
+    return TemplateResponse(
+        request,
+        "site_detail.html",
+        {
+            "context_data": site,
+            "long_poll_timeout": settings.VDR_PROGRESS_LONG_POLL_TIMEOUT,
+        },
+    )
 
 
 @csrf_exempt
 def replicate_site(request):
 
     """
-    Dispatches the celery jobs (as a group task) to save the VDR Site to the local server and replicate it in the AWS S3 Bucket
+    Dispatches the celery job (as a group task) to save the VDR Site to the local server and replicate it in the AWS S3 Bucket.
+    The site's folder tree is crawled once into a SiteManifest, then replicated from it in batches of folders. Each
+    file is downloaded from the VDR once and written to both destinations.
 
     ** Parameters **
     POST['rootFolderId'] : The folder id of the root folder of the VDR Site.
+    POST['incremental'] : Optional, "true" to only transfer the files which are new or changed since the last run.
+    POST['removeOrphans'] : Optional, "true" to remove the copies of files which are no longer in the VDR Site.
 
     ** Return Value **
     {"group_task_id": unique identifier of the celery group task}
@@ -110,9 +137,16 @@ def replicate_site(request):
     if request.POST:
         user_id = request.user.id
         root_folder_id = request.POST.get("rootFolderId")
+        incremental = request.POST.get("incremental") == "true"
+        remove_orphans = request.POST.get("removeOrphans") == "true"
         group_task = group(
-            recursive_site_builder_task.s(user_id, root_folder_id),
-            recursive_remote_storage_site_builder_task.s(user_id, root_folder_id),
+            manifest_site_replication_task.s(
+                user_id,
+                root_folder_id,
+                "local_and_remote",
+                incremental,
+                remove_orphans,
+            ),
         )
         group_result = group_task()
         group_result.save()
@@ -136,7 +170,7 @@ def soft_delete_site(request):
         user_id = request.user.id
         root_folder_id = request.POST.get("rootFolderId")
         group_task = group(
-            recursive_site_shallow_delete_task.s(user_id, root_folder_id),
+            manifest_site_delete_task.s(user_id, root_folder_id, False),
         )
         group_result = group_task()
         group_result.save()
@@ -161,7 +195,7 @@ def hard_delete_site(request):
         user_id = request.user.id
         root_folder_id = request.POST.get("rootFolderId")
         group_task = group(
-            recursive_site_permanent_delete_task.s(user_id, root_folder_id),
+            manifest_site_delete_task.s(user_id, root_folder_id, True),
         )
         group_result = group_task()
         group_result.save()
@@ -188,3 +222,64 @@ def get_status(request, group_task_id):
     all_successful = str((group_task_result.successful()))
     result = {"group_task_id": group_task_id, "group_task_success": all_successful}
     return JsonResponse(result, status=200)
+
+
+def get_progress(request, group_task_id):
+    """
+    Reads the progress of a replication or deletion job from its JobProgress counters, without touching the celery
+    result backend or the DB, so it is cheap enough to poll.
+
+    The version of the counters is sent as the ETag. A request with a matching If-None-Match gets a 304, unless it
+    also asks to wait: then the response is held until the counters change or the wait runs out, whichever is first.
+
+    ** Path Parameters **
+    The unique identifier of the celery group task
+
+    ** Query Parameters **
+    GET['wait'] : Optional, the number of seconds to wait for a change, capped at VDR_PROGRESS_LONG_POLL_TIMEOUT.
+    The wait holds a web worker, so the cap is kept to a few seconds and a client should simply poll again.
+
+    ** Return Value **
+    {
+        "group_task_id": unique identifier of the celery group task,
+        "state": crawling, running or completed,
+        "folders_discovered", "folders_done", "files_total", "files_done", "bytes_total", "bytes_transferred",
+        "errors": the job's counters
+    }
+
+    """
+
+    progress = JobProgress(group_task_id)
+    current = progress.get()
+    if not current:
+        return JsonResponse({"group_task_id": group_task_id}, status=404)
+
+    if_none_match = request.headers.get("If-None-Match", "").strip('"')
+    try:
+        wait = min(
+            float(request.GET.get("wait", 0)), settings.VDR_PROGRESS_LONG_POLL_TIMEOUT
+        )
+    except ValueError:
+        wait = 0
+    deadline = time.monotonic() + wait
+    while str(current["version"]) == if_none_match and time.monotonic() < deadline:
+        time.sleep(settings.VDR_PROGRESS_POLL_INTERVAL)
+        current = progress.get() or current
+
+    etag = f'"{current["version"]}"'
+    if str(current["version"]) == if_none_match:
+        response = HttpResponse(status=304)
+        response["ETag"] = etag
+        return response
+
+    if (
+        current["state"] == "running"
+        and current["folders_done"] >= current["folders_discovered"]
+    ):
+        current["state"] = "completed"
+    result = {"group_task_id": group_task_id, **current}
+    del result["version"]
+    response = JsonResponse(result, status=200)
+    response["ETag"] = etag
+    response["Cache-Control"] = "no-cache"
+    return response
@@ -1,4 +1,3 @@
-import requests
 from allauth.socialaccount.providers.oauth2.views import (
     OAuth2Adapter,
     OAuth2CallbackView,
@@ -6,6 +5,7 @@ from allauth.socialaccount.providers.oauth2.views import (
 )
 from django.conf import settings
 
+from core.http_handlers.session import get_vdr_session
 from core.http_handlers.utils import get_setting
 from core.models import RemoteSystemSettings
 
@@ -28,7 +28,7 @@ class CustomAdapter(OAuth2Adapter):
             "Accept": "application/json",
         }
         useremail = kwargs["response"]["useremail"]
-        resp = requests.get(
+        resp = get_vdr_session().get(
             self.profile_url + f"{useremail}", headers=headers
         )
         extra_data = resp.json()
@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class ReportingConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "reporting"
+
+    def ready(self):
+        from celery.signals import task_postrun
+
+        from reporting.utils import flush_report_writers
+
+        task_postrun.connect(
+            flush_report_writers, weak=False, dispatch_uid="flush_report_writers"
+        )
@@ -0,0 +1,19 @@
+# Generated by Django 3.2 on 2026-10-18 16:14
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("reporting", "0004_remove_reportline_related_celery_task"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="reportline",
+            name="timestamp",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
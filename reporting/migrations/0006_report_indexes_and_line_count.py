@@ -0,0 +1,52 @@
+# Generated by Django 3.2 on 2026-10-18 16:35
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_report_lines(apps, schema_editor):
+    Report = apps.get_model("reporting", "Report")
+    ReportLine = apps.get_model("reporting", "ReportLine")
+    line_counts = (
+        ReportLine.objects.filter(report=OuterRef("pk"))
+        .order_by()
+        .values("report")
+        .annotate(count=Count("id"))
+        .values("count")
+    )
+    Report.objects.update(line_count=Coalesce(Subquery(line_counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("reporting", "0005_reportline_timestamp_default"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="report",
+            name="line_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(count_report_lines, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="report",
+            index=models.Index(
+                fields=["-task_start", "-id"], name="report_task_start_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="reportline",
+            index=models.Index(
+                fields=["report", "id"], name="reportline_report_id_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="reportline",
+            index=models.Index(
+                fields=["report", "timestamp"], name="reportline_report_time_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 3.2 on 2026-10-18 16:37
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("reporting", "0006_report_indexes_and_line_count"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ReportSummary",
+            fields=[
+                (
+                    "report",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="summary",
+                        serialize=False,
+                        to="reporting.report",
+                    ),
+                ),
+                ("files_succeeded", models.PositiveIntegerField(default=0)),
+                ("files_failed", models.PositiveIntegerField(default=0)),
+                ("bytes_transferred", models.BigIntegerField(default=0)),
+                ("transfer_seconds", models.FloatField(default=0)),
+                ("first_event", models.DateTimeField(blank=True, null=True)),
+                ("last_event", models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="reportline",
+            name="action",
+            field=models.CharField(
+                blank=True,
+                choices=[
+                    ("local", "Replicate to the local server"),
+                    ("remote", "Replicate to the remote storage location"),
+                    (
+                        "local_and_remote",
+                        "Replicate to the local server and remote storage location",
+                    ),
+                    ("soft_delete", "Move to the recycle bin"),
+                    ("hard_delete", "Permanently delete"),
+                ],
+                max_length=20,
+            ),
+        ),
+        migrations.AddField(
+            model_name="reportline",
+            name="bytes",
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="reportline",
+            name="duration",
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="reportline",
+            name="file_id",
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="reportline",
+            name="status",
+            field=models.CharField(
+                blank=True,
+                choices=[("success", "Success"), ("failure", "Failure")],
+                max_length=10,
+            ),
+        ),
+    ]
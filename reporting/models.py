@@ -1,18 +1,87 @@
 from django.db import models
 from django.urls import reverse
+from django.utils import timezone
 
 
 class Report(models.Model):
     id = models.BigAutoField(primary_key=True)
     root_folder_name = models.CharField(max_length=1000)
     task_start = models.DateTimeField(auto_now_add=True)
+    # kept up to date by ReportWriter.flush(), so the report pages never have to COUNT the lines
+    line_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["-task_start", "-id"], name="report_task_start_idx"),
+        ]
 
     def get_absolute_url(self):
         return reverse("report_detail", kwargs={"id": self.id})
 
 
 class ReportLine(models.Model):
+    ACTION_CHOICES = [
+        ("local", "Replicate to the local server"),
+        ("remote", "Replicate to the remote storage location"),
+        (
+            "local_and_remote",
+            "Replicate to the local server and remote storage location",
+        ),
+        ("soft_delete", "Move to the recycle bin"),
+        ("hard_delete", "Permanently delete"),
+    ]
+    STATUS_CHOICES = [
+        ("success", "Success"),
+        ("failure", "Failure"),
+    ]
+
     id = models.BigAutoField(primary_key=True)
     line = models.CharField(max_length=1500)
     report = models.ForeignKey(Report, on_delete=models.CASCADE)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # not auto_now_add: buffered lines are bulk created later, but keep the time they were written
+    timestamp = models.DateTimeField(default=timezone.now)
+    # the structured event behind a line about a single file, blank for every other line
+    action = models.CharField(max_length=20, choices=ACTION_CHOICES, blank=True)
+    file_id = models.BigIntegerField(null=True, blank=True)
+    bytes = models.BigIntegerField(null=True, blank=True)
+    duration = models.FloatField(null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["report", "id"], name="reportline_report_id_idx"),
+            models.Index(
+                fields=["report", "timestamp"], name="reportline_report_time_idx"
+            ),
+        ]
+
+
+class ReportSummary(models.Model):
+    """
+    The totals of a report's file events, added to by ReportWriter.flush() as the lines are written, so a report
+    can be summarised without reading its lines.
+    """
+
+    report = models.OneToOneField(
+        Report, on_delete=models.CASCADE, primary_key=True, related_name="summary"
+    )
+    files_succeeded = models.PositiveIntegerField(default=0)
+    files_failed = models.PositiveIntegerField(default=0)
+    bytes_transferred = models.BigIntegerField(default=0)
+    # the sum of the transfers' durations, which run concurrently, so it can be more than the wall clock time
+    transfer_seconds = models.FloatField(default=0)
+    first_event = models.DateTimeField(null=True, blank=True)
+    last_event = models.DateTimeField(null=True, blank=True)
+
+    @property
+    def elapsed_seconds(self) -> float:
+        if self.first_event is None or self.last_event is None:
+            return 0
+        return (self.last_event - self.first_event).total_seconds()
+
+    @property
+    def throughput(self) -> float:
+        # bytes a second, over the wall clock time between the first and last file events
+        if not self.elapsed_seconds:
+            return 0
+        return self.bytes_transferred / self.elapsed_seconds
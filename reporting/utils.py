@@ -1,10 +1,25 @@
-from reporting.models import Report, ReportLine
+import time
+
+from django.conf import settings
+from django.db.models import F
+from django.db.models.functions import Coalesce, Greatest, Least
+
+from reporting.models import Report, ReportLine, ReportSummary
+
+# every writer with lines still in its buffer, so they can all be flushed when a celery task finishes. Held strongly:
+# a writer dropped by its FolderContents before the task finishes must still have its lines written
+_open_report_writers = set()
 
 
 class ReportWriter:
     """
     A class to create and persist the report objects to the DB
 
+    Lines are buffered in memory and written with a single bulk_create once the buffer holds buffer_size lines, or
+    flush_interval seconds have passed since the last write. Call flush() (or use the writer as a context manager)
+    to write out whatever is left; any writer with a non-empty buffer is also flushed when a celery task finishes,
+    see flush_report_writers().
+
     Attributes
     ----------
     report_id = the unique identifier of the overall report in the DB, that the 'lines' will be written to. If this
@@ -16,6 +31,9 @@ class ReportWriter:
 
     folder = A FolderContents object containing the current state of the folder being either downloaded or deleted.
     celery_task_id = a celery task id, so a reader of the report can cross check against the flower monitoring.
+    buffer_size = the number of lines held before they are written, defaults to REPORT_WRITER_BUFFER_SIZE
+    flush_interval = the longest (in seconds) a line is held before it is written, defaults to
+        REPORT_WRITER_FLUSH_INTERVAL
 
 
     Methods
@@ -25,26 +43,122 @@ class ReportWriter:
         gets the name of the folder and creates a corresponding Report object in the DB
 
     write_line()
-        writing a line for the given report to the DB.
+        adding a line for the given report to the buffer, flushing it if it is full or stale. A line about a single
+        file also takes the structured event behind it: the action, file id, bytes, duration and status.
+
+    flush()
+        writing all the buffered lines to the DB in one query, and adding them to the report's line_count and the
+        file events among them to its ReportSummary.
     """
 
-    def __init__(self, folder_name: str, report_id: int = None):
+    def __init__(
+        self,
+        folder_name: str,
+        report_id: int = None,
+        buffer_size: int = None,
+        flush_interval: float = None,
+    ):
 
         self.folder_name = folder_name
+        self.buffer_size = buffer_size or settings.REPORT_WRITER_BUFFER_SIZE
+        if flush_interval is None:
+            flush_interval = settings.REPORT_WRITER_FLUSH_INTERVAL
+        self.flush_interval = flush_interval
+        self._buffer = []
+        self._last_flush = time.monotonic()
 
         if report_id is None:
             self.report_id = self._create_report()
         else:
             self.report_id = report_id
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.flush()
+
     def _create_report(self):
         folder_name = self.folder_name
         new_report = Report.objects.create(root_folder_name=folder_name)
         return new_report.id
 
-    def write_line(self, line: str):
-        report = Report.objects.get(id=self.report_id)
-        ReportLine.objects.create(
-            report=report,
-            line=line,
+    def write_line(
+        self,
+        line: str,
+        action: str = "",
+        file_id: int = None,
+        bytes: int = None,
+        duration: float = None,
+        status: str = "",
+    ):
+        self._buffer.append(
+            ReportLine(
+                report_id=self.report_id,
+                line=line,
+                action=action,
+                file_id=file_id,
+                bytes=bytes,
+                duration=duration,
+                status=status,
+            )
+        )
+        _open_report_writers.add(self)
+
+        if (
+            len(self._buffer) >= self.buffer_size
+            or time.monotonic() - self._last_flush >= self.flush_interval
+        ):
+            self.flush()
+
+    def _add_to_summary(self, events):
+        if not events:
+            return
+
+        totals = _summary_totals(events)
+        first_event = min(event.timestamp for event in events)
+        last_event = max(event.timestamp for event in events)
+        updates = {field: F(field) + amount for field, amount in totals.items()}
+        # several tasks write to the same report at once, so add to the totals in the DB rather than here
+        updated = ReportSummary.objects.filter(report_id=self.report_id).update(
+            first_event=Least(Coalesce("first_event", first_event), first_event),
+            last_event=Greatest(Coalesce("last_event", last_event), last_event),
+            **updates,
         )
+        if not updated:
+            ReportSummary.objects.get_or_create(report_id=self.report_id)
+            self._add_to_summary(events)
+
+    def flush(self):
+        if self._buffer:
+            lines, self._buffer = self._buffer, []
+            ReportLine.objects.bulk_create(lines)
+            Report.objects.filter(id=self.report_id).update(
+                line_count=F("line_count") + len(lines)
+            )
+            self._add_to_summary([line for line in lines if line.status])
+        _open_report_writers.discard(self)
+        self._last_flush = time.monotonic()
+
+
+def flush_report_writers(**kwargs):
+
+    """
+    Flushes every ReportWriter in the process which still has buffered lines.
+
+    Connected to celery's task_postrun signal (see ReportingConfig.ready), so lines written during a task always
+    reach the DB once it finishes, whether or not it succeeded.
+    """
+    for report_writer in list(_open_report_writers):
+        report_writer.flush()
+
+
+def _summary_totals(events):
+    return {
+        "files_succeeded": sum(event.status == "success" for event in events),
+        "files_failed": sum(event.status == "failure" for event in events),
+        "bytes_transferred": sum(
+            event.bytes or 0 for event in events if event.status == "success"
+        ),
+        "transfer_seconds": sum(event.duration or 0 for event in events),
+    }
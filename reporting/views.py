@@ -1,24 +1,213 @@
-from django.core.paginator import Paginator
+import json
+import time
+
+from django.conf import settings
+from django.db.models import Q
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django.template.response import TemplateResponse
 
 from .models import Report, ReportLine
 
 
+def _report_page(reports, cursor, newer: bool, page_size: int):
+    if cursor is None:
+        return list(reports[: page_size + 1])
+
+    task_start, id = cursor
+    if newer:
+        reports = reports.filter(
+            Q(task_start__gt=task_start) | Q(task_start=task_start, id__gt=id)
+        ).order_by("task_start", "id")
+        return list(reports[: page_size + 1])[::-1]
+    return list(
+        reports.filter(
+            Q(task_start__lt=task_start) | Q(task_start=task_start, id__lt=id)
+        )[: page_size + 1]
+    )
+
+
 def report_list(request):
 
-    reports = Report.objects.all().order_by("-task_start")
-    paginator = Paginator(reports, 10)
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
-    return TemplateResponse(request, "report_list.html", {"report_list": page_obj})
+    """
+    Lists the reports, newest first, a page at a time. Pages are keyed by the report at their edge rather than by
+    a page number, so neither an OFFSET nor a COUNT of the reports is needed.
+
+    ** Query Parameters **
+    GET['before'] : Optional, the id of the oldest report on the previous page, to show the older reports after it.
+    GET['after'] : Optional, the id of the newest report on the next page, to show the newer reports before it.
+
+    """
+
+    page_size = settings.REPORT_LIST_PAGE_SIZE
+    reports = Report.objects.select_related("summary").order_by("-task_start", "-id")
+    newer = "after" in request.GET
+    cursor_id = _int_param(request.GET.get("after" if newer else "before"), None)
+    cursor = (
+        Report.objects.filter(id=cursor_id).values_list("task_start", "id").first()
+        if cursor_id is not None
+        else None
+    )
+
+    page = _report_page(reports, cursor, newer, page_size)
+    has_more = len(page) > page_size
+    if has_more:
+        page = page[1:] if newer else page[:-1]
+
+    has_newer = has_more if newer else cursor is not None
+    has_older = cursor is not None if newer else has_more
+    return TemplateResponse(
+        request,
+        "report_list.html",
+        {
+            "report_list": page,
+            "newer_cursor": page[0].id if page and has_newer else None,
+            "older_cursor": page[-1].id if page and has_older else None,
+        },
+    )
+
+
+def _int_param(value, default: int) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _lines_after(report_id: int, after: int, limit: int):
+    return list(
+        ReportLine.objects.filter(report_id=report_id, id__gt=after)
+        .order_by("id")
+        .values("id", "line", "timestamp")[:limit]
+    )
+
+
+def _serialize_line(line: dict) -> dict:
+    return {
+        "id": line["id"],
+        "line": line["line"],
+        "timestamp": line["timestamp"].isoformat(),
+    }
 
 
 def report_detail(request, id: int):
 
-    report = get_object_or_404(Report, id=id)
-    lines = ReportLine.objects.filter(report=report)
+    """
+    Renders the first page of a report's lines. The page fetches the rest from report_lines(), and then follows
+    report_lines_stream() for the lines written while it is open.
+    """
+
+    report = get_object_or_404(Report.objects.select_related("summary"), id=id)
+    lines = _lines_after(report.id, 0, settings.REPORT_LINES_PAGE_SIZE)
 
     return TemplateResponse(
-        request, "report_detail.html", {"report": report, "lines": lines}
+        request,
+        "report_detail.html",
+        {
+            "report": report,
+            "lines": lines,
+            "last_line_id": lines[-1]["id"] if lines else 0,
+            "has_more": len(lines) == settings.REPORT_LINES_PAGE_SIZE,
+        },
+    )
+
+
+def report_lines(request, id: int):
+
+    """
+    Returns a page of a report's lines, in the order they were written, using the id of the last line already seen
+    as the cursor rather than an offset, so every page is a single index range scan.
+
+    ** Path Parameters **
+    The unique identifier of the report
+
+    ** Query Parameters **
+    GET['after'] : Optional, the id of the last line already seen, defaults to 0 for the first page.
+    GET['limit'] : Optional, the number of lines to return, capped at REPORT_LINES_PAGE_SIZE.
+
+    ** Return Value **
+    {
+        "lines": [{"id": ..., "line": ..., "timestamp": ...}, ...],
+        "next_after": the cursor for the next page, or null if this was the last one
+    }
+
+    """
+
+    report = get_object_or_404(Report, id=id)
+    after = _int_param(request.GET.get("after"), 0)
+    limit = min(
+        max(_int_param(request.GET.get("limit"), settings.REPORT_LINES_PAGE_SIZE), 1),
+        settings.REPORT_LINES_PAGE_SIZE,
+    )
+
+    lines = _lines_after(report.id, after, limit)
+    return JsonResponse(
+        {
+            "lines": [_serialize_line(line) for line in lines],
+            "next_after": lines[-1]["id"] if len(lines) == limit else None,
+        },
+        status=200,
+    )
+
+
+def _report_line_events(report_id: int, after: int):
+    deadline = time.monotonic() + settings.REPORT_STREAM_TIMEOUT
+    # tells the browser how soon to reconnect once the stream is closed
+    yield f"retry: {int(settings.REPORT_STREAM_POLL_INTERVAL * 1000)}\n\n"
+
+    # a line is only sent once an earlier poll has seen a line with as high an id, see report_lines_stream
+    horizon = after
+    while True:
+        lines = _lines_after(report_id, after, settings.REPORT_LINES_PAGE_SIZE)
+        ready = [line for line in lines if line["id"] <= horizon]
+        for line in ready:
+            yield f"id: {line['id']}\ndata: {json.dumps(_serialize_line(line))}\n\n"
+        if ready:
+            after = ready[-1]["id"]
+        if lines:
+            horizon = max(horizon, lines[-1]["id"])
+        if len(ready) == settings.REPORT_LINES_PAGE_SIZE:
+            continue
+
+        if time.monotonic() >= deadline:
+            return
+        # a comment, so proxies do not time out the idle connection
+        yield ": keep-alive\n\n"
+        time.sleep(settings.REPORT_STREAM_POLL_INTERVAL)
+
+
+def report_lines_stream(request, id: int):
+
+    """
+    Streams the lines written to a report after a given line as server-sent events, one event per line with the
+    line's id as the event id.
+
+    The stream is closed after REPORT_STREAM_TIMEOUT seconds so it does not hold a worker for the whole of a long
+    migration. An EventSource reconnects by itself, sending the id of the last line it received as Last-Event-ID,
+    and the stream carries on from there.
+
+    The live stream is best effort. The workers of a migration buffer their lines and bulk create them
+    concurrently, so a batch with lower ids can commit after one with higher ids, and a cursor moved past it would
+    never send it. A line is therefore held back until a poll REPORT_STREAM_POLL_INTERVAL seconds earlier has seen
+    a line with at least its id, which gives a batch committing at the same time that long to land. A batch which
+    takes longer to commit than that can still be missed. The paged report_lines endpoint is the complete record.
+
+    ** Path Parameters **
+    The unique identifier of the report
+
+    ** Query Parameters **
+    GET['after'] : Optional, the id of the last line already seen, used when there is no Last-Event-ID header.
+
+    """
+
+    report = get_object_or_404(Report, id=id)
+    after = _int_param(
+        request.headers.get("Last-Event-ID", request.GET.get("after")), 0
+    )
+
+    response = StreamingHttpResponse(
+        _report_line_events(report.id, after), content_type="text/event-stream"
     )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
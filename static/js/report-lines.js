@@ -0,0 +1,49 @@
+// the report page renders the first page of lines. 'Load more' pages through the rest by the id of the last line
+// shown, and once there are no more pages the page follows the lines written from then on as server-sent events.
+
+function appendReportLine(line) {
+    const timestamp = new Date(line.timestamp);
+    const row = $('<tr>');
+    row.append($('<td>').text(timestamp.toLocaleString()));
+    row.append($('<td>').text(line.line));
+    $('.report-lines').append(row);
+    $('.report-lines').data('last-line-id', line.id);
+}
+
+function followReportLines() {
+    const lines = $('.report-lines');
+    const source = new EventSource(`${lines.data('stream-url')}?after=${lines.data('last-line-id')}`);
+    source.onmessage = (event) => {
+        appendReportLine(JSON.parse(event.data));
+    };
+}
+
+function loadMoreReportLines() {
+    const lines = $('.report-lines');
+  $.ajax({
+    url: lines.data('lines-url'),
+    data: { after: lines.data('last-line-id') },
+    method: 'GET'
+  })
+  .done((res) => {
+    res.lines.forEach(appendReportLine);
+    if (res.next_after === null) {
+        $('.load-more-report-lines').hide();
+        followReportLines();
+    } else {
+        $('.load-more-report-lines').show();
+    }
+  })
+  .fail((err) => {
+    console.log(err);
+  });
+}
+
+$( document ).ready(function() {
+    if ($('.report-lines').data('has-more')) {
+        $('.load-more-report-lines').show();
+    } else if ($('.report-lines').length) {
+        followReportLines();
+    }
+    $('.load-more-report-lines').on('click', loadMoreReportLines);
+});
@@ -45,18 +45,29 @@ $('.hard-delete').on('click', function() {
 
 
 
-function getStatus(taskID,cssClass) {
+function getStatus(taskID,cssClass,etag) {
     var spinnerClass= '.spinner-site-' + cssClass;
+    // the longest the progress endpoint holds a request for, VDR_PROGRESS_LONG_POLL_TIMEOUT
+    var longPollTimeout = parseFloat($('.task-progress').data('long-poll-timeout')) || 5;
     $(spinnerClass).show();
     $('.spinner-border').prop('disabled',true)
   $.ajax({
-    url: `/tasks/${taskID}/`,
+    url: `/tasks/${taskID}/progress/`,
+    data: { wait: etag ? longPollTimeout : 0 },
+    headers: etag ? { 'If-None-Match': etag } : {},
     method: 'GET'
   })
-  .done((res) => {
+  .done((res, textStatus, xhr) => {
+    const nextEtag = xhr.getResponseHeader('ETag') || etag;
+    if (xhr.status === 304) {
+      getStatus(taskID,cssClass,nextEtag);
+      return false;
+    }
 
-    const taskStatus = res.group_task_success;
-    if (taskStatus === 'True') {
+    $('.task-progress').text(
+      `${res.folders_done} of ${res.folders_discovered} folders, ${res.files_done} of ${res.files_total} files, ${res.errors} errors`
+    );
+    if (res.state === 'completed') {
         var originalButtonCSSClass = '.' + cssClass;
         $(spinnerClass).hide();
         $(originalButtonCSSClass).prop('disabled', true);
@@ -71,11 +82,16 @@ function getStatus(taskID,cssClass) {
 
         return false;
     }
-    setTimeout(function() {
-      getStatus(res.group_task_id,cssClass);
-    }, 1000);
+    getStatus(taskID,cssClass,nextEtag);
   })
   .fail((err) => {
+    // the job has not started counting its progress yet
+    if (err.status === 404) {
+      setTimeout(function() {
+        getStatus(taskID,cssClass,etag);
+      }, 1000);
+      return false;
+    }
     console.log(err)
   });
-}
\ No newline at end of file
+}
@@ -1,10 +1,11 @@
-// if there is no offset - 'first' is disabled, 'prev' is disabled, 'next is +10'
-//if there is an offset, prev is -10 next is +10
+// if there is no offset - 'first' is disabled, 'prev' is disabled, 'next is +pageSize'
+//if there is an offset, prev is -pageSize next is +pageSize
 //if there is an offset and its the same as the last offset, 'last is disabled' 'next' is disabled.
 
 $( document ).ready(function() {
         var param = window.location.search;
         var paramArray = new URLSearchParams(param);
+        var pageSize = parseInt($('.pagination-container').data('page-size')) || 10;
 
         if (paramArray.has('offset')) {
             //create a array of the key value pairs
@@ -14,7 +15,7 @@ $( document ).ready(function() {
             //get the final offset value
             var finalOffsetUrl = $("#last-pag-link").attr('href');
             var finalOffsetValue = finalOffsetUrl.replace('/sites/?offset=','');
-            var prevOffsetValue = parseInt(currentOffset) - 10;
+            var prevOffsetValue = parseInt(currentOffset) - pageSize;
             paramArray.set('offset',prevOffsetValue)
             $("#prev-pag-link").attr("href", `/sites/?${paramArray.toString()}`);
             if (parseInt(currentOffset) === parseInt(finalOffsetValue)) {
@@ -23,7 +24,7 @@ $( document ).ready(function() {
                 $("#last-pag-link").attr("href", "");
                 $("#next-pag-link").attr("href", "");
             } else {
-                var nextOffsetValue = parseInt(currentOffset) + 10;
+                var nextOffsetValue = parseInt(currentOffset) + pageSize;
                 paramArray.set('offset',nextOffsetValue);
                 console.log('I am here');
                 $("#next-pag-link").attr("href", `/sites/?${paramArray.toString()}`);
@@ -32,7 +33,7 @@ $( document ).ready(function() {
         } else {
             $("#first-pag-link").attr("disabled", "disabled");
             $("#prev-pag-link").attr("disabled", "disabled");
-            $("#next-pag-link").attr("href", `/sites/?${paramArray.toString()}`+ '&offset=10');
+            $("#next-pag-link").attr("href", `/sites/?${paramArray.toString()}`+ `&offset=${pageSize}`);
         }
 
 });
\ No newline at end of file
@@ -0,0 +1,17 @@
+import pytest
+
+from reporting import utils
+
+
+@pytest.fixture(autouse=True)
+def drop_unflushed_report_writers():
+    # in a worker, every task's writers are flushed when it finishes. Tests call the tasks and FolderContents
+    # directly, so drop whatever they leave buffered rather than let it be flushed into a later test's DB
+    yield
+    utils._open_report_writers.clear()
+
+
+@pytest.fixture(autouse=True)
+def no_shared_rate_limiter(settings):
+    # there is no Redis to share the VDR's rate limits through, so only the backoff after a throttled request applies
+    settings.VDR_RATE_LIMIT_REDIS_URL = ""
@@ -0,0 +1,129 @@
+import pytest
+import requests
+from django.core.cache import caches
+
+from core.benchmark.harness import benchmark_environment, run_benchmark
+from core.benchmark.listing_models import run_listing_model_benchmark
+from core.benchmark.stand_ins import InMemoryRedis, InMemoryS3Client
+from core.benchmark.vdr_server import FakeVDRServer, FakeVDRSite
+from core.http_handlers import rate_limit
+from core.http_handlers.utils import get_setting
+from core.models import RemoteSystemSettings, SyncIndexEntry
+from reporting.models import Report
+from tests.test_utilities.conftest import remote_system_settings
+from vdr_storage_integration.celery import app
+
+
+def test_fake_vdr_site_shape():
+    site = FakeVDRSite(depth=2, breadth=2, files_per_folder=3, file_size=100)
+
+    assert len(site.folders) == 1 + 2 + 4
+    assert len(site.file_sizes) == 7 * 3
+    assert site.total_size == 7 * 3 * 100
+    assert site.folders[1]["parentFolderID"] == 0
+
+
+def test_fake_vdr_server_rate_limit():
+
+    site = FakeVDRSite(depth=0, files_per_folder=1)
+    with FakeVDRServer(site, rate_limit=1) as server:
+        responses = [requests.get(f"{server.base_url}/folder/1") for _ in range(3)]
+
+    assert responses[0].status_code == 200
+    assert responses[-1].status_code == 429
+    assert responses[-1].headers["Retry-After"]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_run_benchmark(settings, remote_system_settings):
+    settings.VDR_DOWNLOAD_SEGMENTS = 1
+    # sqlite locks its tables against writes from several threads at once
+    settings.VDR_TRANSFER_WORKERS_PER_FOLDER = 1
+    site = FakeVDRSite(depth=1, breadth=2, files_per_folder=3, file_size=1000)
+    report = Report.objects.create(root_folder_name="A real site")
+
+    results = run_benchmark(site)
+
+    replicate, incremental, soft_delete, hard_delete = results
+    assert [result.operation for result in results] == [
+        "replicate",
+        "replicate_incremental",
+        "soft_delete",
+        "hard_delete",
+    ]
+    assert replicate.files == 9
+    assert replicate.bytes == 9000
+    assert replicate.files_failed == 0
+    assert replicate.api_errors == 0
+    # every file is downloaded once, and uploaded to S3 once
+    assert replicate.api_calls >= 9
+    assert replicate.s3_calls == 9
+    assert replicate.db_queries > 0
+    # nothing changed, so nothing is downloaded again: each file's ETag is checked with a conditional download
+    # instead, which the VDR answers with a 304 and no body
+    assert incremental.api_calls == replicate.api_calls
+    assert incremental.s3_calls == 0
+    assert incremental.bytes == 0
+    # the site is crawled, then every file and both subfolders are deleted, but not the root folder
+    assert soft_delete.files_failed == 0
+    assert soft_delete.api_calls == 1 + 3 + 3 + 9 + 2
+    # a permanent delete soft deletes everything first
+    assert hard_delete.api_calls == 1 + 3 + 3 + 2 * (9 + 2)
+
+    # the benchmark cleans up after itself, and only after itself
+    assert list(Report.objects.all()) == [report]
+    assert not SyncIndexEntry.objects.exists()
+    assert RemoteSystemSettings.objects.get(id=1).remote_system_base_url == (
+        "http://system.com/system"
+    )
+    assert get_setting("remote_system_base_url") == "http://system.com/system"
+
+
+@pytest.mark.django_db
+def test_benchmark_environment_switches_off_the_shared_rate_limiter(settings):
+    settings.VDR_RATE_LIMIT_REDIS_URL = "redis://redis:6379"
+    site = FakeVDRSite(depth=0, files_per_folder=1)
+
+    with FakeVDRServer(site) as server, benchmark_environment(
+        server, InMemoryS3Client(), InMemoryRedis()
+    ):
+        assert rate_limit.get_rate_limit_redis() is None
+        assert rate_limit.RateLimiter().acquire("download") == 0
+
+
+@pytest.mark.django_db
+def test_benchmark_environment_leaves_the_shared_settings_alone(
+    remote_system_settings,
+):
+    assert get_setting("remote_system_base_url") == "http://system.com/system"
+    shared_cache = caches["default"]
+    site = FakeVDRSite(depth=0, files_per_folder=1)
+
+    with FakeVDRServer(site) as server, benchmark_environment(
+        server, InMemoryS3Client(), InMemoryRedis()
+    ):
+        assert get_setting("remote_system_base_url") == server.base_url
+        # the row, and the cache the workers read it through, still point at the real VDR
+        assert RemoteSystemSettings.objects.get(id=1).remote_system_base_url == (
+            "http://system.com/system"
+        )
+        assert caches["default"] is not shared_cache
+        assert shared_cache.get("remote_system_base_url") == "http://system.com/system"
+        assert not app.conf.task_always_eager
+
+    assert get_setting("remote_system_base_url") == "http://system.com/system"
+
+
+def test_run_listing_model_benchmark():
+    validated, trusted, compact = run_listing_model_benchmark(files=2000)
+
+    assert [result.representation for result in (validated, trusted, compact)] == [
+        "validated",
+        "trusted",
+        "compact",
+    ]
+    assert all(result.files == 2000 for result in (validated, trusted, compact))
+    # no pydantic validation, and a fields set shared between every file
+    assert trusted.bytes < validated.bytes
+    # ints in arrays, with no object for each file
+    assert compact.bytes * 4 < validated.bytes
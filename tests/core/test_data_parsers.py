@@ -1,8 +1,14 @@
+import io
+import json
 from builtins import type
 
 import pytest
 
 from core.data_parsers.file_and_folder_data_parsers import (
+    iter_json_array_items,
+    iter_parse_files_in_single_folder,
+    iter_parse_single_folder_subfolders,
+    parse_file_details,
     parse_get_files_in_single_folder,
     parse_get_folder_details,
     parse_get_single_folder_subfolders,
@@ -12,6 +18,8 @@ from core.data_parsers.site_data_parsers import (
     parse_get_single_site,
 )
 from core.dataclasses.file_and_folder_dataclasses import (
+    CompactFileList,
+    VDRFile,
     VDRFileList,
     VDRFolder,
     VDRSubFolderList,
@@ -54,3 +62,87 @@ def test_parse_get_single_folder_subfolders(vdr_subfolders_json_response):
 def test_parse_get_files_in_single_folder(vdr_files_in_folder_json_response):
     result = parse_get_files_in_single_folder(vdr_files_in_folder_json_response)
     assert type(result) == VDRFileList
+
+
+@pytest.mark.django_db
+def test_iter_parse_single_folder_subfolders(vdr_subfolders_json_response):
+    stream = io.BytesIO(json.dumps(vdr_subfolders_json_response).encode())
+    result = list(iter_parse_single_folder_subfolders(stream))
+    assert (
+        result
+        == parse_get_single_folder_subfolders(
+            vdr_subfolders_json_response
+        ).subfolder_list
+    )
+
+
+@pytest.mark.django_db
+def test_iter_parse_files_in_single_folder(vdr_files_in_folder_json_response):
+    stream = io.BytesIO(json.dumps(vdr_files_in_folder_json_response).encode())
+    fields = {}
+    result = list(iter_parse_files_in_single_folder(stream, fields))
+    assert all(type(file) == VDRFile for file in result)
+    assert (
+        result
+        == parse_get_files_in_single_folder(vdr_files_in_folder_json_response).file_list
+    )
+    assert "file" not in fields
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 64 * 1024])
+def test_iter_json_array_items_across_chunks(chunk_size):
+    listing = {
+        "total": 12345,
+        "file": [
+            {"id": i, "name": f'fichier \u00e9 "{i}"', "size": i * 1.5}
+            for i in range(20)
+        ],
+        "after": [True, None, -2e3],
+    }
+    stream = io.BytesIO(json.dumps(listing, ensure_ascii=False).encode())
+    fields = {}
+
+    items = iter_json_array_items(stream, "file", fields, chunk_size=chunk_size)
+
+    assert next(items) == listing["file"][0]
+    # the members before the array are there as soon as the first item is
+    assert fields == {"total": 12345}
+    assert list(items) == listing["file"][1:]
+    assert fields == {"total": 12345, "after": [True, None, -2000.0]}
+
+
+def test_iter_json_array_items_of_an_empty_listing():
+    assert list(iter_json_array_items(io.BytesIO(b' { "file" : [ ] } '), "file")) == []
+    assert list(iter_json_array_items(io.BytesIO(b"{}"), "file")) == []
+
+
+def test_iter_json_array_items_of_a_truncated_listing():
+    items = iter_json_array_items(
+        io.BytesIO(b'{"file": [{"id": 1}, {"id": 2'), "file", chunk_size=4
+    )
+    assert next(items) == {"id": 1}
+    with pytest.raises(ValueError):
+        next(items)
+
+
+def test_parse_file_details_checks_the_json_like_pydantic():
+    file = parse_file_details({"id": "12", "name": 345, "type": "pdf", "size": 10.0})
+
+    assert file == VDRFile(id="12", name=345, type="pdf", size=10.0)
+    assert (file.id, file.name, file.size) == (12, "345", 10)
+    with pytest.raises(ValueError):
+        parse_file_details({"id": "twelve", "name": "a", "type": "pdf", "size": 1})
+    with pytest.raises(ValueError):
+        parse_file_details({"id": 12, "name": None, "type": "pdf", "size": 1})
+
+
+def test_compact_file_list_round_trip(vdr_files_in_folder_json_response):
+    file_list = parse_get_files_in_single_folder(
+        vdr_files_in_folder_json_response
+    ).file_list
+
+    compact = CompactFileList(file_list)
+
+    assert len(compact) == len(file_list)
+    assert list(compact.file_list) == file_list
+    assert not CompactFileList()
@@ -0,0 +1,263 @@
+import io
+import json
+import os
+
+import pytest
+
+from core.dataclasses.file_and_folder_dataclasses import VDRFile
+from core.http_handlers.file_and_folder_http_handlers import download_single_file
+from core.site_migration.utilities.download import (
+    download_file_to_path,
+    RangeNotSupported,
+    open_download_at,
+    open_resumable_download,
+    preallocate,
+    readinto_chunks,
+)
+from tests.test_utilities.conftest import (
+    generic_user,
+    mock_get_bearer_token,
+    stand_in_vdr_server,
+)
+
+BODY = bytes(range(256)) * 64
+
+
+def _vdr_file(file_id=1):
+    return VDRFile(id=file_id, name="A File", type="bin", size=len(BODY))
+
+
+@pytest.mark.django_db
+def test_download_single_file_requests_a_range(stand_in_vdr_server, generic_user):
+    server = stand_in_vdr_server({1: BODY})
+
+    response = download_single_file(generic_user(), 1, start_byte=10, end_byte=19)
+
+    assert response.status_code == 206
+    assert response.content == BODY[10:20]
+    assert server.downloads == [(1, "bytes=10-19")]
+
+
+@pytest.mark.django_db
+def test_open_download_at_reads_past_an_ignored_range(
+    stand_in_vdr_server, generic_user
+):
+    stand_in_vdr_server({1: BODY}, supports_ranges=False)
+
+    response = open_download_at(generic_user(), 1, 1000)
+
+    assert response.raw.read() == BODY[1000:]
+
+
+@pytest.mark.django_db
+def test_open_download_at_rejects_a_file_which_has_changed(
+    stand_in_vdr_server, generic_user
+):
+    stand_in_vdr_server({1: BODY[::-1] + b"more"})
+
+    with pytest.raises(RangeNotSupported):
+        open_download_at(generic_user(), 1, 1000, if_range=f'"1-{len(BODY)}"')
+
+
+@pytest.mark.django_db
+def test_open_resumable_download_carries_on_after_the_connection_drops(
+    stand_in_vdr_server, generic_user
+):
+    server = stand_in_vdr_server({1: BODY}, drop_after={1: 5000})
+
+    downloaded = open_resumable_download(generic_user(), 1)
+    body = b"".join(iter(lambda: downloaded.read(1024), b""))
+
+    assert body == BODY
+    # picked up again from the last whole chunk read, rather than from the start
+    assert server.downloads[1] == (1, f"bytes={server.downloads[1][1][6:-1]}-")
+    assert int(server.downloads[1][1][6:-1]) in (1024, 2048, 3072, 4096)
+    assert server.downloads[0] == (1, None)
+    assert len(server.downloads) == 2
+    assert server.download_headers[1]["If-Range"] == f'"1-{len(BODY)}"'
+
+
+@pytest.mark.django_db
+def test_download_file_to_path_resumes_after_the_connection_drops(
+    settings, tmp_path, stand_in_vdr_server, generic_user
+):
+    settings.VDR_DOWNLOAD_CHUNK_SIZE = 1024
+    server = stand_in_vdr_server({1: BODY}, drop_after={1: 5000})
+    path = str(tmp_path / "A File.bin")
+
+    assert download_file_to_path(generic_user(), _vdr_file(), path) == path
+
+    with open(path, "rb") as f:
+        assert f.read() == BODY
+    assert not os.path.exists(path + ".part")
+    assert server.downloads[0] == (1, None)
+    # picked up again from the last whole chunk written, rather than from the start
+    assert server.downloads[1][1] in {
+        f"bytes={n}-" for n in (1024, 2048, 3072, 4096, 5000)
+    }
+    assert len(server.downloads) == 2
+
+
+def _write_part(path, body, **state):
+    with open(path + ".part", "wb") as f:
+        f.write(body)
+    with open(path + ".part.json", "w") as f:
+        json.dump(state, f)
+
+
+@pytest.mark.django_db
+def test_download_file_to_path_resumes_a_partial_file(
+    tmp_path, stand_in_vdr_server, generic_user
+):
+    server = stand_in_vdr_server({1: BODY})
+    path = str(tmp_path / "A File.bin")
+    _write_part(path, BODY[:3000], etag=f'"1-{len(BODY)}"')
+
+    download_file_to_path(generic_user(), _vdr_file(), path)
+
+    with open(path, "rb") as f:
+        assert f.read() == BODY
+    assert server.downloads == [(1, "bytes=3000-")]
+    assert server.download_headers[0]["If-Range"] == f'"1-{len(BODY)}"'
+    assert not os.path.exists(path + ".part.json")
+
+
+@pytest.mark.django_db
+def test_download_file_to_path_starts_again_if_the_file_has_changed(
+    tmp_path, stand_in_vdr_server, generic_user
+):
+    changed_body = BODY[::-1] + b"more"
+    server = stand_in_vdr_server({1: changed_body})
+    path = str(tmp_path / "A File.bin")
+    _write_part(path, BODY[:3000], etag=f'"1-{len(BODY)}"')
+
+    download_file_to_path(
+        generic_user(),
+        VDRFile(id=1, name="A File", type="bin", size=len(changed_body)),
+        path,
+    )
+
+    with open(path, "rb") as f:
+        assert f.read() == changed_body
+    assert server.downloads == [(1, "bytes=3000-")]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "state",
+    [
+        # no ETag to check the .part against
+        None,
+        # preallocated to the file's size by a segmented download
+        {"etag": f'"1-{len(BODY)}"', "segment_size": 4096, "segments": [0]},
+    ],
+)
+def test_download_file_to_path_starts_again_from_a_part_it_cant_trust(
+    tmp_path, stand_in_vdr_server, generic_user, state
+):
+    server = stand_in_vdr_server({1: BODY})
+    path = str(tmp_path / "A File.bin")
+    if state is None:
+        with open(path + ".part", "wb") as f:
+            f.write(BODY[:3000])
+    else:
+        _write_part(path, BODY[:4096] + bytes(len(BODY) - 4096), **state)
+
+    download_file_to_path(generic_user(), _vdr_file(), path)
+
+    with open(path, "rb") as f:
+        assert f.read() == BODY
+    assert server.downloads == [(1, None)]
+
+
+@pytest.mark.django_db
+def test_download_file_to_path_promotes_a_part_marked_complete(
+    tmp_path, stand_in_vdr_server, generic_user
+):
+    server = stand_in_vdr_server({1: BODY})
+    path = str(tmp_path / "A File.bin")
+    _write_part(path, BODY, etag=f'"1-{len(BODY)}"', complete=True)
+
+    assert download_file_to_path(generic_user(), _vdr_file(), path) == path
+
+    with open(path, "rb") as f:
+        assert f.read() == BODY
+    assert server.downloads == []
+    assert not os.path.exists(path + ".part.json")
+
+
+@pytest.mark.django_db(transaction=True)
+def test_download_file_to_path_carries_on_from_the_segments_written(
+    settings, tmp_path, stand_in_vdr_server, generic_user
+):
+    settings.VDR_DOWNLOAD_SEGMENTS = 3
+    settings.VDR_DOWNLOAD_SEGMENT_SIZE = 4096
+    server = stand_in_vdr_server({1: BODY})
+    path = str(tmp_path / "A File.bin")
+    _write_part(
+        path,
+        BODY[:4096] + bytes(4096) + BODY[8192:12288] + bytes(4096),
+        etag=f'"1-{len(BODY)}"',
+        segment_size=4096,
+        segments=[0, 8192],
+    )
+
+    download_file_to_path(generic_user(), _vdr_file(), path)
+
+    with open(path, "rb") as f:
+        assert f.read() == BODY
+    assert sorted(range_header for _, range_header in server.downloads) == [
+        "bytes=12288-16383",
+        "bytes=4096-8191",
+    ]
+    assert {headers["If-Range"] for headers in server.download_headers} == {
+        f'"1-{len(BODY)}"'
+    }
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.parametrize("supports_ranges", [True, False])
+def test_download_file_to_path_in_segments(
+    settings, tmp_path, stand_in_vdr_server, generic_user, supports_ranges
+):
+    settings.VDR_DOWNLOAD_SEGMENTS = 3
+    settings.VDR_DOWNLOAD_SEGMENT_SIZE = 4096
+    server = stand_in_vdr_server({1: BODY}, supports_ranges=supports_ranges)
+    path = str(tmp_path / "A File.bin")
+    etags = []
+
+    download_file_to_path(
+        generic_user(),
+        _vdr_file(),
+        path,
+        on_response=lambda response: etags.append(response.headers["ETag"]),
+    )
+
+    with open(path, "rb") as f:
+        assert f.read() == BODY
+    assert etags and set(etags) == {f'"1-{len(BODY)}"'}
+    if supports_ranges:
+        assert sorted(range_header for _, range_header in server.downloads) == [
+            "bytes=0-4095",
+            "bytes=12288-16383",
+            "bytes=4096-8191",
+            "bytes=8192-12287",
+        ]
+
+
+def test_readinto_chunks_reuses_one_buffer():
+    chunks = list(
+        (bytes(chunk), chunk.obj) for chunk in readinto_chunks(io.BytesIO(BODY), 5000)
+    )
+
+    assert b"".join(data for data, _ in chunks) == BODY
+    assert [len(data) for data, _ in chunks] == [5000, 5000, 5000, 1384]
+    assert len({id(buffer) for _, buffer in chunks}) == 1
+
+
+def test_preallocate_sizes_the_file(tmp_path):
+    path = tmp_path / "A File.bin"
+    with open(path, "wb") as f:
+        preallocate(f.fileno(), len(BODY))
+
+    assert path.stat().st_size == len(BODY)
@@ -70,3 +70,20 @@ def test_access_key_widget_overrides_correctly():
 def test_secret_key_widget_overrides_correctly():
     form = SettingsForm()
     assert type(form.fields["aws_secret_access_key"].widget) == PasswordInput
+
+
+@pytest.mark.django_db
+def test_settings_form_keeps_default_s3_transfer_settings_when_blank():
+    form = SettingsForm(
+        data={
+            "remote_system_base_url": "https://example.com",
+            "aws_access_key_id": "123456789",
+            "aws_secret_access_key": "0987654321",
+            "aws_bucket_name": "bucket-bucket",
+            "s3_max_concurrency": "",
+        }
+    )
+    assert form.is_valid()
+    settings = form.save()
+    assert settings.s3_max_concurrency == 10
+    assert settings.s3_multipart_chunksize == 8 * 1024 * 1024
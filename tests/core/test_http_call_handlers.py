@@ -1,10 +1,15 @@
+import time
 from builtins import staticmethod, type
+from datetime import datetime
 
 import pytest
 import requests
-from allauth.socialaccount.models import SocialToken
+from allauth.socialaccount.models import SocialAccount, SocialApp, SocialToken
+from django.core.cache import cache
 from django.core.exceptions import FieldDoesNotExist
+from django.http import QueryDict
 
+from core.benchmark.vdr_server import FakeVDRServer, FakeVDRSite
 from core.dataclasses.file_and_folder_dataclasses import (
     VDRFileList,
     VDRFolder,
@@ -12,7 +17,13 @@ from core.dataclasses.file_and_folder_dataclasses import (
 )
 from core.dataclasses.site_dataclasses import VDRSiteDetail, VDRSiteList
 from core.dataclasses.utility_dataclasses import VDRServiceError
-from core.http_handlers import file_and_folder_http_handlers, site_http_handlers
+from core.http_handlers import (
+    file_and_folder_http_handlers,
+    rate_limit,
+    session,
+    site_cache,
+    site_http_handlers,
+)
 from core.http_handlers.file_and_folder_http_handlers import (
     download_single_file,
     get_files_in_single_folder,
@@ -23,23 +34,48 @@ from core.http_handlers.file_and_folder_http_handlers import (
     shallow_delete_single_file,
     shallow_delete_single_folder,
 )
-from core.http_handlers.site_http_handlers import get_all_sites, get_single_site
-from core.http_handlers.utils import get_setting
+from core.http_handlers.rate_limit import (
+    RateLimiter,
+    budget_for_url,
+    retry_after_seconds,
+)
+from core.http_handlers.session import RateLimitedAdapter, get_vdr_session
+from core.http_handlers.site_cache import (
+    get_cached_site_detail,
+    get_cached_site_list,
+    invalidate_site_list,
+    prefetch_site_details,
+)
+from core.http_handlers.site_http_handlers import (
+    SiteDetailRevalidation,
+    get_all_sites,
+    get_single_site,
+)
+from core.http_handlers.utils import (
+    clear_access_token,
+    get_access_token,
+    get_setting,
+)
 from tests.test_utilities.conftest import (
+    MockFailureResponse,
+    MockSuccessResponse,
     generic_user,
     mock_get_bearer_token,
     mock_object_with_error_response,
     mock_object_with_generic_json_response,
+    mock_object_with_json_response,
     mock_object_with_url_encode_method,
     remote_system_settings,
 )
 from tests.test_utilities.dataclass_responses import (
     vdr_folder_detail,
-    vdr_folder_files_list,
-    vdr_folder_subfolders,
     vdr_site_detail,
     vdr_site_list,
 )
+from tests.test_utilities.json_responses import (
+    vdr_files_in_folder_json_response,
+    vdr_subfolders_json_response,
+)
 
 
 @pytest.mark.django_db
@@ -52,10 +88,10 @@ def test_get_all_sites(
     remote_system_settings,
 ):
     monkeypatch.setattr(SocialToken.objects, "get", mock_get_bearer_token)
-    monkeypatch.setattr(requests, "get", mock_object_with_generic_json_response)
+    monkeypatch.setattr(requests.Session, "get", mock_object_with_generic_json_response)
     monkeypatch.setattr(site_http_handlers, "parse_get_all_sites", vdr_site_list)
 
-    result = site_http_handlers.get_all_sites(generic_user)
+    result = site_http_handlers.get_all_sites(generic_user())
     assert type(result) == VDRSiteList
 
 
@@ -71,11 +107,11 @@ def test_get_all_sites_with_query_params(
 ):
 
     monkeypatch.setattr(SocialToken.objects, "get", mock_get_bearer_token)
-    monkeypatch.setattr(requests, "get", mock_object_with_generic_json_response)
+    monkeypatch.setattr(requests.Session, "get", mock_object_with_generic_json_response)
     monkeypatch.setattr(site_http_handlers, "parse_get_all_sites", vdr_site_list)
 
     result = site_http_handlers.get_all_sites(
-        generic_user, mock_object_with_url_encode_method
+        generic_user(), mock_object_with_url_encode_method
     )
     assert type(result) == VDRSiteList
 
@@ -90,9 +126,9 @@ def test_get_all_sites_error_response(
 ):
 
     monkeypatch.setattr(SocialToken.objects, "get", mock_get_bearer_token)
-    monkeypatch.setattr(requests, "get", mock_object_with_error_response)
+    monkeypatch.setattr(requests.Session, "get", mock_object_with_error_response)
 
-    result = site_http_handlers.get_all_sites(generic_user)
+    result = site_http_handlers.get_all_sites(generic_user())
     assert type(result) == VDRServiceError
 
 
@@ -107,10 +143,10 @@ def test_get_single_site_detail(
 ):
 
     monkeypatch.setattr(SocialToken.objects, "get", mock_get_bearer_token)
-    monkeypatch.setattr(requests, "get", mock_object_with_generic_json_response)
+    monkeypatch.setattr(requests.Session, "get", mock_object_with_generic_json_response)
     monkeypatch.setattr(site_http_handlers, "parse_get_single_site", vdr_site_detail)
 
-    result = site_http_handlers.get_single_site(generic_user, 4)
+    result = site_http_handlers.get_single_site(generic_user(), 4)
     assert type(result) == VDRSiteDetail
 
 
@@ -124,9 +160,9 @@ def test_get_single_site_detail_error_response(
 ):
 
     monkeypatch.setattr(SocialToken.objects, "get", mock_get_bearer_token)
-    monkeypatch.setattr(requests, "get", mock_object_with_error_response)
+    monkeypatch.setattr(requests.Session, "get", mock_object_with_error_response)
 
-    result = site_http_handlers.get_single_site(generic_user, 4)
+    result = site_http_handlers.get_single_site(generic_user(), 4)
     assert type(result) == VDRServiceError
 
 
@@ -141,12 +177,14 @@ def test_get_single_folder_details(
 ):
 
     monkeypatch.setattr(SocialToken.objects, "get", mock_get_bearer_token)
-    monkeypatch.setattr(requests, "get", mock_object_with_generic_json_response)
+    monkeypatch.setattr(requests.Session, "get", mock_object_with_generic_json_response)
     monkeypatch.setattr(
         file_and_folder_http_handlers, "parse_get_folder_details", vdr_folder_detail
     )
 
-    result = file_and_folder_http_handlers.get_single_folder_details(generic_user, 1234)
+    result = file_and_folder_http_handlers.get_single_folder_details(
+        generic_user(), 1234
+    )
     assert type(result) == VDRFolder
 
 
@@ -160,9 +198,9 @@ def test_get_single_folder_details_error_response(
 ):
 
     monkeypatch.setattr(SocialToken.objects, "get", mock_get_bearer_token)
-    monkeypatch.setattr(requests, "get", mock_object_with_error_response)
+    monkeypatch.setattr(requests.Session, "get", mock_object_with_error_response)
 
-    result = file_and_folder_http_handlers.get_single_folder_details(generic_user, 4)
+    result = file_and_folder_http_handlers.get_single_folder_details(generic_user(), 4)
     assert type(result) == VDRServiceError
 
 
@@ -170,24 +208,24 @@ def test_get_single_folder_details_error_response(
 def test_get_sub_folders_of_single_folder(
     monkeypatch,
     generic_user,
-    vdr_folder_subfolders,
+    vdr_subfolders_json_response,
     mock_get_bearer_token,
-    mock_object_with_generic_json_response,
+    mock_object_with_json_response,
     remote_system_settings,
 ):
 
     monkeypatch.setattr(SocialToken.objects, "get", mock_get_bearer_token)
-    monkeypatch.setattr(requests, "get", mock_object_with_generic_json_response)
     monkeypatch.setattr(
-        file_and_folder_http_handlers,
-        "parse_get_single_folder_subfolders",
-        vdr_folder_subfolders,
+        requests.Session,
+        "get",
+        mock_object_with_json_response(vdr_subfolders_json_response),
     )
 
     result = file_and_folder_http_handlers.get_sub_folders_of_single_folder(
-        generic_user, 1234
+        generic_user(), 1234
     )
     assert type(result) == VDRSubFolderList
+    assert len(result.subfolder_list) == len(vdr_subfolders_json_response["folder"])
 
 
 @pytest.mark.django_db
@@ -200,10 +238,10 @@ def test_get_sub_folders_of_single_folder_error_response(
 ):
 
     monkeypatch.setattr(SocialToken.objects, "get", mock_get_bearer_token)
-    monkeypatch.setattr(requests, "get", mock_object_with_error_response)
+    monkeypatch.setattr(requests.Session, "get", mock_object_with_error_response)
 
     result = file_and_folder_http_handlers.get_sub_folders_of_single_folder(
-        generic_user, 4
+        generic_user(), 4
     )
     assert type(result) == VDRServiceError
 
@@ -212,24 +250,150 @@ def test_get_sub_folders_of_single_folder_error_response(
 def test_get_files_in_single_folder(
     monkeypatch,
     generic_user,
-    vdr_folder_files_list,
+    vdr_files_in_folder_json_response,
     mock_get_bearer_token,
-    mock_object_with_generic_json_response,
+    mock_object_with_json_response,
     remote_system_settings,
 ):
 
     monkeypatch.setattr(SocialToken.objects, "get", mock_get_bearer_token)
-    monkeypatch.setattr(requests, "get", mock_object_with_generic_json_response)
     monkeypatch.setattr(
-        file_and_folder_http_handlers,
-        "parse_get_single_folder_subfolders",
-        vdr_folder_files_list,
+        requests.Session,
+        "get",
+        mock_object_with_json_response(vdr_files_in_folder_json_response),
     )
 
-    result = file_and_folder_http_handlers.get_sub_folders_of_single_folder(
-        generic_user, 1234
+    result = file_and_folder_http_handlers.get_files_in_single_folder(
+        generic_user(), 1234
     )
     assert type(result) == VDRFileList
+    assert len(result.file_list) == vdr_files_in_folder_json_response["filetotal"]
+
+
+def paged_listing(items_key, items, total_key=None, fail_at=None):
+    # stands in for Session.get, serving items a page at a time from the offset and limit in the url
+    requested = []
+
+    def _get(self, url, headers=None, **kwargs):
+        query = QueryDict(url.split("?", 1)[1])
+        offset, limit = int(query["offset"]), int(query["limit"])
+        requested.append(offset)
+        if offset == fail_at:
+            return MockFailureResponse()
+        page = {items_key: items[offset : offset + limit]}
+        if total_key:
+            page[total_key] = len(items)
+        return type(
+            "MockPage", (MockSuccessResponse,), {"json": staticmethod(lambda: page)}
+        )()
+
+    return _get, requested
+
+
+def file_json(file_id):
+    return {"id": file_id, "name": f"file {file_id}", "type": "pdf", "size": 10}
+
+
+@pytest.mark.django_db
+def test_iter_files_in_single_folder_pages_through_the_listing(
+    monkeypatch, generic_user, mock_get_bearer_token, remote_system_settings
+):
+    monkeypatch.setattr(SocialToken.objects, "get", mock_get_bearer_token)
+    get, requested = paged_listing(
+        "file", [file_json(i) for i in range(25)], total_key="filetotal"
+    )
+    monkeypatch.setattr(requests.Session, "get", get)
+
+    files = list(
+        file_and_folder_http_handlers.iter_files_in_single_folder(
+            generic_user(), 1234, page_size=10
+        )
+    )
+
+    assert [file.id for file in files] == list(range(25))
+    # the total says the last page is the last, so nothing more is asked for
+    assert requested == [0, 10, 20]
+
+
+@pytest.mark.django_db
+def test_iter_files_in_single_folder_yields_files_before_the_next_page_is_read(
+    monkeypatch, generic_user, mock_get_bearer_token, remote_system_settings
+):
+    monkeypatch.setattr(SocialToken.objects, "get", mock_get_bearer_token)
+    get, requested = paged_listing(
+        "file", [file_json(i) for i in range(25)], total_key="filetotal"
+    )
+    monkeypatch.setattr(requests.Session, "get", get)
+
+    files = file_and_folder_http_handlers.iter_files_in_single_folder(
+        generic_user(), 1234, page_size=10
+    )
+    first = next(files)
+    files.close()
+
+    assert first.id == 0
+    assert requested == [0]
+
+
+@pytest.mark.django_db
+def test_get_sub_folders_of_single_folder_gathers_every_page(
+    monkeypatch, settings, generic_user, mock_get_bearer_token, remote_system_settings
+):
+    settings.VDR_LISTING_PAGE_SIZE = 2
+    monkeypatch.setattr(SocialToken.objects, "get", mock_get_bearer_token)
+    folders = [
+        {"id": i, "name": f"folder {i}", "parentFolderID": 1, "location": "site"}
+        for i in range(4)
+    ]
+    get, requested = paged_listing("folder", folders)
+    monkeypatch.setattr(requests.Session, "get", get)
+
+    result = get_sub_folders_of_single_folder(generic_user(), 1)
+
+    assert [folder.id for folder in result.subfolder_list] == [0, 1, 2, 3]
+    # with no total, the listing ends at the first short page
+    assert requested == [0, 2, 4]
+
+
+@pytest.mark.django_db
+def test_get_files_in_single_folder_fails_if_any_page_fails(
+    monkeypatch, settings, generic_user, mock_get_bearer_token, remote_system_settings
+):
+    settings.VDR_LISTING_PAGE_SIZE = 2
+    monkeypatch.setattr(SocialToken.objects, "get", mock_get_bearer_token)
+    get, _ = paged_listing(
+        "file", [file_json(i) for i in range(5)], total_key="filetotal", fail_at=2
+    )
+    monkeypatch.setattr(requests.Session, "get", get)
+
+    assert type(get_files_in_single_folder(generic_user(), 1)) == VDRServiceError
+
+
+@pytest.mark.django_db
+def test_iter_sub_folders_of_single_folder_stops_if_the_offset_is_ignored(
+    monkeypatch, generic_user, mock_get_bearer_token, remote_system_settings
+):
+    monkeypatch.setattr(SocialToken.objects, "get", mock_get_bearer_token)
+    folders = [
+        {"id": i, "name": f"folder {i}", "parentFolderID": 1, "location": "site"}
+        for i in range(2)
+    ]
+    page = {"folder": folders}
+    monkeypatch.setattr(
+        requests.Session,
+        "get",
+        lambda *args, **kwargs: type(
+            "MockPage", (MockSuccessResponse,), {"json": staticmethod(lambda: page)}
+        )(),
+    )
+
+    folders = list(
+        file_and_folder_http_handlers.iter_sub_folders_of_single_folder(
+            generic_user(), 1, page_size=2
+        )
+    )
+
+    assert [folder.id for folder in folders] == [0, 1]
 
 
 @pytest.mark.django_db
@@ -242,10 +406,10 @@ def test_get_files_in_single_folder_error_response(
 ):
 
     monkeypatch.setattr(SocialToken.objects, "get", mock_get_bearer_token)
-    monkeypatch.setattr(requests, "get", mock_object_with_error_response)
+    monkeypatch.setattr(requests.Session, "get", mock_object_with_error_response)
 
     result = file_and_folder_http_handlers.get_sub_folders_of_single_folder(
-        generic_user, 4
+        generic_user(), 4
     )
     assert type(result) == VDRServiceError
 
@@ -260,10 +424,12 @@ def test_shallow_delete_single_file(
 ):
 
     monkeypatch.setattr(SocialToken.objects, "get", mock_get_bearer_token)
-    monkeypatch.setattr(requests, "delete", mock_object_with_generic_json_response)
+    monkeypatch.setattr(
+        requests.Session, "delete", mock_object_with_generic_json_response
+    )
 
     result = file_and_folder_http_handlers.shallow_delete_single_file(
-        generic_user, 1234
+        generic_user(), 1234
     )
     assert result.status_code == 200
 
@@ -278,10 +444,12 @@ def test_permanently_delete_single_file(
 ):
 
     monkeypatch.setattr(SocialToken.objects, "get", mock_get_bearer_token)
-    monkeypatch.setattr(requests, "delete", mock_object_with_generic_json_response)
+    monkeypatch.setattr(
+        requests.Session, "delete", mock_object_with_generic_json_response
+    )
 
     result = file_and_folder_http_handlers.shallow_delete_single_file(
-        generic_user, 1234
+        generic_user(), 1234
     )
     assert result.status_code == 200
 
@@ -296,10 +464,12 @@ def test_shallow_delete_single_folder(
 ):
 
     monkeypatch.setattr(SocialToken.objects, "get", mock_get_bearer_token)
-    monkeypatch.setattr(requests, "delete", mock_object_with_generic_json_response)
+    monkeypatch.setattr(
+        requests.Session, "delete", mock_object_with_generic_json_response
+    )
 
     result = file_and_folder_http_handlers.shallow_delete_single_folder(
-        generic_user, 1234
+        generic_user(), 1234
     )
     assert result.status_code == 200
 
@@ -314,10 +484,12 @@ def test_permanently_delete_single_folder(
 ):
 
     monkeypatch.setattr(SocialToken.objects, "get", mock_get_bearer_token)
-    monkeypatch.setattr(requests, "delete", mock_object_with_generic_json_response)
+    monkeypatch.setattr(
+        requests.Session, "delete", mock_object_with_generic_json_response
+    )
 
     result = file_and_folder_http_handlers.permanently_delete_single_folder(
-        generic_user, 1234
+        generic_user(), 1234
     )
     assert result.status_code == 200
 
@@ -332,3 +504,375 @@ def test_get_settings(remote_system_settings):
 def test_get_wrong_setting(remote_system_settings):
     with pytest.raises(FieldDoesNotExist):
         silly_setting = get_setting("foo_bar")
+
+
+def test_get_vdr_session_is_reused_within_a_process():
+    assert get_vdr_session() is get_vdr_session()
+
+
+def test_get_vdr_session_mounts_pooled_retrying_adapter(settings):
+    adapter = get_vdr_session().get_adapter("https://system.com/system")
+    assert adapter.max_retries.total == settings.VDR_HTTP_MAX_RETRIES
+    assert adapter._pool_maxsize == settings.VDR_HTTP_POOL_MAXSIZE
+    # every segment of every transfer in the process can hold a pooled connection at once
+    assert settings.VDR_HTTP_POOL_MAXSIZE >= (
+        settings.VDR_TRANSFER_MAX_WORKERS_PER_PROCESS * settings.VDR_DOWNLOAD_SEGMENTS
+    )
+
+
+class RecordingRateLimiter:
+    def __init__(self):
+        self.acquired = []
+        self.throttled = []
+
+    def acquire(self, budget="default"):
+        self.acquired.append(budget)
+        return 0
+
+    def throttle(self, budget, wait):
+        self.throttled.append((budget, wait))
+
+
+class ScriptedRedis:
+    # stands in for the Lua scripts, answering each call with the next of the given waits
+    def __init__(self, waits):
+        self.waits = list(waits)
+        self.calls = []
+
+    def register_script(self, script):
+        def _run(keys, args):
+            self.calls.append((keys, args))
+            wait = self.waits.pop(0)
+            if isinstance(wait, Exception):
+                raise wait
+            return str(wait)
+
+        return _run
+
+
+def test_budget_for_url():
+    assert budget_for_url("http://system.com/system/download/1") == "download"
+    assert budget_for_url("http://system.com/system/soft-delete-file/1") == "delete"
+    assert budget_for_url("http://system.com/system/hard-delete-folder/1") == "delete"
+    assert budget_for_url("http://system.com/system/files-in-folder/1") == "default"
+
+
+def test_retry_after_seconds():
+    assert retry_after_seconds({"Retry-After": "3"}) == 3
+    assert retry_after_seconds({"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"}) == 0
+    assert retry_after_seconds({"Retry-After": "soon"}) is None
+    assert retry_after_seconds({}) is None
+
+
+def test_rate_limiter_waits_for_a_token(monkeypatch, settings):
+    slept = []
+    monkeypatch.setattr(rate_limit.time, "sleep", slept.append)
+    client = ScriptedRedis([0.5, 0.25, 0])
+
+    waited = RateLimiter(client).acquire("download")
+
+    assert waited == 0.75
+    assert slept == [0.5, 0.25]
+    keys, args = client.calls[0]
+    assert keys == ["vdr:ratelimit:download"]
+    assert args[0] == settings.VDR_RATE_LIMITS["download"]
+
+
+def test_rate_limiter_lets_requests_through_when_redis_is_down():
+    client = ScriptedRedis([rate_limit.redis.ConnectionError("down")])
+    limiter = RateLimiter(client)
+
+    assert limiter.acquire() == 0
+    # and doesn't try it again straight away
+    assert limiter.acquire() == 0
+    assert len(client.calls) == 1
+
+
+def test_rate_limited_adapter_honours_retry_after(monkeypatch, settings):
+    site = FakeVDRSite(depth=0, files_per_folder=1)
+    limiter = RecordingRateLimiter()
+    slept = []
+    real_sleep = time.sleep
+
+    def _sleep(seconds):
+        slept.append(seconds)
+        real_sleep(seconds)
+
+    monkeypatch.setattr(session.time, "sleep", _sleep)
+    http = requests.Session()
+    http.mount("http://", RateLimitedAdapter(rate_limiter=limiter))
+
+    with FakeVDRServer(site, rate_limit=1) as server:
+        first = http.get(f"{server.base_url}/folder/1")
+        second = http.get(f"{server.base_url}/folder/1")
+
+    assert first.status_code == 200
+    # throttled once, then sent again after the second the VDR asked for
+    assert second.status_code == 200
+    assert server.errors[429] == 1
+    assert slept == [1]
+    assert limiter.throttled == [("default", 1)]
+    assert limiter.acquired == ["default"] * 3
+
+
+def test_rate_limited_adapter_gives_up_after_max_retries(monkeypatch, settings):
+    settings.VDR_HTTP_MAX_RETRIES = 2
+    site = FakeVDRSite(depth=0, files_per_folder=1)
+    limiter = RecordingRateLimiter()
+    monkeypatch.setattr(session.time, "sleep", lambda seconds: None)
+    http = requests.Session()
+    http.mount("http://", RateLimitedAdapter(rate_limiter=limiter))
+
+    with FakeVDRServer(site, error_rate=1) as server:
+        response = http.delete(f"{server.base_url}/soft-delete-file/2")
+
+    assert response.status_code == 503
+    assert server.errors[503] == 3
+    assert [budget for budget, _ in limiter.throttled] == ["delete", "delete"]
+
+
+def test_vdr_session_only_retries_a_throttled_request_through_the_limiter(
+    monkeypatch, settings
+):
+    settings.VDR_HTTP_MAX_RETRIES = 3
+    site = FakeVDRSite(depth=0, files_per_folder=1)
+    monkeypatch.setattr(session.time, "sleep", lambda seconds: None)
+    http = session._build_vdr_session()
+    limiter = RecordingRateLimiter()
+    http.get_adapter("http://").rate_limiter = limiter
+
+    # every request is throttled, with a Retry-After
+    with FakeVDRServer(site, rate_limit=0.5) as server:
+        response = http.get(f"{server.base_url}/folder/1")
+
+    assert response.status_code == 429
+    assert server.requests["folder"] == 4
+    assert limiter.acquired == ["default"] * 4
+    assert len(limiter.throttled) == 3
+
+
+@pytest.mark.django_db
+def test_get_access_token_is_cached(monkeypatch, generic_user, mock_get_bearer_token):
+    user = generic_user()
+    monkeypatch.setattr(SocialToken.objects, "get", mock_get_bearer_token)
+    assert get_access_token(user) == "fake-bearer-token"
+
+    def _fail(*args, **kwargs):
+        raise AssertionError("the token should have come from the cache")
+
+    monkeypatch.setattr(SocialToken.objects, "get", _fail)
+    assert get_access_token(user) == "fake-bearer-token"
+    clear_access_token(user.id)
+
+
+@pytest.mark.django_db
+def test_get_access_token_invalidated_on_token_save(generic_user):
+    user = generic_user()
+    app = SocialApp.objects.create(
+        provider="remote_vdr", name="VDR", client_id="id", secret="secret"
+    )
+    account = SocialAccount.objects.create(user=user, provider="remote_vdr", uid="1")
+    token = SocialToken.objects.create(app=app, account=account, token="first")
+    assert get_access_token(user) == "first"
+
+    token.token = "refreshed"
+    token.save()
+    assert get_access_token(user) == "refreshed"
+    clear_access_token(user.id)
+
+
+@pytest.fixture
+def cached_site_list(monkeypatch, vdr_site_list):
+    cache.clear()
+    fetched = []
+    refreshes = []
+
+    def _get_all_sites(user, query_params):
+        fetched.append(query_params.urlencode())
+        return vdr_site_list()
+
+    monkeypatch.setattr(site_cache, "get_all_sites", _get_all_sites)
+    monkeypatch.setattr(
+        site_cache.refresh_site_list_task,
+        "delay",
+        lambda *args: refreshes.append(args),
+    )
+    yield fetched, refreshes
+    cache.clear()
+
+
+@pytest.mark.django_db
+def test_get_cached_site_list_serves_a_fresh_page_from_the_cache(
+    generic_user, cached_site_list
+):
+    fetched, refreshes = cached_site_list
+    user = generic_user()
+
+    first = get_cached_site_list(user, QueryDict("offset=20&limit=5"))
+    second = get_cached_site_list(user, QueryDict("limit=10&offset=20"))
+
+    assert first == second
+    assert fetched == ["offset=20"]
+    # the next page is fetched in the background, once
+    assert refreshes == [(user.id, 0, "offset=30")]
+
+
+@pytest.mark.django_db
+def test_get_cached_site_list_revalidates_a_stale_page_in_the_background(
+    settings, generic_user, cached_site_list
+):
+    fetched, refreshes = cached_site_list
+    user = generic_user()
+    get_cached_site_list(user)
+    refreshes.clear()
+
+    # the page is still cached, but no longer fresh
+    settings.VDR_SITE_LIST_CACHE_TTL = 0
+    get_cached_site_list(user)
+    get_cached_site_list(user)
+
+    assert fetched == [""]
+    assert refreshes == [(user.id, 0, "")]
+
+
+@pytest.mark.django_db
+def test_invalidate_site_list_drops_every_page(generic_user, cached_site_list):
+    fetched, refreshes = cached_site_list
+    user = generic_user()
+    get_cached_site_list(user)
+
+    invalidate_site_list(user.id)
+    get_cached_site_list(user)
+
+    assert fetched == ["", ""]
+
+
+@pytest.mark.django_db
+def test_get_cached_site_list_does_not_cache_errors(
+    monkeypatch, generic_user, cached_site_list
+):
+    error = VDRServiceError(
+        message="Bad Gateway",
+        status_code=502,
+        endpoint="http://system.com/system/sites",
+        timestamp=datetime.now(),
+    )
+    calls = []
+    monkeypatch.setattr(
+        site_cache, "get_all_sites", lambda *args: calls.append(args) or error
+    )
+    user = generic_user()
+
+    assert get_cached_site_list(user) == error
+    assert get_cached_site_list(user) == error
+    assert len(calls) == 2
+
+
+@pytest.fixture
+def cached_site_detail(monkeypatch, vdr_site_detail):
+    cache.clear()
+    requests_sent = []
+
+    def _get_single_site_if_modified(user, site_id, etag="", last_modified=""):
+        requests_sent.append((site_id, etag, last_modified))
+        if etag == '"v1"':
+            return SiteDetailRevalidation(site=None, etag=etag)
+        return SiteDetailRevalidation(
+            site=vdr_site_detail(), etag='"v1"', last_modified=""
+        )
+
+    monkeypatch.setattr(
+        site_cache, "get_single_site_if_modified", _get_single_site_if_modified
+    )
+    yield requests_sent
+    cache.clear()
+
+
+@pytest.mark.django_db
+def test_get_cached_site_detail_revalidates_with_the_etag(
+    settings, generic_user, cached_site_detail
+):
+    user = generic_user()
+
+    first = get_cached_site_detail(user, 4)
+    assert get_cached_site_detail(user, 4) == first
+    assert cached_site_detail == [(4, "", "")]
+
+    # once it is no longer fresh, the VDR is asked whether it has changed, and answers 304
+    settings.VDR_SITE_DETAIL_CACHE_TTL = 0
+    assert get_cached_site_detail(user, 4) == first
+    assert cached_site_detail == [(4, "", ""), (4, '"v1"', "")]
+
+
+@pytest.mark.django_db
+def test_get_cached_site_detail_serves_the_held_copy_if_the_vdr_errors(
+    monkeypatch, settings, generic_user, cached_site_detail
+):
+    user = generic_user()
+    site = get_cached_site_detail(user, 4)
+
+    settings.VDR_SITE_DETAIL_CACHE_TTL = 0
+    monkeypatch.setattr(
+        site_cache,
+        "get_single_site_if_modified",
+        lambda *args, **kwargs: VDRServiceError(
+            message="Bad Gateway",
+            status_code=502,
+            endpoint="http://system.com/system/sites/4",
+            timestamp=datetime.now(),
+        ),
+    )
+    assert get_cached_site_detail(user, 4) == site
+
+
+@pytest.mark.django_db
+def test_prefetch_site_details_queues_the_sites_not_already_cached(
+    monkeypatch, generic_user, vdr_site_list, cached_site_detail
+):
+    user = generic_user()
+    queued = []
+    monkeypatch.setattr(
+        site_cache.prefetch_site_details_task,
+        "delay",
+        lambda *args: queued.append(args),
+    )
+    site_list = vdr_site_list()
+    site_list.site_list = [
+        site.copy(update={"id": site_id})
+        for site_id, site in zip([1, 2, 3], site_list.site_list)
+    ]
+    get_cached_site_detail(user, 2)
+
+    prefetch_site_details(user, site_list)
+    prefetch_site_details(user, site_list)
+
+    assert queued == [(user.id, [1, 3])]
+
+    site_cache.prefetch_site_details_task(user.id, [1, 3])
+    assert sorted(site_id for site_id, *_ in cached_site_detail) == [1, 2, 3]
+    prefetch_site_details(user, site_list)
+    assert len(queued) == 1
+
+
+@pytest.mark.django_db
+def test_get_single_site_if_modified_not_modified(
+    monkeypatch, generic_user, mock_get_bearer_token, remote_system_settings
+):
+    sent_headers = {}
+
+    class MockNotModifiedResponse:
+        status_code = 304
+        headers = {"ETag": '"v1"'}
+
+    def _get(self, url, headers):
+        sent_headers.update(headers)
+        return MockNotModifiedResponse()
+
+    monkeypatch.setattr(SocialToken.objects, "get", mock_get_bearer_token)
+    monkeypatch.setattr(requests.Session, "get", _get)
+
+    result = site_http_handlers.get_single_site_if_modified(
+        generic_user(), 4, etag='"v1"'
+    )
+    assert result == SiteDetailRevalidation(site=None, etag='"v1"')
+    assert sent_headers["If-None-Match"] == '"v1"'
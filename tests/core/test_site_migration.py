@@ -1,18 +1,54 @@
+import io
 import os
+import threading
+from datetime import datetime, timezone
+from unittest import mock
 
 import pytest
-
-from core.site_migration.utilities import utils
+from boto3.s3.transfer import TransferConfig
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+
+from core.dataclasses.file_and_folder_dataclasses import (
+    VDRFile,
+    VDRFileList,
+    VDRFolder,
+    VDRSubFolderList,
+)
+from core.dataclasses.utility_dataclasses import VDRServiceError
+from core.models import (
+    ManifestFolder,
+    MigrationCheckpoint,
+    SiteManifest,
+    SyncIndexEntry,
+)
+from core.site_migration import manifest, site_migrations
+from core.site_migration.utilities import download, sync_index, utils
+from core.site_migration.utilities.checkpoint import Checkpoint
+from core.site_migration.utilities.progress import JobProgress
+from core.site_migration.utilities.s3 import (
+    find_resumable_upload,
+    get_s3_client,
+    get_s3_transfer_config,
+    resumable_upload_fileobj,
+)
+from core.site_migration.utilities.sync_index import SyncDestination, SyncIndex
+from core.site_migration.utilities.transfer import TransferEngine
+from reporting.models import ReportLine, ReportSummary
+from reporting.utils import flush_report_writers
 from tests.test_utilities.conftest import (
+    fake_progress_redis,
     folder_contents_object,
     folder_contents_object_for_hard_delete,
     folder_contents_object_for_local,
     folder_contents_object_for_remote,
     folder_contents_object_for_soft_delete,
     mock_create_directory,
+    mock_get_bearer_token,
     mock_get_path,
     mock_object_with_generic_json_response,
     remote_system_settings,
+    stand_in_vdr_server,
 )
 from tests.test_utilities.dataclass_responses import (
     vdr_file_detail,
@@ -132,6 +168,7 @@ def test_folder_contents_get_subfolders(
     monkeypatch,
     folder_contents_object,
     vdr_folder_subfolders,
+    mock_get_bearer_token,
     mock_get_path,
     vdr_folder_detail,
 ):
@@ -158,6 +195,7 @@ def test_folder_contents_get_files(
     monkeypatch,
     folder_contents_object,
     vdr_folder_files_list,
+    mock_get_bearer_token,
     mock_get_path,
     vdr_folder_detail,
 ):
@@ -181,6 +219,7 @@ def test_folder_contents_has_files_when_files(
     monkeypatch,
     folder_contents_object,
     vdr_folder_files_list,
+    mock_get_bearer_token,
     mock_get_path,
     vdr_folder_detail,
 ):
@@ -212,11 +251,30 @@ def test_folder_contents_has_files_when_no_files(
     assert not folder.has_files()
 
 
+@pytest.mark.django_db
+def test_folder_contents_has_no_files_when_they_could_not_be_listed(
+    folder_contents_object,
+):
+
+    folder = folder_contents_object(
+        123, "root/next level/SiteName/Folder1", "SiteName/Folder1"
+    )
+    folder.files = VDRServiceError(
+        message="Too Many Requests",
+        status_code=429,
+        endpoint="http://system.com/system/files-in-folder/123",
+        timestamp=datetime.now(),
+    )
+
+    assert not folder.has_files()
+
+
 @pytest.mark.django_db
 def test_folder_contents_has_subfolders_when_subfolders(
     monkeypatch,
     folder_contents_object,
     vdr_folder_subfolders,
+    mock_get_bearer_token,
     mock_get_path,
     vdr_folder_detail,
 ):
@@ -254,6 +312,7 @@ def test_folder_contents_prepare_folder_method(
     folder_contents_object,
     vdr_folder_subfolders,
     vdr_folder_files_list,
+    mock_get_bearer_token,
     mock_get_path,
     vdr_folder_detail,
 ):
@@ -336,6 +395,7 @@ def test_folder_contents_for_soft_delete_iterate_over_and_shallow_delete_files(
     folder_contents_object_for_soft_delete,
     vdr_folder_subfolders,
     vdr_folder_files_list,
+    mock_get_bearer_token,
     mock_get_path,
     vdr_folder_detail,
     mock_object_with_generic_json_response,
@@ -363,6 +423,7 @@ def test_folder_contents_for_soft_delete_shallow_delete_this_folder(
     folder_contents_object_for_soft_delete,
     vdr_folder_subfolders,
     vdr_folder_files_list,
+    mock_get_bearer_token,
     mock_get_path,
     vdr_folder_detail,
     mock_object_with_generic_json_response,
@@ -390,6 +451,7 @@ def test_folder_contents_for_hard_delete_iterate_over_and_permanently_delete_fil
     folder_contents_object_for_hard_delete,
     vdr_folder_subfolders,
     vdr_folder_files_list,
+    mock_get_bearer_token,
     mock_get_path,
     vdr_folder_detail,
     mock_object_with_generic_json_response,
@@ -417,6 +479,7 @@ def test_folder_contents_for_hard_delete_permanently_delete_this_folder(
     folder_contents_object_for_hard_delete,
     vdr_folder_subfolders,
     vdr_folder_files_list,
+    mock_get_bearer_token,
     mock_get_path,
     vdr_folder_detail,
     mock_object_with_generic_json_response,
@@ -438,3 +501,1195 @@ def test_folder_contents_for_hard_delete_permanently_delete_this_folder(
 
     folder.prepare_folder()
     folder.permanently_delete_this_folder()
+
+
+@pytest.mark.django_db
+def test_folder_contents_object_init_with_resolved_user(django_assert_num_queries):
+    user = get_user_model().objects.create_user("blah@rah.com", "password")
+
+    with django_assert_num_queries(0):
+        folder = utils.FolderContents(user=user, folder_id=123)
+
+    assert folder.user is user
+
+
+def test_transfer_engine_collects_successes_and_failures(vdr_folder_files_list):
+    files = vdr_folder_files_list().file_list + [
+        VDRFile(id=99, name="Broken File", type="pdf", size=1)
+    ]
+
+    def _transfer(file):
+        if file.id == 54:
+            return VDRServiceError(
+                message="Forbidden",
+                status_code=403,
+                endpoint="http://system.com/system/download/54",
+                timestamp=datetime.now(),
+            )
+        if file.id == 99:
+            raise IOError("disk full")
+        return f"destination/{file.name}"
+
+    results = {
+        result.file_id: result
+        for result in TransferEngine(max_workers=2).run(files, _transfer)
+    }
+
+    assert results[123].success
+    assert results[123].destination == "destination/A File"
+    assert not results[54].success
+    assert results[54].error_message == "403: Forbidden"
+    assert not results[99].success
+    assert results[99].error_message == "disk full"
+
+
+def test_transfer_engine_only_takes_a_window_of_files_ahead():
+    taken = 0
+    finished = 0
+    ahead = []
+
+    def _files():
+        nonlocal taken
+        for file_id in range(1, 51):
+            ahead.append(taken - finished)
+            taken += 1
+            yield VDRFile(id=file_id, name=f"File {file_id}", type="pdf", size=1)
+
+    for result in TransferEngine(max_workers=2).run(_files(), lambda file: file.name):
+        assert result.success
+        finished += 1
+
+    assert finished == 50
+    assert max(ahead) <= 4
+
+
+@pytest.mark.django_db
+def test_folder_contents_for_local_iterate_over_and_write_files_to_local(
+    monkeypatch,
+    tmp_path,
+    folder_contents_object_for_local,
+    vdr_folder_detail,
+    vdr_folder_subfolders,
+    vdr_folder_files_list,
+):
+    class MockDownload:
+        status_code = 200
+        headers = {"ETag": '"v1"'}
+
+        def __init__(self):
+            self.raw = io.BytesIO(b"file contents")
+
+    folder = folder_contents_object_for_local(123, str(tmp_path), "SiteName")
+    monkeypatch.setattr(utils, "get_single_folder_details", vdr_folder_detail)
+    monkeypatch.setattr(
+        utils, "get_sub_folders_of_single_folder", vdr_folder_subfolders
+    )
+    monkeypatch.setattr(utils, "get_files_in_single_folder", vdr_folder_files_list)
+    monkeypatch.setattr(
+        download, "download_single_file", lambda *args, **kwargs: MockDownload()
+    )
+
+    folder.prepare_folder()
+    folder.write_folder_to_local()
+    results = folder.iterate_over_and_write_files_to_local()
+
+    assert all(result.success for result in results)
+    written = tmp_path / "Just a folder name" / "A File.png"
+    assert written.read_bytes() == b"file contents"
+
+    # each file's line carries the structured event behind it
+    folder.report.flush()
+    events = ReportLine.objects.exclude(status="")
+    assert [(event.action, event.status) for event in events] == [
+        ("local", "success")
+    ] * len(results)
+    assert events[0].file_id == results[0].file_id
+
+
+@pytest.mark.django_db
+def test_folder_contents_for_local_and_remote_downloads_each_file_once(
+    monkeypatch,
+    tmp_path,
+    remote_system_settings,
+    vdr_folder_detail,
+    vdr_folder_subfolders,
+    vdr_folder_files_list,
+):
+    downloads = []
+    uploads = {}
+
+    class MockDownload:
+        status_code = 200
+        headers = {}
+
+        def __init__(self):
+            self.raw = io.BytesIO(b"file contents")
+
+        def close(self):
+            pass
+
+    def _mock_download(user, file_id, **kwargs):
+        downloads.append(file_id)
+        return MockDownload()
+
+    def _mock_upload_fileobj(fileobj, bucket, key, **kwargs):
+        uploads[key] = b"".join(iter(lambda: fileobj.read(4), b""))
+
+    user = get_user_model().objects.create_user("blah@rah.com", "password")
+    folder = utils.FolderContentsForLocalAndRemote(
+        user=user, folder_id=123, local_path=str(tmp_path), vdr_path="SiteName"
+    )
+    monkeypatch.setattr(utils, "get_single_folder_details", vdr_folder_detail)
+    monkeypatch.setattr(
+        utils, "get_sub_folders_of_single_folder", vdr_folder_subfolders
+    )
+    monkeypatch.setattr(utils, "get_files_in_single_folder", vdr_folder_files_list)
+    monkeypatch.setattr(download, "download_single_file", _mock_download)
+    monkeypatch.setattr(folder.s3_client, "upload_fileobj", _mock_upload_fileobj)
+
+    folder.prepare_folder()
+    folder.write_folder_to_local()
+    results = folder.iterate_over_and_write_files_to_local_and_remote()
+
+    assert all(result.success for result in results)
+    assert sorted(downloads) == [54, 123]
+    assert uploads["SiteName/Just a folder name/A File.png"] == b"file contents"
+    written = tmp_path / "Just a folder name" / "A File.png"
+    assert written.read_bytes() == b"file contents"
+
+
+@pytest.mark.django_db
+def test_folder_contents_for_local_and_remote_resumes_a_dropped_download(
+    monkeypatch, tmp_path, stand_in_vdr_server
+):
+    body = bytes(range(256)) * 64
+    server = stand_in_vdr_server({1: body}, drop_after={1: 5000})
+    uploads = {}
+
+    def _mock_upload_fileobj(fileobj, bucket, key, **kwargs):
+        uploads[key] = b"".join(iter(lambda: fileobj.read(1024), b""))
+
+    user = get_user_model().objects.create_user("blah@rah.com", "password")
+    folder = utils.FolderContentsForLocalAndRemote(
+        user=user, folder_id=1, local_path=str(tmp_path)
+    )
+    monkeypatch.setattr(folder.s3_client, "upload_fileobj", _mock_upload_fileobj)
+
+    folder.prepare_folder()
+    folder.write_folder_to_local()
+    results = folder.iterate_over_and_write_files_to_local_and_remote()
+
+    assert [result.success for result in results] == [True]
+    assert uploads["Benchmark Site/file 1.bin"] == body
+    assert (tmp_path / "Benchmark Site" / "file 1.bin").read_bytes() == body
+    # carried on from where the connection dropped, rather than from the start
+    assert server.downloads[0] == (1, None)
+    assert server.downloads[1][1].startswith("bytes=")
+    assert server.downloads[1][1] != "bytes=0-"
+    assert server.download_headers[1]["If-Range"] == f'"1-{len(body)}"'
+
+
+@pytest.mark.django_db(transaction=True)
+def test_folder_contents_for_local_and_remote_carries_on_from_an_interrupted_run(
+    stand_in_vdr_server, tmp_path
+):
+    body = bytes(range(256)) * 64
+    server = stand_in_vdr_server({1: body})
+    checkpoint = _checkpoint()
+    s3_client = MockS3MultipartClient()
+    upload_part = s3_client.upload_part
+    key = "Benchmark Site/file 1.bin"
+    local_path = tmp_path / "Benchmark Site" / "file 1.bin"
+    user = get_user_model().objects.create_user("rah@blah.com", "password")
+
+    def _replicate():
+        folder = utils.FolderContentsForLocalAndRemote(
+            user=user, folder_id=1, local_path=str(tmp_path), checkpoint=checkpoint
+        )
+        folder.s3_client = s3_client
+        folder.s3_transfer_config = TransferConfig(
+            multipart_threshold=4096, multipart_chunksize=4096, max_concurrency=2
+        )
+        folder.prepare_folder()
+        folder.write_folder_to_local()
+        return folder.iterate_over_and_write_files_to_local_and_remote()
+
+    def _dying_upload_part(**kwargs):
+        if kwargs["PartNumber"] == 3:
+            raise ConnectionResetError()
+        return upload_part(**kwargs)
+
+    s3_client.upload_part = _dying_upload_part
+    assert [result.success for result in _replicate()] == [False]
+    # the partial file is never left where a replicated copy would be
+    assert not local_path.exists()
+    assert os.path.exists(str(local_path) + ".part")
+
+    s3_client.upload_part = upload_part
+    assert [result.success for result in _replicate()] == [True]
+
+    # carried on from the two parts S3 already had
+    assert server.downloads[1] == (1, "bytes=8192-")
+    assert server.download_headers[1]["If-Range"] == f'"1-{len(body)}"'
+    assert s3_client.completed[key] == body
+    assert local_path.read_bytes() == body
+    assert not os.path.exists(str(local_path) + ".part")
+    assert not os.path.exists(str(local_path) + ".part.json")
+
+
+@pytest.mark.django_db
+def test_s3_client_is_shared_until_the_settings_change(remote_system_settings):
+    client = get_s3_client()
+    assert get_s3_client() is client
+
+    remote_system_settings.aws_access_key_id = "a-new-key"
+    remote_system_settings.save()
+    assert get_s3_client() is not client
+
+
+@pytest.mark.django_db
+def test_s3_transfer_config_uses_remote_system_settings(remote_system_settings):
+    remote_system_settings.s3_multipart_chunksize = 64 * 1024 * 1024
+    remote_system_settings.s3_max_concurrency = 20
+    remote_system_settings.save()
+
+    transfer_config = get_s3_transfer_config()
+    assert transfer_config.multipart_chunksize == 64 * 1024 * 1024
+    assert transfer_config.max_concurrency == 20
+
+
+@pytest.fixture
+def mock_vdr_folder_tree(monkeypatch):
+    # root (1) -> 2, 3, 4 ; 2 -> 5
+    tree = {1: [2, 3, 4], 2: [5], 3: [], 4: [], 5: []}
+    prepared = []
+
+    def _details(user, folder_id):
+        prepared.append(folder_id)
+        return VDRFolder(
+            id=folder_id,
+            name=f"Folder {folder_id}",
+            parent_folder_id=0 if folder_id == 1 else 1,
+            location="Site",
+        )
+
+    def _subfolders(user, folder_id):
+        return VDRSubFolderList(
+            subfolder_list=[
+                VDRFolder(
+                    id=child,
+                    name=f"Folder {child}",
+                    parent_folder_id=folder_id,
+                    location="Site",
+                )
+                for child in tree[folder_id]
+            ]
+        )
+
+    def _files(user, folder_id):
+        return VDRFileList(file_list=[])
+
+    monkeypatch.setattr(utils, "get_single_folder_details", _details)
+    monkeypatch.setattr(utils, "get_sub_folders_of_single_folder", _subfolders)
+    monkeypatch.setattr(utils, "get_files_in_single_folder", _files)
+    return prepared
+
+
+@pytest.fixture
+def mock_vdr_site_listing(monkeypatch, mock_vdr_folder_tree):
+    # the same tree, listed through the manifest crawler; folder 2 holds two files
+    def _subfolders(user, folder_id):
+        yield from utils.get_sub_folders_of_single_folder(
+            user, folder_id
+        ).subfolder_list
+
+    def _files(user, folder_id):
+        if folder_id == 2:
+            for i in range(2):
+                yield VDRFile(id=20 + i, name=f"file {i}.txt", type="txt", size=100)
+
+    monkeypatch.setattr(
+        manifest, "get_single_folder_details", utils.get_single_folder_details
+    )
+    monkeypatch.setattr(manifest, "iter_sub_folders_of_single_folder", _subfolders)
+    monkeypatch.setattr(manifest, "iter_files_in_single_folder", _files)
+    return mock_vdr_folder_tree
+
+
+@pytest.mark.django_db(transaction=True)
+def test_build_site_manifest(mock_vdr_site_listing):
+    user = get_user_model().objects.create_user("blah@rah.com", "password")
+
+    site_manifest = manifest.build_site_manifest(user, 1, max_workers=2)
+
+    # only the root folder needs its own details call
+    assert mock_vdr_site_listing == [1]
+    assert site_manifest.completed is not None
+    assert (site_manifest.folder_count, site_manifest.file_count) == (5, 2)
+    assert site_manifest.total_size == 200
+    deepest = site_manifest.folders.get(folder_id=5)
+    assert (deepest.vdr_path, deepest.depth) == ("Folder 1/Folder 2/Folder 5", 2)
+    assert site_manifest.folders.get(folder_id=2).files.count() == 2
+
+
+@pytest.mark.django_db(transaction=True)
+def test_build_site_manifest_writes_large_levels_in_batches(
+    settings, mock_vdr_site_listing
+):
+    settings.VDR_LISTING_PAGE_SIZE = 1
+    user = get_user_model().objects.create_user("blah@rah.com", "password")
+
+    site_manifest = manifest.build_site_manifest(user, 1, max_workers=2)
+
+    assert (site_manifest.folder_count, site_manifest.file_count) == (5, 2)
+    assert site_manifest.folders.get(folder_id=2).files.count() == 2
+
+
+@pytest.mark.django_db(transaction=True)
+def test_build_site_manifest_drops_the_files_of_a_listing_which_fails_part_way(
+    settings, monkeypatch, mock_vdr_site_listing
+):
+    settings.VDR_LISTING_PAGE_SIZE = 1
+    user = get_user_model().objects.create_user("blah@rah.com", "password")
+
+    def _files(user, folder_id):
+        if folder_id == 2:
+            # the first page is written before the second fails
+            yield VDRFile(id=20, name="file 0.txt", type="txt", size=100)
+            yield VDRFile(id=21, name="file 1.txt", type="txt", size=100)
+            yield VDRServiceError(
+                message="bad gateway",
+                status_code=502,
+                endpoint="files-in-folder/2",
+                timestamp=datetime.now(),
+            )
+        elif folder_id == 3:
+            yield VDRFile(id=30, name="file 0.txt", type="txt", size=50)
+
+    monkeypatch.setattr(manifest, "iter_files_in_single_folder", _files)
+
+    site_manifest = manifest.build_site_manifest(user, 1, max_workers=2)
+
+    # the folder is kept, without any of its contents, and so are the others
+    assert site_manifest.listing_errors == 1
+    assert (site_manifest.folder_count, site_manifest.file_count) == (4, 1)
+    assert site_manifest.total_size == 50
+    assert site_manifest.folders.get(folder_id=2).files.count() == 0
+    assert site_manifest.folders.get(folder_id=3).files.count() == 1
+    assert not site_manifest.folders.filter(folder_id=5).exists()
+    # the failed folder, and the root above it, may hold more than was listed
+    assert sorted(
+        site_manifest.folders.filter(complete=False).values_list("folder_id", flat=True)
+    ) == [1, 2]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_folder_contents_prepare_folder_from_manifest(
+    settings, tmp_path, mock_vdr_site_listing
+):
+    settings.MEDIA_ROOT = str(tmp_path)
+    user = get_user_model().objects.create_user("blah@rah.com", "password")
+    site_manifest = manifest.build_site_manifest(user, 1)
+    manifest_folder = site_manifest.folders.get(folder_id=2)
+
+    folder = utils.FolderContentsForLocal(user=user, folder_id=2)
+    folder.prepare_folder_from_manifest(manifest_folder)
+
+    assert folder.vdr_path == "Folder 1/Folder 2"
+    assert folder.local_path == os.path.join(str(tmp_path), "Folder 1", "Folder 2")
+    assert [f.id for f in folder.subfolders.subfolder_list] == [5]
+    assert [f.id for f in folder.files.file_list] == [20, 21]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_plan_bottom_up_deletion_groups_folders_by_height(mock_vdr_site_listing):
+    user = get_user_model().objects.create_user("blah@rah.com", "password")
+    site_manifest = manifest.build_site_manifest(user, 1)
+
+    waves = manifest.plan_bottom_up_deletion(site_manifest)
+
+    folder_ids = [
+        sorted(ManifestFolder.objects.get(id=pk).folder_id for pk in wave)
+        for wave in waves
+    ]
+    # every leaf goes first, whatever its depth
+    assert folder_ids == [[3, 4, 5], [2], [1]]
+
+
+@pytest.mark.django_db
+def test_delete_stale_manifests_keeps_recent_and_unfinished_manifests(settings):
+    settings.VDR_MANIFEST_RETENTION = 60
+    user = get_user_model().objects.create_user("blah@rah.com", "password")
+    stale, recent, resumable = (
+        SiteManifest.objects.create(user=user, root_folder_id=1) for _ in range(3)
+    )
+    ManifestFolder.objects.create(
+        manifest=stale,
+        folder_id=1,
+        parent_folder_id=0,
+        name="Site",
+        location="/",
+        vdr_path="Site",
+        depth=0,
+    )
+    MigrationCheckpoint.objects.create(
+        user=user, root_folder_id=1, mode="local", manifest=resumable, report_id=1
+    )
+    SiteManifest.objects.exclude(id=recent.id).update(
+        created=datetime(2020, 1, 1, tzinfo=timezone.utc)
+    )
+
+    assert manifest.delete_stale_manifests(user) == 1
+
+    assert set(SiteManifest.objects.values_list("id", flat=True)) == {
+        recent.id,
+        resumable.id,
+    }
+    assert not ManifestFolder.objects.exists()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_manifest_site_delete_task_deletes_each_folder_once_after_its_children(
+    monkeypatch, mock_vdr_site_listing
+):
+    deleted = []
+    waves = []
+
+    class MockGroup:
+        def __init__(self, signatures):
+            # like celery's group, the signatures are only read when the group runs
+            self.signatures = signatures
+
+    class MockChain:
+        def __init__(self, groups):
+            # the waves of deletes, then the invalidation of the site list and the deletion of the manifest
+            waves.extend(groups)
+
+        def apply_async(self):
+            for wave in waves:
+                for signature in getattr(wave, "signatures", [wave]):
+                    signature()
+
+    monkeypatch.setattr(site_migrations, "group", MockGroup)
+    monkeypatch.setattr(site_migrations, "chain", MockChain)
+    monkeypatch.setattr(
+        utils,
+        "shallow_delete_single_folder",
+        lambda user, folder_id: deleted.append(folder_id),
+    )
+    monkeypatch.setattr(
+        utils,
+        "shallow_delete_single_file",
+        lambda user, file_id: deleted.append(file_id),
+    )
+    user = get_user_model().objects.create_user("blah@rah.com", "password")
+
+    site_migrations.manifest_site_delete_task(user.id, 1)
+
+    assert len(waves) == 5
+    assert cache.get(f"vdr_site_list_generation_{user.id}") == 1
+    assert not SiteManifest.objects.exists()
+    assert not ManifestFolder.objects.exists()
+    # folder 5 goes before its parent, the files go before their folder and the root is kept
+    assert deleted.index(5) < deleted.index(2)
+    assert deleted.index(20) < deleted.index(2)
+    assert sorted(deleted) == [2, 3, 4, 5, 20, 21]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_manifest_site_delete_task_keeps_the_folders_above_a_failed_listing(
+    monkeypatch, mock_vdr_site_listing
+):
+    deleted = []
+
+    class MockChain:
+        def __init__(self, groups):
+            self.groups = groups
+
+        def apply_async(self):
+            for wave in self.groups:
+                for signature in getattr(wave, "tasks", [wave]):
+                    signature()
+
+    def _files(user, folder_id):
+        if folder_id == 2:
+            yield from (
+                VDRFile(id=20 + i, name=f"file {i}.txt", type="txt", size=100)
+                for i in range(2)
+            )
+        elif folder_id == 5:
+            yield VDRServiceError(
+                message="Bad Gateway",
+                status_code=502,
+                endpoint="http://system.com/system/files-in-folder/5",
+                timestamp=datetime.now(),
+            )
+
+    monkeypatch.setattr(manifest, "iter_files_in_single_folder", _files)
+    monkeypatch.setattr(site_migrations, "chain", MockChain)
+    monkeypatch.setattr(
+        utils,
+        "shallow_delete_single_folder",
+        lambda user, folder_id: deleted.append(folder_id),
+    )
+    monkeypatch.setattr(
+        utils,
+        "shallow_delete_single_file",
+        lambda user, file_id: deleted.append(file_id),
+    )
+    user = get_user_model().objects.create_user("blah@rah.com", "password")
+
+    site_migrations.manifest_site_delete_task(user.id, 1)
+
+    # folder 5 may hold files which were never listed, so neither it nor folder 2 is deleted; the files which were
+    # listed in folder 2 still are
+    assert sorted(deleted) == [3, 4, 20, 21]
+    flush_report_writers()
+    assert sorted(
+        ReportLine.objects.filter(line__startswith="Not deleting").values_list(
+            "line", flat=True
+        )
+    ) == [
+        "Not deleting Folder 1/Folder 2, as it, or a folder within it, could not be listed",
+        "Not deleting Folder 1/Folder 2/Folder 5, as it, or a folder within it, could not be listed",
+    ]
+
+
+@pytest.mark.django_db
+def test_manifest_site_delete_task_counts_each_permanently_deleted_file_once(
+    monkeypatch, mock_vdr_site_listing
+):
+    class MockGroup:
+        def __init__(self, signatures):
+            self.signatures = signatures
+
+    class MockChain:
+        def __init__(self, groups):
+            self.groups = groups
+
+        def apply_async(self):
+            for wave in self.groups:
+                for signature in getattr(wave, "signatures", [wave]):
+                    signature()
+
+    def _permanently_delete_file(user, file_id):
+        if file_id == 21:
+            return VDRServiceError(
+                message="Bad Gateway",
+                status_code=502,
+                endpoint="http://system.com/system/hard-delete-file/21",
+                timestamp=datetime.now(),
+            )
+        return {}
+
+    monkeypatch.setattr(site_migrations, "group", MockGroup)
+    monkeypatch.setattr(site_migrations, "chain", MockChain)
+    for name in ("shallow_delete_single_folder", "permanently_delete_single_folder"):
+        monkeypatch.setattr(utils, name, lambda user, folder_id: {})
+    monkeypatch.setattr(utils, "shallow_delete_single_file", lambda user, file_id: {})
+    monkeypatch.setattr(
+        utils, "permanently_delete_single_file", _permanently_delete_file
+    )
+    user = get_user_model().objects.create_user("blah@rah.com", "password")
+
+    site_migrations.manifest_site_delete_task(user.id, 1, permanent=True)
+
+    flush_report_writers()
+    events = ReportLine.objects.exclude(status="")
+    assert sorted((event.file_id, event.action, event.status) for event in events) == [
+        (20, "hard_delete", "success"),
+        (21, "hard_delete", "failure"),
+    ]
+    summary = ReportSummary.objects.get(report_id=events[0].report_id)
+    assert summary.files_succeeded == 1
+    assert summary.files_failed == 1
+
+
+@pytest.mark.django_db
+def test_incremental_replication_only_transfers_changed_files(
+    monkeypatch,
+    tmp_path,
+    vdr_folder_detail,
+    vdr_folder_subfolders,
+    vdr_folder_files_list,
+):
+    downloads = []
+    checks = []
+    etags = {54: '"v1"', 123: '"v1"'}
+
+    class MockDownload:
+        status_code = 200
+
+        def __init__(self, file_id):
+            self.headers = {"ETag": etags[file_id]}
+            self.raw = io.BytesIO(b"file contents")
+
+        def close(self):
+            pass
+
+    def _mock_download(user, file_id, **kwargs):
+        downloads.append(file_id)
+        return MockDownload(file_id)
+
+    def _mock_conditional_download(user, file_id, if_none_match=None, **kwargs):
+        checks.append(file_id)
+        response = MockDownload(file_id)
+        if if_none_match == etags[file_id]:
+            response.status_code = 304
+        return response
+
+    monkeypatch.setattr(utils, "get_single_folder_details", vdr_folder_detail)
+    monkeypatch.setattr(
+        utils, "get_sub_folders_of_single_folder", vdr_folder_subfolders
+    )
+    monkeypatch.setattr(utils, "get_files_in_single_folder", vdr_folder_files_list)
+    monkeypatch.setattr(download, "download_single_file", _mock_download)
+    monkeypatch.setattr(sync_index, "download_single_file", _mock_conditional_download)
+    user = get_user_model().objects.create_user("blah@rah.com", "password")
+
+    def _replicate():
+        folder = utils.FolderContentsForLocal(
+            user=user,
+            folder_id=123,
+            local_path=str(tmp_path),
+            vdr_path="SiteName",
+            sync_index=SyncIndex(user, 1, "local", incremental=True),
+        )
+        folder.prepare_folder()
+        folder.write_folder_to_local()
+        return folder.iterate_over_and_write_files_to_local()
+
+    _replicate()
+    assert sorted(downloads) == [54, 123]
+    entry = SyncIndexEntry.objects.get(user=user, target="local", file_id=123)
+    assert entry.etag == '"v1"'
+    assert entry.local_path == str(tmp_path / "Just a folder name" / "A File.png")
+
+    # nothing changed, so nothing is downloaded again
+    assert _replicate() == []
+    assert len(downloads) == 2
+    assert sorted(checks) == [54, 123]
+
+    # a replicated copy which has gone missing is transferred again
+    os.remove(entry.local_path)
+    _replicate()
+    assert sorted(downloads) == [54, 123, 123]
+
+    # as is a file which has changed in the VDR without changing its size
+    etags[54] = '"v2"'
+    _replicate()
+    assert sorted(downloads) == [54, 54, 123, 123]
+    assert SyncIndexEntry.objects.get(user=user, file_id=54).etag == '"v2"'
+
+
+@pytest.mark.django_db
+def test_sync_index_remove_orphans(tmp_path):
+    user = get_user_model().objects.create_user("blah@rah.com", "password")
+    sync_index = SyncIndex(user, 1, "local")
+    kept, orphan = tmp_path / "kept.pdf", tmp_path / "orphan.pdf"
+    for path in (kept, orphan):
+        path.write_bytes(b"contents")
+    sync_index.record(
+        "SiteName",
+        [
+            SyncDestination(
+                file=VDRFile(id=1, name="kept", type="pdf", size=8),
+                local_path=str(kept),
+            ),
+            SyncDestination(
+                file=VDRFile(id=2, name="orphan", type="pdf", size=8),
+                local_path=str(orphan),
+            ),
+        ],
+    )
+
+    removed = sync_index.remove_orphans([1])
+
+    assert [entry.file_id for entry in removed] == [2]
+    assert kept.exists() and not orphan.exists()
+    assert list(SyncIndexEntry.objects.values_list("file_id", flat=True)) == [1]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_manifest_site_replication_resumes_an_unfinished_checkpoint(
+    monkeypatch, settings, tmp_path, mock_vdr_site_listing
+):
+    settings.MEDIA_ROOT = str(tmp_path)
+    dispatched = []
+    downloads = []
+
+    class MockGroup:
+        def __init__(self, signatures):
+            dispatched.append(list(signatures))
+
+        def apply_async(self):
+            for signature in dispatched[-1]:
+                signature()
+
+    class MockDownload:
+        status_code = 200
+        headers = {}
+
+        def __init__(self):
+            self.raw = io.BytesIO(b"contents")
+
+    def _mock_download(user, file_id, **kwargs):
+        downloads.append(file_id)
+        # the second file fails the first time round
+        if file_id == 21 and downloads.count(21) == 1:
+            return VDRServiceError(
+                message="Bad Gateway",
+                status_code=502,
+                endpoint="http://system.com/system/download/21",
+                timestamp=datetime.now(),
+            )
+        return MockDownload()
+
+    monkeypatch.setattr(site_migrations, "group", MockGroup)
+    monkeypatch.setattr(download, "download_single_file", _mock_download)
+    user = get_user_model().objects.create_user("blah@rah.com", "password")
+
+    site_migrations.manifest_site_replication_task(user.id, 1, "local")
+    checkpoint = MigrationCheckpoint.objects.get(user=user)
+    assert checkpoint.completed is None
+    assert sorted(checkpoint.files.values_list("file_id", flat=True)) == [20]
+    assert 2 not in checkpoint.folders.values_list("folder_id", flat=True)
+    unfinished_folder = ManifestFolder.objects.get(folder_id=2)
+
+    site_migrations.manifest_site_replication_task(user.id, 1, "local")
+
+    # the checkpoint and report are reused, and only the unfinished folder's failed file is transferred again
+    second_run = [signature.args[2] for signature in dispatched[1]]
+    assert second_run == [[unfinished_folder.id]]
+    assert sorted(downloads) == [20, 21, 21]
+    assert dispatched[1][0].args[3] == checkpoint.report_id
+    assert dispatched[1][0].args[5] == checkpoint.id
+    # once every folder is finished, the manifest and its checkpoint are deleted
+    flush_report_writers()
+    assert ReportLine.objects.filter(
+        report_id=checkpoint.report_id, line="Finished replicating every folder"
+    ).exists()
+    assert not SiteManifest.objects.exists()
+    assert not ManifestFolder.objects.exists()
+    assert not MigrationCheckpoint.objects.exists()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_manifest_site_replication_finishes_a_checkpoint_with_nothing_left_to_do(
+    monkeypatch, settings, tmp_path, mock_vdr_site_listing
+):
+    settings.MEDIA_ROOT = str(tmp_path)
+    dispatched = []
+
+    class MockGroup:
+        def __init__(self, signatures):
+            dispatched.append(list(signatures))
+
+        def apply_async(self):
+            pass
+
+    monkeypatch.setattr(site_migrations, "group", MockGroup)
+    user = get_user_model().objects.create_user("blah@rah.com", "password")
+
+    site_migrations.manifest_site_replication_task(user.id, 1, "local")
+    checkpoint = MigrationCheckpoint.objects.get(user=user)
+    # every folder was replicated, but the worker died before the checkpoint was finished
+    for folder_id in checkpoint.manifest.folders.values_list("folder_id", flat=True):
+        Checkpoint(checkpoint).complete_folder(folder_id)
+
+    site_migrations.manifest_site_replication_task(user.id, 1, "local")
+
+    assert len(dispatched) == 1
+    flush_report_writers()
+    assert ReportLine.objects.filter(
+        report_id=checkpoint.report_id, line="Finished replicating every folder"
+    ).exists()
+    assert not SiteManifest.objects.exists()
+    assert not MigrationCheckpoint.objects.exists()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_manifest_site_replication_gives_up_on_files_which_keep_failing(
+    monkeypatch, settings, tmp_path, mock_vdr_site_listing
+):
+    settings.MEDIA_ROOT = str(tmp_path)
+    settings.VDR_CHECKPOINT_MAX_FILE_ATTEMPTS = 2
+
+    class MockGroup:
+        def __init__(self, signatures):
+            self.signatures = list(signatures)
+
+        def apply_async(self):
+            for signature in self.signatures:
+                signature()
+
+    class MockDownload:
+        status_code = 200
+        headers = {}
+
+        def __init__(self):
+            self.raw = io.BytesIO(b"contents")
+
+    def _mock_download(user, file_id, **kwargs):
+        # the second file has been deleted from the VDR since the site was crawled
+        if file_id == 21:
+            return VDRServiceError(
+                message="Not Found",
+                status_code=404,
+                endpoint="http://system.com/system/download/21",
+                timestamp=datetime.now(),
+            )
+        return MockDownload()
+
+    monkeypatch.setattr(site_migrations, "group", MockGroup)
+    monkeypatch.setattr(download, "download_single_file", _mock_download)
+    user = get_user_model().objects.create_user("blah@rah.com", "password")
+
+    site_migrations.manifest_site_replication_task(user.id, 1, "local")
+    checkpoint = MigrationCheckpoint.objects.get(user=user)
+    assert checkpoint.completed is None
+
+    assert checkpoint.failures.get(file_id=21).attempts == 1
+
+    site_migrations.manifest_site_replication_task(user.id, 1, "local")
+
+    flush_report_writers()
+    assert ReportLine.objects.filter(
+        report_id=checkpoint.report_id, line__startswith="Giving up on"
+    ).exists()
+    assert ReportLine.objects.filter(
+        report_id=checkpoint.report_id, line="Finished replicating every folder"
+    ).exists()
+    assert not MigrationCheckpoint.objects.exists()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_manifest_site_replication_crawls_again_after_an_exhausted_checkpoint(
+    monkeypatch, settings, tmp_path, mock_vdr_site_listing
+):
+    settings.MEDIA_ROOT = str(tmp_path)
+    settings.VDR_CHECKPOINT_MAX_ATTEMPTS = 1
+    monkeypatch.setattr(site_migrations, "group", lambda signatures: mock.Mock())
+    user = get_user_model().objects.create_user("blah@rah.com", "password")
+
+    site_migrations.manifest_site_replication_task(user.id, 1, "local")
+    first = MigrationCheckpoint.objects.get()
+    site_migrations.manifest_site_replication_task(user.id, 1, "local")
+
+    # the closed checkpoint is deleted along with its manifest
+    second = MigrationCheckpoint.objects.get()
+    assert second.id != first.id
+    assert second.completed is None
+    assert list(SiteManifest.objects.values_list("id", flat=True)) == [
+        second.manifest_id
+    ]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_manifest_site_replication_counts_its_progress(
+    monkeypatch, settings, tmp_path, mock_vdr_site_listing, fake_progress_redis
+):
+    settings.MEDIA_ROOT = str(tmp_path)
+
+    class MockGroup:
+        def __init__(self, signatures):
+            self.signatures = list(signatures)
+
+        def apply_async(self):
+            for signature in self.signatures:
+                signature()
+
+    class MockDownload:
+        status_code = 200
+        headers = {}
+
+        def __init__(self):
+            self.raw = io.BytesIO(b"contents")
+
+    failing = {21}
+
+    def _mock_download(user, file_id, **kwargs):
+        if file_id in failing:
+            return VDRServiceError(
+                message="Bad Gateway",
+                status_code=502,
+                endpoint="http://system.com/system/download/21",
+                timestamp=datetime.now(),
+            )
+        return MockDownload()
+
+    monkeypatch.setattr(site_migrations, "group", MockGroup)
+    monkeypatch.setattr(download, "download_single_file", _mock_download)
+    user = get_user_model().objects.create_user("blah@rah.com", "password")
+
+    site_migrations.manifest_site_replication_task(
+        user.id, 1, "local", progress_id="job-1"
+    )
+
+    progress = JobProgress("job-1").get()
+    assert progress == {
+        "folders_discovered": 5,
+        "folders_done": 5,
+        "files_total": 2,
+        "files_done": 1,
+        "bytes_total": 200,
+        "bytes_transferred": 100,
+        "errors": 1,
+        "state": "running",
+        "version": progress["version"],
+    }
+    assert fake_progress_redis.expiries["vdr:progress:job-1"] == 86400
+
+    # resumed, the file already replicated is skipped but still counts as done
+    failing.clear()
+    site_migrations.manifest_site_replication_task(
+        user.id, 1, "local", progress_id="job-2"
+    )
+
+    progress = JobProgress("job-2").get()
+    assert (progress["files_done"], progress["files_total"]) == (2, 2)
+
+
+class MockS3MultipartClient:
+    class exceptions:
+        class NoSuchUpload(Exception):
+            pass
+
+    def __init__(self):
+        self.uploads = {}
+        self.completed = {}
+        self.aborted = []
+
+    def create_multipart_upload(self, Bucket, Key):
+        upload_id = f"upload-{len(self.uploads) + 1}"
+        self.uploads[upload_id] = {}
+        return {"UploadId": upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        self.uploads[UploadId][PartNumber] = Body
+        return {"ETag": f"etag-{PartNumber}"}
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        if self.uploads.pop(UploadId, None) is None:
+            raise self.exceptions.NoSuchUpload()
+        self.aborted.append(UploadId)
+
+    def get_paginator(self, operation):
+        client = self
+
+        class Paginator:
+            def paginate(self, Bucket, Key, UploadId):
+                if UploadId not in client.uploads:
+                    raise client.exceptions.NoSuchUpload()
+                parts = client.uploads[UploadId]
+                yield {
+                    "Parts": [
+                        {"PartNumber": n, "ETag": f"etag-{n}", "Size": len(body)}
+                        for n, body in parts.items()
+                    ]
+                }
+
+        return Paginator()
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        parts = self.uploads.pop(UploadId)
+        self.completed[Key] = b"".join(
+            parts[part["PartNumber"]] for part in MultipartUpload["Parts"]
+        )
+
+
+@pytest.mark.django_db
+def test_resumable_upload_carries_on_from_the_uploaded_parts():
+    user = get_user_model().objects.create_user("blah@rah.com", "password")
+    site_manifest = SiteManifest.objects.create(user=user, root_folder_id=1)
+    checkpoint = Checkpoint(
+        MigrationCheckpoint.objects.create(
+            user=user,
+            root_folder_id=1,
+            mode="remote",
+            manifest=site_manifest,
+            report_id=1,
+        )
+    )
+    s3_client = MockS3MultipartClient()
+    body = b"0123456789abcdefghij"
+
+    class DyingStream(io.BytesIO):
+        def read(self, size=-1):
+            if self.tell() >= 8:
+                raise ConnectionResetError()
+            return super().read(size)
+
+    with pytest.raises(ConnectionResetError):
+        resumable_upload_fileobj(
+            s3_client, DyingStream(body), "bucket", "key", 4, checkpoint, 7, etag='"v1"'
+        )
+    upload = checkpoint.get_upload(7, "key")
+    assert upload.etag == '"v1"'
+    assert sorted(s3_client.uploads[upload.upload_id]) == [1, 2]
+
+    uploaded = []
+    upload_part = s3_client.upload_part
+
+    def _upload_part(**kwargs):
+        uploaded.append(kwargs["PartNumber"])
+        return upload_part(**kwargs)
+
+    s3_client.upload_part = _upload_part
+    resumable_upload_fileobj(
+        s3_client, io.BytesIO(body), "bucket", "key", 4, checkpoint, 7, etag='"v1"'
+    )
+
+    assert uploaded == [3, 4, 5]
+    assert s3_client.completed["key"] == body
+    assert checkpoint.get_upload(7, "key") is None
+
+
+def _checkpoint():
+    user = get_user_model().objects.create_user("blah@rah.com", "password")
+    site_manifest = SiteManifest.objects.create(user=user, root_folder_id=1)
+    return Checkpoint(
+        MigrationCheckpoint.objects.create(
+            user=user,
+            root_folder_id=1,
+            mode="remote",
+            manifest=site_manifest,
+            report_id=1,
+        )
+    )
+
+
+def _start_upload(s3_client, checkpoint, key, parts, etag, file_id=7):
+    upload_id = s3_client.create_multipart_upload(Bucket="bucket", Key=key)["UploadId"]
+    checkpoint.start_upload(file_id, key, upload_id, etag)
+    for number, body in enumerate(parts, start=1):
+        s3_client.upload_part(
+            Bucket="bucket", Key=key, UploadId=upload_id, PartNumber=number, Body=body
+        )
+    return upload_id
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("etag", ['"v2"', None])
+def test_resumable_upload_starts_again_if_the_file_has_changed(etag):
+    checkpoint = _checkpoint()
+    s3_client = MockS3MultipartClient()
+    body = b"0123456789abcdefghij"
+    upload_id = _start_upload(s3_client, checkpoint, "key", [b"zzzz", b"yyyy"], '"v1"')
+
+    resumable_upload_fileobj(
+        s3_client, io.BytesIO(body), "bucket", "key", 4, checkpoint, 7, etag=etag
+    )
+
+    assert s3_client.aborted == [upload_id]
+    assert s3_client.completed["key"] == body
+    assert checkpoint.get_upload(7, "key") is None
+
+
+@pytest.mark.django_db
+def test_find_resumable_upload_aborts_an_upload_recorded_without_an_etag():
+    checkpoint = _checkpoint()
+    s3_client = MockS3MultipartClient()
+    upload_id = _start_upload(s3_client, checkpoint, "key", [b"zzzz"], "")
+
+    resume = find_resumable_upload(s3_client, "bucket", "key", 4, checkpoint, 7)
+
+    assert resume.upload_id is None
+    assert s3_client.aborted == [upload_id]
+    assert checkpoint.get_upload(7, "key") is None
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.parametrize("changed", [False, True])
+def test_folder_contents_for_remote_resumes_an_upload_only_from_the_same_file(
+    monkeypatch, stand_in_vdr_server, changed
+):
+    body = bytes(range(256)) * 64
+    etag = f'"1-{len(body)}"'
+    # the VDR's copy of the file may have changed after the parts in S3 were read from it
+    served_body = body[::-1] + b"more" if changed else body
+    server = stand_in_vdr_server({1: served_body})
+    checkpoint = _checkpoint()
+    s3_client = MockS3MultipartClient()
+    key = "Benchmark Site/file 1.bin"
+    upload_id = _start_upload(
+        s3_client, checkpoint, key, [body[:4096], body[4096:8192]], etag, file_id=1
+    )
+    user = get_user_model().objects.create_user("rah@blah.com", "password")
+    folder = utils.FolderContentsForRemote(
+        user=user, folder_id=1, checkpoint=checkpoint
+    )
+    folder.s3_client = s3_client
+    folder.s3_transfer_config = TransferConfig(
+        multipart_threshold=4096, multipart_chunksize=4096
+    )
+
+    folder.prepare_folder()
+    results = folder.iterate_over_and_write_files_to_remote()
+
+    assert [result.success for result in results] == [True]
+    assert s3_client.completed[key] == served_body
+    assert server.downloads[0] == (1, "bytes=8192-")
+    assert server.download_headers[0]["If-Range"] == etag
+    if changed:
+        # the VDR sent the whole file, so the upload was given up on and started again
+        assert server.downloads[1:] == [(1, None)]
+        assert s3_client.aborted == [upload_id]
+    else:
+        assert len(server.downloads) == 1
+        assert s3_client.aborted == []
+
+
+@pytest.mark.django_db
+def test_resumable_upload_uploads_parts_concurrently_and_lists_them_once():
+    user = get_user_model().objects.create_user("blah@rah.com", "password")
+    site_manifest = SiteManifest.objects.create(user=user, root_folder_id=1)
+    checkpoint = Checkpoint(
+        MigrationCheckpoint.objects.create(
+            user=user,
+            root_folder_id=1,
+            mode="remote",
+            manifest=site_manifest,
+            report_id=1,
+        )
+    )
+    s3_client = MockS3MultipartClient()
+    body = b"0123456789abcdefghijklmn"
+    upload_id = s3_client.create_multipart_upload(Bucket="bucket", Key="key")[
+        "UploadId"
+    ]
+    checkpoint.start_upload(7, "key", upload_id, '"v1"')
+    s3_client.upload_part(
+        Bucket="bucket", Key="key", UploadId=upload_id, PartNumber=1, Body=body[:4]
+    )
+
+    resume = find_resumable_upload(s3_client, "bucket", "key", 4, checkpoint, 7)
+    assert resume.offset(4) == 4
+
+    # parts 2-4 only get through once all three are in flight at once
+    in_flight = threading.Barrier(3, timeout=5)
+    upload_part = s3_client.upload_part
+
+    def _upload_part(**kwargs):
+        if kwargs["PartNumber"] <= 4:
+            in_flight.wait()
+        return upload_part(**kwargs)
+
+    s3_client.upload_part = _upload_part
+    s3_client.get_paginator = mock.Mock(side_effect=AssertionError)
+    resumable_upload_fileobj(
+        s3_client,
+        io.BytesIO(body[4:]),
+        "bucket",
+        "key",
+        4,
+        checkpoint,
+        7,
+        fileobj_offset=4,
+        max_concurrency=3,
+        resume=resume,
+        etag='"v1"',
+    )
+
+    assert s3_client.completed["key"] == body
+    assert checkpoint.get_upload(7, "key") is None
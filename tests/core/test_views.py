@@ -2,26 +2,42 @@ import pytest
 from django.urls import reverse
 
 from core import views
-from tests.test_utilities.conftest import remote_system_settings
+from core.http_handlers import site_cache
+from core.http_handlers.site_http_handlers import SiteDetailRevalidation
+from core.site_migration.utilities.progress import JobProgress
+from tests.test_utilities.conftest import fake_progress_redis, remote_system_settings
 from tests.test_utilities.dataclass_responses import vdr_site_detail, vdr_site_list
 
 
 @pytest.mark.django_db
 def test_sites_view(client, monkeypatch, vdr_site_list, remote_system_settings):
 
-    monkeypatch.setattr(views, "get_all_sites", vdr_site_list)
+    monkeypatch.setattr(site_cache, "get_all_sites", vdr_site_list)
+    monkeypatch.setattr(site_cache.refresh_site_list_task, "delay", lambda *args: None)
+    monkeypatch.setattr(
+        site_cache.prefetch_site_details_task, "delay", lambda *args: None
+    )
     url = reverse("sites")
     response = client.get(url)
     assert response.status_code == 200
 
 
 @pytest.mark.django_db
-def test_site_detail_view(client, monkeypatch, vdr_site_detail, remote_system_settings):
+def test_site_detail_view(
+    client, settings, monkeypatch, vdr_site_detail, remote_system_settings
+):
+    settings.VDR_PROGRESS_LONG_POLL_TIMEOUT = 3
 
-    monkeypatch.setattr(views, "get_single_site", vdr_site_detail)
+    monkeypatch.setattr(
+        site_cache,
+        "get_single_site_if_modified",
+        lambda *args, **kwargs: SiteDetailRevalidation(site=vdr_site_detail()),
+    )
     url = reverse("site", kwargs={"id": 4})
     response = client.get(url)
     assert response.status_code == 200
+    # the page tells the progress poller how long the server will hold a request for
+    assert b'data-long-poll-timeout="3"' in response.content
 
 
 @pytest.mark.django_db
@@ -44,3 +60,46 @@ def test_settings_view_fresh_form(client, remote_system_settings):
     }
     response = client.post(url, data, content_type="application/x-www-form-urlencoded")
     assert response.status_code == 302
+
+
+def test_get_progress(client, fake_progress_redis):
+
+    progress = JobProgress("job-1")
+    progress.set(state="running", folders_discovered=2, files_total=3)
+    progress.add(folders_done=1, files_done=3)
+    url = reverse("get_progress", kwargs={"group_task_id": "job-1"})
+
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.json()["folders_done"] == 1
+    assert response.json()["state"] == "running"
+
+    # nothing has changed since the last response
+    response = client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+    assert response.status_code == 304
+
+    progress.add(folders_done=1)
+    response = client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+    assert response.status_code == 200
+    assert response.json()["state"] == "completed"
+
+
+def test_get_progress_long_polls_until_the_wait_runs_out(
+    client, settings, fake_progress_redis
+):
+
+    settings.VDR_PROGRESS_POLL_INTERVAL = 0.01
+    progress = JobProgress("job-1")
+    progress.set(state="crawling")
+    url = reverse("get_progress", kwargs={"group_task_id": "job-1"})
+    etag = client.get(url)["ETag"]
+
+    response = client.get(url, {"wait": "0.05"}, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 304
+
+
+def test_get_progress_of_an_unknown_job(client, fake_progress_redis):
+
+    url = reverse("get_progress", kwargs={"group_task_id": "unknown"})
+    response = client.get(url)
+    assert response.status_code == 404
@@ -1,8 +1,10 @@
+import gc
+
 import pytest
 
 from core.site_migration.utilities import utils
-from reporting.models import Report, ReportLine
-from reporting.utils import ReportWriter
+from reporting.models import Report, ReportLine, ReportSummary
+from reporting.utils import ReportWriter, flush_report_writers
 from tests.test_utilities.conftest import folder_contents_object, report_factory
 from tests.test_utilities.dataclass_responses import vdr_folder_detail
 
@@ -36,6 +38,131 @@ def test_report_writer_write_report_line():
         folder_name="a folder name",
     )
     report_writer.write_line("Currently replicating blah blah blah")
+    report_writer.flush()
 
     latest_line_from_db = ReportLine.objects.latest("timestamp")
     assert latest_line_from_db.line == "Currently replicating blah blah blah"
+
+
+@pytest.mark.django_db
+def test_report_writer_flush_counts_the_lines(report_factory):
+    report = report_factory()
+    report_writer = ReportWriter(folder_name="a folder name", report_id=report.id)
+
+    for i in range(3):
+        report_writer.write_line(f"line {i}")
+    report_writer.flush()
+    report_writer.write_line("line 3")
+    report_writer.flush()
+
+    report.refresh_from_db()
+    assert report.line_count == 4 == ReportLine.objects.filter(report=report).count()
+
+
+@pytest.mark.django_db
+def test_report_writer_flush_adds_file_events_to_the_summary(report_factory):
+    report = report_factory()
+    report_writer = ReportWriter(folder_name="a folder name", report_id=report.id)
+
+    report_writer.write_line("Currently replicating a folder")
+    report_writer.write_line(
+        "Currently creating a.txt on the local server",
+        action="local",
+        file_id=1,
+        bytes=100,
+        duration=0.5,
+        status="success",
+    )
+    report_writer.flush()
+    report_writer.write_line(
+        "Failed to create b.txt on the local server: 502: Bad Gateway",
+        action="local",
+        file_id=2,
+        bytes=0,
+        duration=0.25,
+        status="failure",
+    )
+    report_writer.write_line(
+        "Currently creating c.txt on the local server",
+        action="local",
+        file_id=3,
+        bytes=50,
+        duration=0.25,
+        status="success",
+    )
+    report_writer.flush()
+
+    summary = ReportSummary.objects.get(report=report)
+    assert (summary.files_succeeded, summary.files_failed) == (2, 1)
+    assert summary.bytes_transferred == 150
+    assert summary.transfer_seconds == 1
+    events = ReportLine.objects.filter(report=report).exclude(status="")
+    assert summary.first_event == events.earliest("timestamp").timestamp
+    assert summary.last_event == events.latest("timestamp").timestamp
+
+
+@pytest.mark.django_db
+def test_report_writer_buffers_lines_until_full(report_factory):
+    report = report_factory()
+    report_writer = ReportWriter(
+        folder_name="a folder name", report_id=report.id, buffer_size=3
+    )
+
+    report_writer.write_line("line 1")
+    report_writer.write_line("line 2")
+    assert ReportLine.objects.filter(report=report).count() == 0
+
+    report_writer.write_line("line 3")
+    assert ReportLine.objects.filter(report=report).count() == 3
+
+
+@pytest.mark.django_db
+def test_report_writer_flushes_stale_buffer(report_factory):
+    report = report_factory()
+    report_writer = ReportWriter(
+        folder_name="a folder name", report_id=report.id, flush_interval=0
+    )
+
+    report_writer.write_line("line 1")
+    assert ReportLine.objects.filter(report=report).count() == 1
+
+
+@pytest.mark.django_db
+def test_report_writer_context_manager_flushes_on_exit(
+    report_factory, django_assert_num_queries
+):
+    report = report_factory()
+
+    # one bulk insert of the lines, and one update of the report's line_count
+    with django_assert_num_queries(2):
+        with ReportWriter(folder_name="a folder name", report_id=report.id) as writer:
+            for number in range(10):
+                writer.write_line(f"line {number}")
+
+    lines = ReportLine.objects.filter(report=report).order_by("id")
+    assert [line.line for line in lines] == [f"line {number}" for number in range(10)]
+
+
+@pytest.mark.django_db
+def test_flush_report_writers_flushes_open_writers(report_factory):
+    report = report_factory()
+    report_writer = ReportWriter(folder_name="a folder name", report_id=report.id)
+    report_writer.write_line("written during a task")
+
+    flush_report_writers()
+
+    assert ReportLine.objects.filter(report=report).count() == 1
+
+
+@pytest.mark.django_db
+def test_flush_report_writers_flushes_writers_no_longer_referenced(report_factory):
+    report = report_factory()
+    # like the writer of a FolderContents which has gone out of scope before the task finishes
+    ReportWriter(folder_name="a folder name", report_id=report.id).write_line(
+        "written during a task"
+    )
+    gc.collect()
+
+    flush_report_writers()
+
+    assert ReportLine.objects.filter(report=report).count() == 1
@@ -0,0 +1,157 @@
+import json
+
+import pytest
+from django.urls import reverse
+
+from reporting import views
+from reporting.models import ReportLine, ReportSummary
+from tests.test_utilities.conftest import report_factory
+
+
+@pytest.fixture
+def report_with_lines(report_factory):
+    report = report_factory()
+    ReportLine.objects.bulk_create(
+        ReportLine(report=report, line=f"line {i}") for i in range(5)
+    )
+    return report
+
+
+@pytest.mark.django_db
+def test_report_detail_renders_the_first_page(client, settings, report_with_lines):
+
+    settings.REPORT_LINES_PAGE_SIZE = 2
+    url = reverse("report_detail", kwargs={"id": report_with_lines.id})
+    response = client.get(url)
+
+    assert response.status_code == 200
+    assert [line["line"] for line in response.context["lines"]] == ["line 0", "line 1"]
+    assert response.context["has_more"]
+
+
+@pytest.mark.django_db
+def test_report_lines_pages_by_the_last_line_seen(
+    client, settings, report_with_lines, django_assert_num_queries
+):
+
+    settings.REPORT_LINES_PAGE_SIZE = 2
+    url = reverse("report_lines", kwargs={"id": report_with_lines.id})
+
+    pages = []
+    after = 0
+    while after is not None:
+        # the report, then its lines - no COUNT
+        with django_assert_num_queries(2):
+            response = client.get(url, {"after": after, "limit": 100})
+        pages.append([line["line"] for line in response.json()["lines"]])
+        after = response.json()["next_after"]
+
+    assert pages == [["line 0", "line 1"], ["line 2", "line 3"], ["line 4"]]
+
+
+@pytest.mark.django_db
+def test_report_lines_stream_sends_the_lines_after_the_last_event_id(
+    client, settings, report_with_lines
+):
+
+    settings.REPORT_STREAM_TIMEOUT = 0.05
+    settings.REPORT_STREAM_POLL_INTERVAL = 0.01
+    second_line_id = ReportLine.objects.order_by("id").values_list("id", flat=True)[1]
+    url = reverse("report_lines_stream", kwargs={"id": report_with_lines.id})
+
+    response = client.get(url, HTTP_LAST_EVENT_ID=str(second_line_id))
+    assert response["Content-Type"] == "text/event-stream"
+
+    events = b"".join(response.streaming_content).decode().split("\n\n")
+    data = [
+        json.loads(event.split("data: ")[1])["line"]
+        for event in events
+        if "data: " in event
+    ]
+    assert data == ["line 2", "line 3", "line 4"]
+
+
+@pytest.mark.django_db
+def test_report_lines_stream_waits_for_lines_committed_out_of_order(
+    client, settings, monkeypatch, report_with_lines
+):
+
+    settings.REPORT_STREAM_TIMEOUT = 0.05
+    settings.REPORT_STREAM_POLL_INTERVAL = 0.01
+    line_ids = list(ReportLine.objects.order_by("id").values_list("id", flat=True))
+    lines_after = views._lines_after
+    polls = []
+
+    def _lines_after(report_id, after, limit):
+        polls.append(after)
+        lines = lines_after(report_id, after, limit)
+        # on the first poll, the batch holding the second line hasn't committed yet
+        if len(polls) == 1:
+            return [line for line in lines if line["id"] != line_ids[1]]
+        return lines
+
+    monkeypatch.setattr(views, "_lines_after", _lines_after)
+    url = reverse("report_lines_stream", kwargs={"id": report_with_lines.id})
+
+    response = client.get(url)
+    events = b"".join(response.streaming_content).decode().split("\n\n")
+    data = [
+        json.loads(event.split("data: ")[1])["line"]
+        for event in events
+        if "data: " in event
+    ]
+    assert data == ["line 0", "line 1", "line 2", "line 3", "line 4"]
+
+
+@pytest.mark.django_db
+def test_report_lines_of_an_unknown_report(client):
+
+    url = reverse("report_lines", kwargs={"id": 404})
+    assert client.get(url).status_code == 404
+
+
+@pytest.mark.django_db
+def test_report_list_pages_by_the_report_at_the_edge(
+    client, settings, report_factory, django_assert_num_queries
+):
+
+    settings.REPORT_LIST_PAGE_SIZE = 2
+    reports = [report_factory(root_folder_name=f"site {i}") for i in range(5)]
+    url = reverse("reports")
+
+    response = client.get(url)
+    assert [report.id for report in response.context["report_list"]] == [
+        reports[4].id,
+        reports[3].id,
+    ]
+    assert response.context["newer_cursor"] is None
+
+    # the cursor's report, then the page - no COUNT
+    with django_assert_num_queries(2):
+        response = client.get(url, {"before": response.context["older_cursor"]})
+    assert [report.id for report in response.context["report_list"]] == [
+        reports[2].id,
+        reports[1].id,
+    ]
+
+    response = client.get(url, {"after": response.context["newer_cursor"]})
+    assert [report.id for report in response.context["report_list"]] == [
+        reports[4].id,
+        reports[3].id,
+    ]
+    assert response.context["newer_cursor"] is None
+    assert response.context["older_cursor"] == reports[3].id
+
+
+@pytest.mark.django_db
+def test_report_list_shows_the_summaries(client, report_factory):
+
+    summarised = report_factory()
+    ReportSummary.objects.create(
+        report=summarised, files_succeeded=3, files_failed=1, bytes_transferred=2048
+    )
+    report_factory()
+
+    response = client.get(reverse("reports"))
+    assert response.status_code == 200
+    assert b"2.0\xc2\xa0KB" in response.content
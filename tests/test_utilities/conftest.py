@@ -1,10 +1,14 @@
+import io
 import json
 import os
 from builtins import staticmethod, type
 
 import pytest
+from allauth.socialaccount.models import SocialToken
 from django.contrib.auth import get_user_model
 
+from core.benchmark.stand_ins import InMemoryRedis
+from core.benchmark.vdr_server import FakeVDRServer, FakeVDRSite
 from core.dataclasses.file_and_folder_dataclasses import (
     VDRFile,
     VDRFileList,
@@ -19,6 +23,7 @@ from core.dataclasses.site_dataclasses import (
     VDRSiteModule,
 )
 from core.models import RemoteSystemSettings
+from core.site_migration.utilities import progress
 from core.site_migration.utilities.utils import (
     FolderContents,
     FolderContentsForHardDelete,
@@ -93,6 +98,14 @@ class MockSuccessResponse:
     def json():
         return {"mock_key": "mock_response"}
 
+    @property
+    def raw(self):
+        # the body, for the listings which are parsed as they are streamed
+        return io.BytesIO(json.dumps(self.json()).encode())
+
+    def close(self):
+        pass
+
 
 @pytest.fixture
 def mock_object_with_generic_json_response():
@@ -103,6 +116,19 @@ def mock_object_with_generic_json_response():
     return _mock_generic_json_response
 
 
+@pytest.fixture
+def mock_object_with_json_response():
+    def _mock_object_with_json_response(json):
+        class MockJsonResponse(MockSuccessResponse):
+            @staticmethod
+            def json():
+                return json
+
+        return lambda *args, **kwargs: MockJsonResponse()
+
+    return _mock_object_with_json_response
+
+
 class MockFailureResponse:
     status_code = 403
     text = "This is an error message"
@@ -120,7 +146,7 @@ def mock_object_with_error_response():
 @pytest.fixture
 def mock_get_bearer_token():
     def _mock_get_bearer_token(*args, **kwargs):
-        return "fake-bearer-token"
+        return SocialToken(token="fake-bearer-token")
 
     return _mock_get_bearer_token
 
@@ -228,3 +254,40 @@ def folder_contents_object_for_hard_delete():
         return folder_contents_object_for_hard_delete
 
     return _folder_contents_object_for_hard_delete
+
+
+@pytest.fixture
+def stand_in_vdr_server(monkeypatch, mock_get_bearer_token):
+    """
+    Starts a FakeVDRServer, with the given files in the root folder of its site, and points RemoteSystemSettings at
+    it.
+    """
+    servers = []
+
+    def _stand_in_vdr_server(files, supports_ranges=True, drop_after=None):
+        site = FakeVDRSite(depth=0, files_per_folder=0)
+        for file_id, body in files.items():
+            site.add_file(1, file_id, body)
+        server = FakeVDRServer(
+            site, supports_ranges=supports_ranges, drop_after=drop_after
+        ).start()
+        servers.append(server)
+        RemoteSystemSettings.objects.create(
+            remote_system_base_url=server.base_url,
+            aws_access_key_id="123456789",
+            aws_secret_access_key="987654321",
+            aws_bucket_name="system-bucket",
+        )
+        monkeypatch.setattr(SocialToken.objects, "get", mock_get_bearer_token)
+        return server
+
+    yield _stand_in_vdr_server
+    for server in servers:
+        server.stop()
+
+
+@pytest.fixture
+def fake_progress_redis(monkeypatch):
+    client = InMemoryRedis()
+    monkeypatch.setattr(progress, "get_progress_redis", lambda: client)
+    return client
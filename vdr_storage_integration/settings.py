@@ -122,13 +122,113 @@ AUTHENTICATION_BACKENDS = (
     "django.contrib.auth.backends.ModelBackend",
     "allauth.account.auth_backends.AuthenticationBackend",
 )
-OAUTH_SERVER_BASEURL = os.environ.get(
-    "OAUTH_SERVER_BASEURL", ""
-)
+OAUTH_SERVER_BASEURL = os.environ.get("OAUTH_SERVER_BASEURL", "")
 
 AWS_ACCESS_KEY_ID = os.environ.get("AWS_ACCESS_KEY_ID", "")
 AWS_SECRET_ACCESS_KEY = os.environ.get("AWS_SECRET_ACCESS_KEY", "")
 AWS_BUCKET_NAME = os.environ.get("AWS_BUCKET_NAME", "")
 
+# Seconds a user's bearer token is held in the cache (see core/http_handlers/utils.py)
+VDR_ACCESS_TOKEN_CACHE_TIMEOUT = int(
+    os.environ.get("VDR_ACCESS_TOKEN_CACHE_TIMEOUT", 300)
+)
+
+# Items asked for in each page of a folder's subfolders or files
+# (see core/http_handlers/file_and_folder_http_handlers.py)
+VDR_LISTING_PAGE_SIZE = int(os.environ.get("VDR_LISTING_PAGE_SIZE", 1000))
+
+# Thread pool used to transfer a folder's files (see core/site_migration/utilities/transfer.py)
+VDR_TRANSFER_WORKERS_PER_FOLDER = int(
+    os.environ.get("VDR_TRANSFER_WORKERS_PER_FOLDER", 8)
+)
+VDR_TRANSFER_MAX_WORKERS_PER_PROCESS = int(
+    os.environ.get("VDR_TRANSFER_MAX_WORKERS_PER_PROCESS", 32)
+)
+
+# Folders of a SiteManifest handed to a single replication or deletion task
+# (see core/site_migration/site_migrations.py)
+VDR_TRAVERSAL_BATCH_SIZE = int(os.environ.get("VDR_TRAVERSAL_BATCH_SIZE", 50))
+
+# Downloads of files to the local server (see core/site_migration/utilities/download.py). Each download thread
+# holds one buffer of VDR_DOWNLOAD_CHUNK_SIZE bytes
+VDR_DOWNLOAD_CHUNK_SIZE = int(os.environ.get("VDR_DOWNLOAD_CHUNK_SIZE", 1024 * 1024))
+VDR_DOWNLOAD_MAX_ATTEMPTS = int(os.environ.get("VDR_DOWNLOAD_MAX_ATTEMPTS", 3))
+VDR_DOWNLOAD_SEGMENTS = int(os.environ.get("VDR_DOWNLOAD_SEGMENTS", 4))
+VDR_DOWNLOAD_SEGMENT_SIZE = int(
+    os.environ.get("VDR_DOWNLOAD_SEGMENT_SIZE", 64 * 1024 * 1024)
+)
+
+# Pooled HTTP session used for every call to the VDR (see core/http_handlers/session.py). Each transfer thread can
+# hold a connection for every segment of its download, so by default the pool is big enough for all of them at once,
+# rather than urllib3 opening and discarding connections beyond it
+VDR_HTTP_POOL_CONNECTIONS = int(os.environ.get("VDR_HTTP_POOL_CONNECTIONS", 10))
+VDR_HTTP_POOL_MAXSIZE = int(
+    os.environ.get(
+        "VDR_HTTP_POOL_MAXSIZE",
+        VDR_TRANSFER_MAX_WORKERS_PER_PROCESS * VDR_DOWNLOAD_SEGMENTS,
+    )
+)
+VDR_HTTP_MAX_RETRIES = int(os.environ.get("VDR_HTTP_MAX_RETRIES", 3))
+VDR_HTTP_BACKOFF_FACTOR = float(os.environ.get("VDR_HTTP_BACKOFF_FACTOR", 0.5))
+
+# Paging and caching of each user's site list (see core/http_handlers/site_cache.py)
+VDR_SITE_LIST_PAGE_SIZE = int(os.environ.get("VDR_SITE_LIST_PAGE_SIZE", 10))
+VDR_SITE_LIST_CACHE_TTL = int(os.environ.get("VDR_SITE_LIST_CACHE_TTL", 60))
+VDR_SITE_LIST_STALE_TTL = int(os.environ.get("VDR_SITE_LIST_STALE_TTL", 300))
+VDR_SITE_DETAIL_CACHE_TTL = int(os.environ.get("VDR_SITE_DETAIL_CACHE_TTL", 60))
+VDR_SITE_DETAIL_CACHE_TIMEOUT = int(
+    os.environ.get("VDR_SITE_DETAIL_CACHE_TIMEOUT", 60 * 60)
+)
+VDR_SITE_DETAIL_PREFETCH_WORKERS = int(
+    os.environ.get("VDR_SITE_DETAIL_PREFETCH_WORKERS", 5)
+)
+
+# Crawling a site into a SiteManifest: the threads used to list folders, and the seconds a manifest left behind by a
+# job which never finished is kept for (see core/site_migration/manifest.py)
+VDR_MANIFEST_CRAWLER_WORKERS = int(os.environ.get("VDR_MANIFEST_CRAWLER_WORKERS", 8))
+VDR_MANIFEST_RETENTION = int(os.environ.get("VDR_MANIFEST_RETENTION", 60 * 60 * 24 * 7))
+
+# Resuming of interrupted replications: the runs a file may fail on before it is given up on, and the runs and
+# seconds after which an unfinished checkpoint is closed and the site crawled again
+# (see core/site_migration/utilities/checkpoint.py)
+VDR_CHECKPOINT_MAX_FILE_ATTEMPTS = int(
+    os.environ.get("VDR_CHECKPOINT_MAX_FILE_ATTEMPTS", 3)
+)
+VDR_CHECKPOINT_MAX_ATTEMPTS = int(os.environ.get("VDR_CHECKPOINT_MAX_ATTEMPTS", 5))
+VDR_CHECKPOINT_MAX_AGE = int(os.environ.get("VDR_CHECKPOINT_MAX_AGE", 60 * 60 * 24 * 7))
+
+# Buffering of report lines before they are bulk created (see reporting/utils.py)
+REPORT_WRITER_BUFFER_SIZE = int(os.environ.get("REPORT_WRITER_BUFFER_SIZE", 100))
+REPORT_WRITER_FLUSH_INTERVAL = float(os.environ.get("REPORT_WRITER_FLUSH_INTERVAL", 5))
+
+# Paging of the reports, and paging and streaming of report lines to the report page (see reporting/views.py)
+REPORT_LIST_PAGE_SIZE = int(os.environ.get("REPORT_LIST_PAGE_SIZE", 10))
+REPORT_LINES_PAGE_SIZE = int(os.environ.get("REPORT_LINES_PAGE_SIZE", 500))
+REPORT_STREAM_POLL_INTERVAL = float(os.environ.get("REPORT_STREAM_POLL_INTERVAL", 1))
+REPORT_STREAM_TIMEOUT = float(os.environ.get("REPORT_STREAM_TIMEOUT", 60))
+
 CELERY_BROKER_URL = os.environ.get("CELERY_BROKER", "redis://redis:6379/0")
 CELERY_RESULT_BACKEND = os.environ.get("CELERY_BACKEND", "redis://redis:6379/0")
+
+# Progress counters of replication and deletion jobs, and the long polling status endpoint which serves them
+# (see core/site_migration/utilities/progress.py). The endpoint is a sync view, so a long poll holds a web worker
+# for up to VDR_PROGRESS_LONG_POLL_TIMEOUT seconds - keep it short
+VDR_PROGRESS_REDIS_URL = os.environ.get("VDR_PROGRESS_REDIS", CELERY_BROKER_URL)
+VDR_PROGRESS_TTL = int(os.environ.get("VDR_PROGRESS_TTL", 60 * 60 * 24))
+VDR_PROGRESS_LONG_POLL_TIMEOUT = float(
+    os.environ.get("VDR_PROGRESS_LONG_POLL_TIMEOUT", 5)
+)
+VDR_PROGRESS_POLL_INTERVAL = float(os.environ.get("VDR_PROGRESS_POLL_INTERVAL", 0.5))
+
+# Token buckets shared by every worker, limiting the requests a second made to the VDR from each budget, and the
+# backoff after the VDR throttles a request (see core/http_handlers/rate_limit.py). A budget of 0 is unlimited
+VDR_RATE_LIMIT_REDIS_URL = os.environ.get("VDR_RATE_LIMIT_REDIS", CELERY_BROKER_URL)
+VDR_RATE_LIMITS = {
+    "default": float(os.environ.get("VDR_RATE_LIMIT_DEFAULT", 20)),
+    "download": float(os.environ.get("VDR_RATE_LIMIT_DOWNLOAD", 10)),
+    "delete": float(os.environ.get("VDR_RATE_LIMIT_DELETE", 10)),
+}
+VDR_RATE_LIMIT_BURST = float(os.environ.get("VDR_RATE_LIMIT_BURST", 1))
+VDR_RATE_LIMIT_MIN_FRACTION = float(os.environ.get("VDR_RATE_LIMIT_MIN_FRACTION", 0.1))
+VDR_RATE_LIMIT_RECOVERY = float(os.environ.get("VDR_RATE_LIMIT_RECOVERY", 60))
+VDR_RATE_LIMIT_MAX_WAIT = float(os.environ.get("VDR_RATE_LIMIT_MAX_WAIT", 60))
@@ -3,6 +3,7 @@ from django.urls import include, path
 
 from core.views import (
     Home,
+    get_progress,
     get_status,
     hard_delete_site,
     replicate_site,
@@ -11,7 +12,12 @@ from core.views import (
     sites_view,
     soft_delete_site,
 )
-from reporting.views import report_detail, report_list
+from reporting.views import (
+    report_detail,
+    report_lines,
+    report_lines_stream,
+    report_list,
+)
 
 urlpatterns = [
     path("admin/", admin.site.urls),
@@ -19,11 +25,18 @@ urlpatterns = [
     path("", Home.as_view(), name="home"),
     path("reports/", report_list, name="reports"),
     path("reports/<int:id>", report_detail, name="report_detail"),
+    path("reports/<int:id>/lines/", report_lines, name="report_lines"),
+    path(
+        "reports/<int:id>/lines/stream/",
+        report_lines_stream,
+        name="report_lines_stream",
+    ),
     path("sites/", sites_view, name="sites"),
     path("settings/", settings_view, name="settings"),
     path("sitereplicator/", replicate_site, name="site_downloader"),
     path("sitesoftdeleter/", soft_delete_site, name="soft_deleter"),
     path("siteharddeleter/", hard_delete_site, name="hard_deleter"),
     path("tasks/<str:group_task_id>/", get_status, name="get_status"),
+    path("tasks/<str:group_task_id>/progress/", get_progress, name="get_progress"),
     path("site/<int:id>", site_detail_view, name="site"),
 ]